@@ -23,6 +23,10 @@ from app.core.database import Base
 from app.models.user import User
 from app.models.category import Category, SubCategory
 from app.models.prompt import Prompt
+from app.models.lesson_cache import LessonCacheEntry
+from app.models.pregenerated_lesson import PregeneratedLesson
+from app.models.lesson_section import LessonSection
+from app.models.user_usage import UserUsage
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,74 @@
+"""backfill lesson sections
+
+Revision ID: 9e4b7c2d5f18
+Revises: 6c2f8d4a1e93
+Create Date: 2026-10-18 09:12:44.503127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.markdown_sections import split_sections
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4b7c2d5f18'
+down_revision: Union[str, None] = '6c2f8d4a1e93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+prompts = sa.table(
+    'prompts',
+    sa.column('id', sa.Integer),
+    sa.column('response', sa.Text),
+)
+lesson_sections = sa.table(
+    'lesson_sections',
+    sa.column('prompt_id', sa.Integer),
+    sa.column('position', sa.Integer),
+    sa.column('level', sa.Integer),
+    sa.column('title', sa.String),
+    sa.column('anchor', sa.String),
+    sa.column('content', sa.Text),
+    sa.column('char_count', sa.Integer),
+)
+
+
+def upgrade() -> None:
+    # Split lessons saved before lesson_sections existed (new lessons are split when saved)
+    connection = op.get_bind()
+    without_sections = sa.select(prompts.c.id, prompts.c.response).where(
+        prompts.c.response.isnot(None),
+        ~sa.exists().where(lesson_sections.c.prompt_id == prompts.c.id)
+    ).order_by(prompts.c.id).limit(BATCH_SIZE)
+
+    last_id = 0
+    while True:
+        rows = connection.execute(without_sections.where(prompts.c.id > last_id)).all()
+        if not rows:
+            break
+        sections = [
+            {
+                'prompt_id': row.id,
+                'position': section['position'],
+                'level': section['level'],
+                'title': section['title'],
+                'anchor': section['anchor'],
+                'content': section['content'],
+                'char_count': len(section['content']),
+            }
+            for row in rows
+            for section in split_sections(row.response)
+        ]
+        if sections:
+            op.bulk_insert(lesson_sections, sections)
+        last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    # Backfilled sections are indistinguishable from ones written on save, and harmless to keep
+    pass
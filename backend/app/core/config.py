@@ -4,7 +4,7 @@ Handles database, JWT, AI API, and other core settings.
 """
 from pydantic_settings import BaseSettings
 from pydantic import validator
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Dict
 import os
 from dotenv import load_dotenv
 
@@ -31,6 +31,166 @@ class Settings(BaseSettings):
     openai_api_key: Optional[str] = None
     gemini_api_key: Optional[str] = None
     openai_model: str = "gpt-3.5-turbo"
+    gemini_model: str = "gemini-1.5-flash"
+    
+    # AI providers: "openai" or "gemini" is tried first, the other is the fallback
+    ai_primary_provider: str = "openai"
+    ai_fallback_enabled: bool = True
+    
+    # Local mock AI provider for load/latency testing (replaces all real providers)
+    ai_mock_enabled: bool = False
+    ai_mock_model: str = "gpt-3.5-turbo-mock"
+    ai_mock_latency_ms: float = 500.0  # mean time to first token
+    ai_mock_latency_distribution: str = "lognormal"  # fixed, uniform, exponential or lognormal
+    ai_mock_latency_sigma: float = 0.5
+    ai_mock_tokens_per_second: float = 200.0
+    ai_mock_response_tokens: int = 400
+    ai_mock_error_rate: float = 0.0  # share of requests answered with HTTP 500
+    ai_mock_rate_limit_rate: float = 0.0  # share of requests answered with HTTP 429
+    ai_mock_seed: Optional[int] = None
+    
+    # Pooled HTTP client shared by all AI calls (created once in the app lifespan)
+    ai_http_timeout_seconds: float = 30.0
+    ai_http_connect_timeout_seconds: float = 5.0
+    ai_http_pool_timeout_seconds: float = 10.0
+    ai_http_max_connections: int = 100
+    ai_http_max_keepalive_connections: int = 20
+    ai_http_keepalive_expiry_seconds: float = 30.0
+    ai_http2_enabled: bool = True
+    
+    # Hedged requests: if the primary has not sent a first token after the
+    # configured percentile of its recent time-to-first-token, also ask the
+    # alternate provider and keep whichever finishes first
+    ai_hedge_enabled: bool = False
+    ai_hedge_percentile: float = 95.0
+    ai_hedge_delay_ms: int = 2000  # used until enough samples are collected
+    ai_hedge_min_delay_ms: int = 250
+    ai_hedge_min_samples: int = 20
+    
+    # Admission control for outbound AI calls
+    ai_max_concurrency: int = 20
+    ai_max_queue_size: int = 100
+    ai_queue_timeout_seconds: float = 30.0
+    ai_retry_after_seconds: int = 5
+    
+    # Retries (exponential backoff with jitter) and per-provider circuit breaker
+    ai_max_retries: int = 2
+    ai_retry_base_delay_seconds: float = 0.5
+    ai_retry_max_delay_seconds: float = 8.0
+    ai_circuit_failure_threshold: int = 5
+    ai_circuit_recovery_seconds: float = 30.0
+    
+    # Model routing among the primary provider's models (comma-separated AI_ROUTING_MODELS
+    # are extra models next to OPENAI_MODEL / GEMINI_MODEL). An override or per-category
+    # model wins; prompts of at most AI_ROUTING_SMALL_PROMPT_TOKENS go to the model with
+    # the lowest recent short-prompt latency; everything else uses the default model.
+    ai_routing_enabled: bool = False
+    ai_routing_models: Union[str, List[str]] = []
+    ai_routing_small_prompt_tokens: int = 40
+    ai_routing_model_by_category: Dict[str, str] = {}  # e.g. {"Science": "gpt-4o"}
+    ai_routing_override_model: Optional[str] = None
+    ai_routing_min_samples: int = 10
+    ai_routing_explore_percent: float = 5.0
+    
+    # Background health probe behind /health (model lookups, no tokens generated)
+    ai_health_probe_interval_seconds: int = 30
+    ai_health_probe_timeout_seconds: float = 5.0
+    
+    # Token budget: lesson length ("short", "medium" or "long") picks max_tokens
+    default_lesson_length: str = "long"
+    lesson_length_by_category: Dict[str, str] = {}  # e.g. {"Language": "medium"}
+    token_budget_safety_margin: int = 64
+    token_budget_min_completion_tokens: int = 256
+    
+    # Prompt templates: active version, plus an optional A/B candidate served
+    # to a stable percentage of prompts
+    prompt_template_version: str = "v1"
+    prompt_template_candidate_version: Optional[str] = None
+    prompt_template_candidate_percent: int = 0
+    
+    # Near-duplicate lookup: prompts are embedded locally (hashed TF-IDF) and matched by
+    # cosine similarity against generated lessons of the same subcategory and lesson length
+    semantic_lookup_enabled: bool = True
+    semantic_lookup_threshold: float = 0.85
+    semantic_lookup_dimensions: int = 1024
+    semantic_lookup_max_entries_per_subcategory: int = 1000
+    semantic_lookup_lookback_days: int = 30
+    
+    # Client disconnects: generations for a client that has gone away are cancelled
+    # (checked every CLIENT_DISCONNECT_POLL_SECONDS; streams after the resume window);
+    # optionally the partial text of a streamed lesson is saved, marked as partial
+    client_disconnect_poll_seconds: float = 0.5
+    lesson_keep_partial_on_disconnect: bool = False
+    
+    # Request deadlines: each request gets a time budget from the REQUEST_TIMEOUT_HEADER
+    # header (seconds, capped at the max) or its route's default; the remaining time
+    # bounds database statements, the AI queue wait, AI calls and retries
+    request_deadline_enabled: bool = True
+    request_timeout_header: str = "X-Request-Timeout"
+    request_timeout_seconds: float = 30.0
+    request_timeout_max_seconds: float = 300.0
+    request_timeout_by_route: Dict[str, float] = {"/api/prompts/stream": 120.0, "/api/prompts/batch": 120.0}
+    request_deadline_min_ai_seconds: float = 1.0  # don't start or retry an AI call with less time left
+    
+    # Outline-then-sections generation (opt-in per request with parallel_sections): a short
+    # outline completion, then one concurrent completion per section; short lessons and
+    # outlines with fewer than LESSON_OUTLINE_MIN_SECTIONS headings use a single completion
+    lesson_parallel_sections_enabled: bool = True
+    lesson_section_concurrency: int = 3  # sections of one lesson generated at once (each takes an AI slot)
+    lesson_outline_max_tokens: int = 200
+    lesson_outline_min_sections: int = 2
+    lesson_outline_max_sections: int = 6
+    lesson_section_min_tokens: int = 300
+    
+    # Batch lesson generation (POST /api/prompts/batch)
+    lesson_batch_max_items: int = 30
+    lesson_batch_concurrency: int = 5
+    
+    # Off-peak pre-generation of the most frequent prompts per subcategory (hours in UTC)
+    lesson_pregeneration_enabled: bool = True
+    lesson_pregeneration_top_n: int = 10
+    lesson_pregeneration_min_count: int = 3
+    lesson_pregeneration_lookback_days: int = 30
+    lesson_pregeneration_refresh_days: int = 7
+    lesson_pregeneration_concurrency: int = 2
+    lesson_pregeneration_start_hour: int = 2
+    lesson_pregeneration_end_hour: int = 5
+    lesson_pregeneration_check_interval_seconds: int = 600
+    
+    # Background lesson jobs (POST /api/prompts?mode=async); streamed lessons run as jobs
+    # too and keep generating for LESSON_STREAM_RESUME_SECONDS after their client drops,
+    # so it can resume with Last-Event-ID
+    lesson_job_workers: int = 4
+    lesson_job_max_pending: int = 500
+    lesson_job_ttl_seconds: int = 3600
+    lesson_stream_resume_seconds: float = 30.0
+    
+    # Prompt content pre-filter: case-insensitive blocked phrases matched as whole words with their inflections
+    # (comma-separated in the environment), plus an optional file with one phrase per line. Keep entries to
+    # phrases: single words such as "hack" or "exploit" also block ordinary programming lessons.
+    content_filter_enabled: bool = True
+    content_filter_blocked_terms: Union[str, List[str]] = [
+        "make a bomb", "build a bomb", "make explosives", "make nerve gas",
+        "cook meth", "buy stolen credit cards"
+    ]
+    content_filter_terms_file: Optional[str] = None
+    
+    # Per-user rate limiting: a token bucket of RATE_LIMIT_BURST requests refilled at
+    # RATE_LIMIT_REQUESTS_PER_MINUTE, plus a daily quota of generated tokens (0 = unlimited).
+    # A batch larger than the burst is admitted on a full bucket, which goes into debt for the rest.
+    # Usage counters are kept in memory and synced to the database every few seconds.
+    rate_limit_enabled: bool = True
+    rate_limit_requests_per_minute: float = 10.0
+    rate_limit_burst: int = 5
+    rate_limit_exempt_admins: bool = True
+    daily_token_quota: int = 100000
+    ai_usage_sync_interval_seconds: int = 15
+    
+    # Lesson cache (in-process LRU in front of the persistent lesson_cache table)
+    lesson_cache_enabled: bool = True
+    lesson_cache_max_entries: int = 1000
+    lesson_cache_ttl_seconds: int = 3600
+    lesson_cache_db_ttl_seconds: int = 7 * 24 * 3600
     
     # CORS - Add your production URLs here
     # allowed_origins: list = [
@@ -49,6 +209,20 @@ class Settings(BaseSettings):
         "http://127.0.0.1:5173",
     ]
     
+    @validator('ai_routing_models', pre=True)
+    def parse_routing_models(cls, v):
+        """Parse routing models from a comma-separated string or list."""
+        if isinstance(v, str):
+            return [model.strip() for model in v.split(',') if model.strip()]
+        return v
+    
+    @validator('content_filter_blocked_terms', pre=True)
+    def parse_blocked_terms(cls, v):
+        """Parse blocked terms from a comma-separated string or list."""
+        if isinstance(v, str):
+            return [term.strip() for term in v.split(',') if term.strip()]
+        return v
+    
     @validator('allowed_origins', pre=True)
     def parse_cors_origins(cls, v):
         """Parse CORS origins from string or list format."""
@@ -2,13 +2,14 @@
 Database connection and session management using SQLAlchemy.
 Provides database engine, session factory, and base model class.
 """
-from sqlalchemy import create_engine, MetaData, text
+from sqlalchemy import create_engine, MetaData, event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from typing import Generator
 import logging
 
 from .config import settings
+from .deadline import remaining, check_deadline
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,6 +25,23 @@ engine = create_engine(
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+@event.listens_for(SessionLocal, "after_begin")
+def apply_request_deadline(session: Session, transaction, connection) -> None:
+    """
+    Bound every statement of a transaction by the current request's remaining time.
+    
+    PostgreSQL cancels statements that run past statement_timeout; SET LOCAL
+    only lasts until the end of the transaction, so pooled connections are not affected.
+    """
+    left = remaining()
+    if left is None:
+        return
+    check_deadline("query the database")
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(int(left * 1000), 1)}")
+
+
 # Create base class for models
 Base = declarative_base()
 
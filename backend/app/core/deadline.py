@@ -0,0 +1,132 @@
+"""
+Per-request deadlines.
+The deadline of the current request is kept in a context variable, so the
+database session and the AI service can bound their work by the time the
+caller is still willing to wait without it being passed through every call.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Optional, Awaitable, Iterator, TypeVar
+
+from .config import settings
+from .exceptions import DeadlineExceededException
+
+T = TypeVar("T")
+
+# time.monotonic() value by which the current request must finish, if any
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def timeout_for_request(path: str, header_value: Optional[str] = None) -> Optional[float]:
+    """
+    Return the time budget of a request in seconds.
+    
+    A valid header value wins (capped at request_timeout_max_seconds);
+    otherwise the longest matching prefix in request_timeout_by_route, then
+    request_timeout_seconds.
+    
+    Args:
+        path: Request path
+        header_value: Value of the REQUEST_TIMEOUT_HEADER header, if sent
+        
+    Returns:
+        Seconds, or None if deadlines are disabled
+    """
+    if not settings.request_deadline_enabled:
+        return None
+    if header_value:
+        try:
+            seconds = float(header_value)
+            if seconds > 0:
+                return min(seconds, settings.request_timeout_max_seconds)
+        except ValueError:
+            pass
+    
+    routes = [route for route in settings.request_timeout_by_route if path.startswith(route)]
+    if routes:
+        return settings.request_timeout_by_route[max(routes, key=len)]
+    return settings.request_timeout_seconds
+
+
+def start_deadline(seconds: Optional[float]) -> Token:
+    """
+    Set the deadline of the current context to seconds from now.
+    
+    Args:
+        seconds: Time budget; None clears the deadline
+        
+    Returns:
+        Token for reset_deadline()
+    """
+    return _deadline.set(time.monotonic() + seconds if seconds is not None else None)
+
+
+def reset_deadline(token: Token) -> None:
+    """Restore the deadline that was in place before start_deadline()."""
+    _deadline.reset(token)
+
+
+@contextmanager
+def no_deadline() -> Iterator[None]:
+    """Run a block without a deadline, e.g. to save a result that is already paid for."""
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline (negative once passed), or None without a deadline."""
+    deadline = _deadline.get()
+    return deadline - time.monotonic() if deadline is not None else None
+
+
+def has_time_for(seconds: float) -> bool:
+    """True if there is no deadline or at least seconds are left before it."""
+    left = remaining()
+    return left is None or left >= seconds
+
+
+def check_deadline(action: str = "continue") -> None:
+    """
+    Raise if the current deadline has passed.
+    
+    Args:
+        action: What was about to happen, for the error message
+        
+    Raises:
+        DeadlineExceededException: If no time is left
+    """
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceededException(f"Request deadline exceeded before it could {action}")
+
+
+async def within_deadline(work: Awaitable[T], action: str = "finish") -> T:
+    """
+    Await work, cancelling it when the current deadline passes.
+    
+    Args:
+        work: Coroutine or future to await
+        action: What the work does, for the error message
+        
+    Returns:
+        The work's result
+        
+    Raises:
+        DeadlineExceededException: If the deadline passes first
+    """
+    left = remaining()
+    if left is None:
+        return await work
+    if left <= 0:
+        if asyncio.iscoroutine(work):
+            work.close()
+        raise DeadlineExceededException(f"Request deadline exceeded before it could {action}")
+    try:
+        return await asyncio.wait_for(work, timeout=left)
+    except asyncio.TimeoutError:
+        raise DeadlineExceededException(f"Request deadline exceeded before it could {action}")
@@ -2,6 +2,7 @@
 Custom exception classes for the application.
 Provides specific exceptions for different error scenarios.
 """
+from typing import Dict, Optional
 from fastapi import HTTPException, status
 
 
@@ -59,11 +60,73 @@ class PromptNotFoundException(HTTPException):
         )
 
 
+class LessonJobNotFoundException(HTTPException):
+    """Raised when a lesson job is not found."""
+    def __init__(self, job_id: str):
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Lesson job with ID {job_id} not found"
+        )
+
+
+class LessonSectionNotFoundException(HTTPException):
+    """Raised when a lesson section is not found."""
+    def __init__(self, prompt_id: int, position: int):
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Section {position} of prompt {prompt_id} not found"
+        )
+
+
 class AIServiceException(HTTPException):
     """Raised when AI service encounters an error."""
-    def __init__(self, detail: str = "AI service temporarily unavailable"):
+    def __init__(
+        self,
+        detail: str = "AI service temporarily unavailable",
+        status_code: int = status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers: Optional[Dict[str, str]] = None
+    ):
+        super().__init__(
+            status_code=status_code,
+            detail=detail,
+            headers=headers
+        )
+
+
+class AIServiceOverloadedException(AIServiceException):
+    """Raised when too many AI requests are already running or queued."""
+    def __init__(self, retry_after: int = 5):
+        super().__init__(
+            detail="AI service is busy. Please try again shortly.",
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(retry_after)}
+        )
+
+
+class RateLimitExceededException(HTTPException):
+    """Raised when a user exceeds their request rate or daily AI quota."""
+    def __init__(self, detail: str = "Rate limit exceeded", retry_after: int = 60):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)}
+        )
+
+
+class ClientDisconnectedException(HTTPException):
+    """Raised when the client disconnects before its lesson is ready."""
+    def __init__(self, detail: str = "Client closed the request"):
+        super().__init__(
+            status_code=499,  # nginx's "client closed request"; nobody is left to read it
+            detail=detail
+        )
+
+
+class DeadlineExceededException(HTTPException):
+    """Raised when a request runs out of time before its work is done."""
+    def __init__(self, detail: str = "Request deadline exceeded"):
         super().__init__(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
             detail=detail
         )
 
@@ -0,0 +1,51 @@
+"""
+ASGI middleware.
+These are plain ASGI classes rather than @app.middleware("http") functions,
+which run the endpoint in a separate task behind a wrapped receive channel:
+behind one, Request.is_disconnected() never sees the client go away.
+"""
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .deadline import timeout_for_request, start_deadline, reset_deadline
+
+
+class CORSHeadersMiddleware:
+    """Add permissive CORS headers to every HTTP response (backup for CORSMiddleware)."""
+    
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["Access-Control-Allow-Origin"] = "*"
+                headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
+                headers["Access-Control-Allow-Headers"] = "*"
+            await send(message)
+        
+        await self.app(scope, receive, send_with_headers)
+
+
+class RequestDeadlineMiddleware:
+    """Set the deadline of each HTTP request from the timeout header or the route default."""
+    
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        header_value = Headers(scope=scope).get(settings.request_timeout_header)
+        token = start_deadline(timeout_for_request(scope["path"], header_value))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_deadline(token)
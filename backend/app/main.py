@@ -3,6 +3,7 @@ Main FastAPI application entry point.
 Configures the application, middleware, routes, and startup/shutdown events.
 """
 from contextlib import asynccontextmanager
+from datetime import datetime
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -11,6 +12,7 @@ import uvicorn
 
 from .core.config import settings
 from .core.database import check_db_connection, create_all_tables
+from .core.middleware import CORSHeadersMiddleware, RequestDeadlineMiddleware
 from .core.exceptions import (
     UserAlreadyExistsException,
     UserNotFoundException,
@@ -18,7 +20,12 @@ from .core.exceptions import (
     CategoryNotFoundException,
     SubCategoryNotFoundException,
     PromptNotFoundException,
+    LessonJobNotFoundException,
+    LessonSectionNotFoundException,
     AIServiceException,
+    RateLimitExceededException,
+    ClientDisconnectedException,
+    DeadlineExceededException,
     DatabaseException,
     ValidationException,
     PermissionDeniedException
@@ -65,16 +72,33 @@ async def lifespan(app: FastAPI):
     else:
         logger.error("Database connection failed!")
     
-    # Initialize AI service
-    try:
-        from .services.ai_service import AIService
-        ai_service = AIService()
-        if ai_service.client:
-            logger.info("AI service initialized successfully")
-        else:
-            logger.warning("AI service not configured - missing API key")
-    except Exception as e:
-        logger.error(f"Failed to initialize AI service: {e}")
+    # Initialize the shared AI service (one pooled HTTP client for the whole app)
+    from .services.ai_service import AIService
+    app.state.ai_service = AIService()
+    if app.state.ai_service.providers:
+        logger.info("AI service initialized successfully")
+    else:
+        logger.warning("AI service not configured - missing API key")
+    
+    # Start background lesson job workers
+    from .services.lesson_jobs import lesson_jobs
+    lesson_jobs.start()
+    
+    # Load pre-generated lessons and schedule the off-peak pre-generation job
+    from .services.lesson_pregeneration import lesson_pregenerator
+    lesson_pregenerator.start(app.state.ai_service)
+    
+    # Index recently generated lessons for near-duplicate lookups
+    from .services.semantic_index import semantic_index
+    semantic_index.start()
+    
+    # Start syncing per-user AI usage counters with the database
+    from .services.rate_limiter import user_rate_limiter
+    user_rate_limiter.start()
+    
+    # Probe the database and AI providers in the background for /health
+    from .services.ai_health import ai_health_probe
+    ai_health_probe.start(app.state.ai_service)
     
     logger.info("Application startup complete")
     
@@ -82,6 +106,12 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down AI-Driven Learning Platform...")
+    await lesson_jobs.stop()
+    await lesson_pregenerator.stop()
+    await semantic_index.stop()
+    await user_rate_limiter.stop()
+    await ai_health_probe.stop()
+    await app.state.ai_service.aclose()
 
 
 # Create FastAPI application
@@ -103,13 +133,10 @@ app.add_middleware(
 )
 
 # Manual CORS handler as backup
-@app.middleware("http")
-async def cors_handler(request: Request, call_next):
-    response = await call_next(request)
-    response.headers["Access-Control-Allow-Origin"] = "*"
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "*"
-    return response
+app.add_middleware(CORSHeadersMiddleware)
+
+# Per-request deadline from the timeout header or the route default (see core/deadline.py)
+app.add_middleware(RequestDeadlineMiddleware)
 
 # Add preflight OPTIONS handler
 @app.options("/{path:path}")
@@ -166,6 +193,22 @@ async def prompt_not_found_handler(request: Request, exc: PromptNotFoundExceptio
     )
 
 
+@app.exception_handler(LessonJobNotFoundException)
+async def lesson_job_not_found_handler(request: Request, exc: LessonJobNotFoundException):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail, "type": "lesson_job_not_found"}
+    )
+
+
+@app.exception_handler(LessonSectionNotFoundException)
+async def lesson_section_not_found_handler(request: Request, exc: LessonSectionNotFoundException):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail, "type": "lesson_section_not_found"}
+    )
+
+
 # @app.exception_handler(AIServiceException)
 # async def ai_service_handler(request: Request, exc: AIServiceException):
 #     return JSONResponse(
@@ -174,6 +217,31 @@ async def prompt_not_found_handler(request: Request, exc: PromptNotFoundExceptio
 #     )
 
 
+@app.exception_handler(RateLimitExceededException)
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceededException):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail, "type": "rate_limit_exceeded"},
+        headers=exc.headers
+    )
+
+
+@app.exception_handler(ClientDisconnectedException)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnectedException):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail, "type": "client_disconnected"}
+    )
+
+
+@app.exception_handler(DeadlineExceededException)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceededException):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail, "type": "deadline_exceeded"}
+    )
+
+
 @app.exception_handler(DatabaseException)
 async def database_handler(request: Request, exc: DatabaseException):
     return JSONResponse(
@@ -220,23 +288,29 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Comprehensive health check endpoint."""
-    # from .services.ai_service import ai_service
+    """
+    Comprehensive health check endpoint.
+    
+    Reports the latest background probe (see ai_health.py) without touching the
+    database or the AI providers, so load balancer pings are fast and free.
+    """
+    from .services.ai_health import ai_health_probe
     
     health_status = {
         "status": "healthy",
-        "database": check_db_connection(),
-        "ai_service": False,  # ai_service.health_check(),
-        "timestamp": "2024-12-19T10:00:00Z"
+        **ai_health_probe.get_status(),
+        "timestamp": datetime.utcnow().isoformat() + "Z"
     }
     
     # Determine overall status
-    if not health_status["database"]:
+    if health_status["checked_at"] is None:
+        health_status["status"] = "starting"
+    elif not health_status["database"]:
         health_status["status"] = "unhealthy"
     elif not health_status["ai_service"]:
         health_status["status"] = "degraded"
     
-    status_code = 200 if health_status["status"] != "unhealthy" else 503
+    status_code = 200 if health_status["status"] not in ("unhealthy", "starting") else 503
     
     return JSONResponse(
         status_code=status_code,
@@ -6,5 +6,9 @@ Import all models to ensure proper SQLAlchemy relationship resolution.
 from .user import User
 from .category import Category, SubCategory
 from .prompt import Prompt
+from .lesson_cache import LessonCacheEntry
+from .pregenerated_lesson import PregeneratedLesson
+from .lesson_section import LessonSection
+from .user_usage import UserUsage
 
-__all__ = ["User", "Category", "SubCategory", "Prompt"]
+__all__ = ["User", "Category", "SubCategory", "Prompt", "LessonCacheEntry", "PregeneratedLesson", "LessonSection", "UserUsage"]
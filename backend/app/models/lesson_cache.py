@@ -0,0 +1,43 @@
+"""
+Lesson cache SQLAlchemy model.
+Persistent tier of the exact-match lesson cache shared by all workers.
+"""
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy.sql import func
+
+from ..core.database import Base
+
+
+class LessonCacheEntry(Base):
+    """
+    Cached AI lesson keyed by a hash of the normalized request.
+    
+    The key covers prompt, category name, subcategory name and model, so a
+    hit can be served without calling the AI provider.
+    """
+    __tablename__ = "lesson_cache"
+    
+    # Primary key
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # SHA-256 hex digest of the normalized request
+    cache_key = Column(String(64), unique=True, nullable=False, index=True)
+    
+    # Request the lesson was generated for
+    prompt = Column(Text, nullable=False)
+    category_name = Column(String(100), nullable=True)
+    subcategory_name = Column(String(100), nullable=True)
+    ai_model = Column(String(50), nullable=False)
+    
+    # Cached lesson content
+    response = Column(Text, nullable=False)
+    
+    # Usage tracking
+    hit_count = Column(Integer, default=0, server_default="0", nullable=False)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=func.current_timestamp(), server_default=func.current_timestamp(), index=True)
+    last_hit_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<LessonCacheEntry(id={self.id}, key='{self.cache_key[:12]}', model='{self.ai_model}')>"
@@ -0,0 +1,55 @@
+"""
+Lesson section SQLAlchemy model.
+Stores a generated lesson split at its headings so clients can load it piece by piece.
+"""
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import relationship
+
+from ..core.database import Base
+
+
+class LessonSection(Base):
+    """
+    One heading-delimited section of a prompt's lesson.
+    
+    Sections are written together with the Prompt row and ordered by position.
+    """
+    __tablename__ = "lesson_sections"
+    __table_args__ = (
+        UniqueConstraint("prompt_id", "position", name="uq_lesson_sections_prompt_position"),
+    )
+    
+    # Primary key
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Owning prompt
+    prompt_id = Column(Integer, ForeignKey("prompts.id", ondelete="CASCADE"), nullable=False, index=True)
+    
+    # Table of contents entry
+    position = Column(Integer, nullable=False)
+    level = Column(Integer, nullable=False)  # 0 for text before the first heading
+    title = Column(String(300), nullable=False)
+    anchor = Column(String(120), nullable=False)
+    
+    # Section markdown, starting with its heading line
+    content = Column(Text, nullable=False)
+    char_count = Column(Integer, nullable=False)
+    
+    # Relationships
+    prompt = relationship("Prompt", back_populates="sections")
+    
+    def __repr__(self):
+        return f"<LessonSection(prompt_id={self.prompt_id}, position={self.position}, title='{self.title[:30]}')>"
+    
+    def to_dict(self, include_content: bool = True):
+        """Convert section to dictionary, optionally without its content."""
+        data = {
+            "position": self.position,
+            "level": self.level,
+            "title": self.title,
+            "anchor": self.anchor,
+            "char_count": self.char_count,
+        }
+        if include_content:
+            data["content"] = self.content
+        return data
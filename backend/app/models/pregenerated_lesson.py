@@ -0,0 +1,49 @@
+"""
+Pre-generated lesson SQLAlchemy model.
+Lessons generated off-peak for the most frequent prompts of each subcategory.
+"""
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+
+from ..core.database import Base
+
+
+class PregeneratedLesson(Base):
+    """
+    Lesson generated ahead of time for a popular prompt in a subcategory.
+    
+    Looked up by subcategory and a hash of the normalized prompt, so a matching
+    request is answered without calling the AI provider.
+    """
+    __tablename__ = "pregenerated_lessons"
+    __table_args__ = (
+        UniqueConstraint("sub_category_id", "prompt_hash", name="uq_pregenerated_lessons_subcategory_prompt"),
+    )
+    
+    # Primary key
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Lookup key
+    sub_category_id = Column(Integer, ForeignKey("sub_categories.id", ondelete="CASCADE"), nullable=False, index=True)
+    prompt_hash = Column(String(64), nullable=False)
+    normalized_prompt = Column(Text, nullable=False)
+    
+    # Most common original spelling, used for generation
+    prompt = Column(Text, nullable=False)
+    
+    # Generation parameters; a lesson is only served while they still match
+    lesson_length = Column(String(10), nullable=False)
+    prompt_template = Column(String(50), nullable=True)
+    ai_model = Column(String(50), nullable=False)
+    
+    # Generated lesson content
+    response = Column(Text, nullable=False)
+    
+    # How often the prompt was asked in the mining window
+    request_count = Column(Integer, default=0, server_default="0", nullable=False)
+    
+    # Timestamp
+    generated_at = Column(DateTime, default=func.current_timestamp(), server_default=func.current_timestamp(), index=True)
+    
+    def __repr__(self):
+        return f"<PregeneratedLesson(id={self.id}, sub_category_id={self.sub_category_id}, requests={self.request_count})>"
@@ -2,7 +2,7 @@
 Prompt SQLAlchemy model with AI response tracking.
 Stores user prompts, AI responses, and performance metrics.
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -37,6 +37,17 @@ class Prompt(Base):
     
     # Performance tracking
     response_time_ms = Column(Integer, nullable=True)
+    cache_hit = Column(Boolean, nullable=False, default=False, server_default='false')
+    partial = Column(Boolean, nullable=False, default=False, server_default='false')  # client left mid-stream
+    prompt_template = Column(String(50), nullable=True, index=True)  # e.g. "Technology:v1"
+    
+    # Generation telemetry (null for cache hits and rows saved before it was recorded)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    queue_wait_ms = Column(Integer, nullable=True)
+    first_token_ms = Column(Integer, nullable=True)  # NULL for cached lessons
+    total_time_ms = Column(Integer, nullable=True)
+    retries = Column(Integer, nullable=True)
     
     # Timestamp
     created_at = Column(DateTime, default=func.current_timestamp(), server_default=func.current_timestamp(), index=True)
@@ -45,6 +56,12 @@ class Prompt(Base):
     user = relationship("User", back_populates="prompts")
     category = relationship("Category", back_populates="prompts")
     sub_category = relationship("SubCategory", back_populates="prompts")
+    sections = relationship(
+        "LessonSection",
+        back_populates="prompt",
+        cascade="all, delete-orphan",
+        order_by="LessonSection.position"
+    )
     
     def __repr__(self):
         return f"<Prompt(id={self.id}, user_id={self.user_id}, category_id={self.category_id})>"
@@ -60,6 +77,15 @@ class Prompt(Base):
             "response": self.response,
             "ai_model": self.ai_model,
             "response_time_ms": self.response_time_ms,
+            "cache_hit": self.cache_hit,
+            "partial": self.partial,
+            "prompt_template": self.prompt_template,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "queue_wait_ms": self.queue_wait_ms,
+            "first_token_ms": self.first_token_ms,
+            "total_time_ms": self.total_time_ms,
+            "retries": self.retries,
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
     
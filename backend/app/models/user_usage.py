@@ -0,0 +1,38 @@
+"""
+User AI usage SQLAlchemy model.
+Daily per-user counters backing the generated-token quota.
+"""
+from sqlalchemy import Column, Integer, Date, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+
+from ..core.database import Base
+
+
+class UserUsage(Base):
+    """
+    AI usage of one user on one (UTC) day.
+    
+    Updated in batches from the in-process rate limiter, so the daily
+    quota survives restarts and is shared between workers.
+    """
+    __tablename__ = "user_ai_usage"
+    __table_args__ = (
+        UniqueConstraint("user_id", "usage_date", name="uq_user_ai_usage_user_date"),
+    )
+    
+    # Primary key
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Owner and day
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    usage_date = Column(Date, nullable=False, index=True)
+    
+    # Counters
+    tokens_used = Column(Integer, default=0, server_default="0", nullable=False)
+    requests = Column(Integer, default=0, server_default="0", nullable=False)
+    
+    # Timestamp
+    updated_at = Column(DateTime, default=func.current_timestamp(), onupdate=func.current_timestamp())
+    
+    def __repr__(self):
+        return f"<UserUsage(user_id={self.user_id}, date={self.usage_date}, tokens={self.tokens_used})>"
@@ -1,21 +1,119 @@
 """
 Prompt API routes for user prompt submissions and history.
 """
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import func
+from sqlalchemy.orm import Session, load_only
+from typing import List, Optional, Awaitable, TypeVar
+import asyncio
+import json
+import logging
 
-from ..core.database import get_db
+from ..core.config import settings
+from ..core.database import get_db, SessionLocal
+from ..core.deadline import no_deadline
 from ..core.auth import get_current_user, get_current_admin_user
 from ..models.user import User
 from ..models.prompt import Prompt
+from ..models.lesson_section import LessonSection
 from ..models.category import Category, SubCategory
-from ..schemas.prompt import PromptResponse, PromptCreate, PromptWithRelations
-from ..services.ai_service import AIService
-from ..core.exceptions import AIServiceException
+from ..schemas.prompt import (
+    PromptResponse,
+    PromptCreate,
+    PromptWithRelations,
+    LessonJobResponse,
+    LessonTocResponse,
+    LessonSectionResponse,
+    PromptBatchCreate,
+    PromptBatchResponse
+)
+from ..services.ai_service import AIService, get_ai_service
+from ..services.lesson_service import LessonService, lesson_flight
+from ..services.lesson_cache import lesson_cache
+from ..services.lesson_jobs import lesson_jobs, LessonJob, StreamingLessonJob
+from ..services.lesson_pregeneration import lesson_pregenerator
+from ..services.rate_limiter import user_rate_limiter
+from ..services.ai_health import ai_health_probe
+from ..services.semantic_index import semantic_index
+from ..utils.content_filter import content_filter
+from ..core.exceptions import (
+    AIServiceException,
+    AIServiceOverloadedException,
+    ClientDisconnectedException,
+    LessonJobNotFoundException,
+    LessonSectionNotFoundException,
+    PromptNotFoundException,
+    ValidationException
+)
 
 router = APIRouter()
-ai_service = AIService()
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def _sse_event(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    """Format a Server-Sent Events message, with an ID clients can resume from."""
+    id_line = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{id_line}event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _get_user_prompt(db: Session, prompt_id: int, user: User) -> Prompt:
+    """Load a prompt owned by the user or raise PromptNotFoundException."""
+    prompt = db.query(Prompt).filter(
+        Prompt.id == prompt_id,
+        Prompt.user_id == user.id
+    ).first()
+    
+    if not prompt:
+        raise PromptNotFoundException(prompt_id)
+    
+    return prompt
+
+
+def _check_user_prompt(db: Session, prompt_id: int, user: User) -> None:
+    """Raise PromptNotFoundException unless the user owns the prompt, without loading the lesson."""
+    owned = db.query(Prompt.id).filter(
+        Prompt.id == prompt_id,
+        Prompt.user_id == user.id
+    ).first()
+    
+    if not owned:
+        raise PromptNotFoundException(prompt_id)
+
+
+async def _cancel_on_disconnect(request: Request, work: Awaitable[T]) -> T:
+    """
+    Await work, cancelling it if the client disconnects first.
+    
+    Cancelling the generation closes the provider request and releases the
+    AI limiter slot straight away instead of paying for a lesson nobody reads.
+    
+    Raises:
+        ClientDisconnectedException: If the client went away before the work finished
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=settings.client_disconnect_poll_seconds)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info(f"Client disconnected from {request.url.path}, cancelling generation")
+                raise ClientDisconnectedException()
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+def _screen_prompt(prompt: str) -> None:
+    """Reject a prompt that contains blocked terms (raises ValidationException)."""
+    blocked = content_filter.find(prompt)
+    if blocked:
+        logger.warning(f"Prompt rejected by content filter: {blocked!r}")
+        raise ValidationException("Prompt contains content that is not allowed")
 
 
 @router.get("/admin/all-history", response_model=List[PromptWithRelations])
@@ -62,6 +160,8 @@ async def get_all_history_admin(
                 "response": prompt.response,
                 "ai_model": prompt.ai_model,
                 "response_time_ms": prompt.response_time_ms,
+                "cache_hit": prompt.cache_hit,
+                "prompt_template": prompt.prompt_template,
                 "created_at": prompt.created_at,
                 "user_name": user_name,
                 "user_email": user_email,
@@ -91,17 +191,95 @@ async def get_admin_stats(
         total_categories = db.query(Category).count()
         total_subcategories = db.query(SubCategory).count()
         
+        # Per-model generation telemetry, for cost and latency analysis
+        model_rows = db.query(
+            Prompt.ai_model,
+            func.count(Prompt.id),
+            func.sum(Prompt.prompt_tokens),
+            func.sum(Prompt.completion_tokens),
+            func.avg(Prompt.queue_wait_ms),
+            func.avg(Prompt.first_token_ms),
+            func.avg(Prompt.total_time_ms),
+            func.sum(Prompt.retries)
+        ).filter(
+            Prompt.total_time_ms.isnot(None)
+        ).group_by(Prompt.ai_model).all()
+        
+        # Per-template latency and size, for comparing template versions
+        template_rows = db.query(
+            Prompt.prompt_template,
+            func.count(Prompt.id),
+            func.avg(Prompt.response_time_ms),
+            func.avg(func.length(Prompt.response))
+        ).filter(
+            Prompt.cache_hit.is_(False)
+        ).group_by(Prompt.prompt_template).all()
+        
         return {
             "total_prompts": total_prompts,
             "total_users": total_users,
             "total_categories": total_categories,
-            "total_subcategories": total_subcategories
+            "total_subcategories": total_subcategories,
+            "prompt_templates": [
+                {
+                    "prompt_template": template,
+                    "count": count,
+                    "avg_response_time_ms": round(float(avg_time), 1) if avg_time is not None else None,
+                    "avg_response_length": round(float(avg_length), 1) if avg_length is not None else None
+                }
+                for template, count, avg_time, avg_length in template_rows
+            ],
+            "models": [
+                {
+                    "ai_model": model,
+                    "generations": count,
+                    "prompt_tokens": int(prompt_tokens or 0),
+                    "completion_tokens": int(completion_tokens or 0),
+                    "avg_queue_wait_ms": round(float(avg_queue), 1) if avg_queue is not None else None,
+                    "avg_first_token_ms": round(float(avg_first_token), 1) if avg_first_token is not None else None,
+                    "avg_total_time_ms": round(float(avg_total), 1) if avg_total is not None else None,
+                    "retries": int(retries or 0)
+                }
+                for model, count, prompt_tokens, completion_tokens, avg_queue, avg_first_token, avg_total, retries in model_rows
+            ]
         }
     except Exception as e:
         print(f"❌ ERROR getting admin stats: {e}")
         raise HTTPException(status_code=500, detail="Failed to get statistics")
 
 
+@router.get("/admin/ai-stats")
+async def get_ai_stats(
+    admin_user: User = Depends(get_current_admin_user),
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """Get AI provider, queue and cache statistics (admin only)."""
+    return {
+        "ai_service": ai_service.get_model_info(),
+        "health": ai_health_probe.get_status(),
+        "lesson_cache": lesson_cache.get_stats(),
+        "coalescing": lesson_flight.get_stats(),
+        "jobs": lesson_jobs.get_stats(),
+        "pregeneration": lesson_pregenerator.get_stats(),
+        "semantic_lookup": semantic_index.get_stats(),
+        "content_filter": content_filter.get_stats(),
+        "rate_limiter": user_rate_limiter.get_stats()
+    }
+
+
+@router.post("/admin/pregenerate", status_code=202)
+async def trigger_pregeneration(
+    admin_user: User = Depends(get_current_admin_user),
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """Start a lesson pre-generation run now instead of waiting for off-peak hours (admin only)."""
+    if not lesson_pregenerator.enabled:
+        raise HTTPException(status_code=409, detail="Lesson pre-generation is disabled")
+    if not lesson_pregenerator.trigger(ai_service):
+        raise HTTPException(status_code=409, detail="Lesson pre-generation is already running")
+    return {"started": True}
+
+
 @router.get("/my-stats")
 async def get_my_stats(
     current_user: User = Depends(get_current_user),
@@ -116,6 +294,12 @@ async def get_my_stats(
         raise HTTPException(status_code=500, detail="Failed to get statistics")
 
 
+@router.get("/my-usage")
+async def get_my_usage(current_user: User = Depends(get_current_user)):
+    """Get current user's AI usage today and remaining daily quota."""
+    return user_rate_limiter.get_usage(current_user.id)
+
+
 @router.get("/my-history", response_model=List[PromptWithRelations])
 async def get_my_history(
     current_user: User = Depends(get_current_user),
@@ -158,6 +342,8 @@ async def get_my_history(
                 "response": prompt.response,
                 "ai_model": prompt.ai_model,
                 "response_time_ms": prompt.response_time_ms,
+                "cache_hit": prompt.cache_hit,
+                "prompt_template": prompt.prompt_template,
                 "created_at": prompt.created_at,
                 "user_name": current_user.name,
                 "user_email": current_user.email,
@@ -179,62 +365,256 @@ async def get_my_history(
 @router.post("/", response_model=PromptResponse)
 async def create_prompt(
     prompt_data: PromptCreate,
+    request: Request,
+    mode: str = Query("sync", pattern="^(sync|async)$", description="'async' queues the lesson and returns 202 with a job"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    ai_service: AIService = Depends(get_ai_service)
 ):
-    """Create a new prompt and generate AI response."""
+    """
+    Create a new prompt and generate AI response.
+    
+    In sync mode the generation is cancelled if the client disconnects.
+    """
+    # Cheap content check first, so rejected prompts never reach the DB or the AI provider
+    _screen_prompt(prompt_data.prompt)
+    user_rate_limiter.check(current_user)
+    
     try:
         print(f"🔍 DEBUG: Received prompt_data: {prompt_data}")
         print(f"🔍 DEBUG: Prompt length: {len(prompt_data.prompt) if prompt_data.prompt else 0}")
         print(f"🔍 DEBUG: Current user: {current_user.id}")
         
-        # Get category and subcategory names for context
-        category_name = None
-        subcategory_name = None
+        if mode == "async":
+            # Hand the generation to the background workers and return straight away
+            job = lesson_jobs.submit(
+                ai_service,
+                current_user.id,
+                prompt_data,
+                user_context=f"User: {current_user.name or current_user.email}"
+            )
+            return JSONResponse(
+                status_code=202,
+                content=job.to_dict(),
+                headers={"Location": f"/api/prompts/jobs/{job.id}"}
+            )
         
-        if prompt_data.category_id:
-            category = db.query(Category).filter(Category.id == prompt_data.category_id).first()
-            if category:
-                category_name = category.name
+        lesson_service = LessonService(db, ai_service)
         
-        if prompt_data.sub_category_id:
-            subcategory = db.query(SubCategory).filter(SubCategory.id == prompt_data.sub_category_id).first()
-            if subcategory:
-                subcategory_name = subcategory.name
+        # Get category and subcategory names for context
+        category_name, subcategory_name = lesson_service.get_context_names(prompt_data)
         
-        # Generate AI response
-        ai_response = ai_service.generate_lesson(
+        # Serve from the lesson cache or generate without blocking the event loop
+        ai_response = await _cancel_on_disconnect(request, lesson_service.generate_lesson(
             prompt=prompt_data.prompt,
             category_name=category_name,
             subcategory_name=subcategory_name,
-            user_context=f"User: {current_user.name or current_user.email}"
-        )
-        
-        # Create new prompt record
-        new_prompt = Prompt(
-            user_id=current_user.id,
-            category_id=prompt_data.category_id,
+            user_context=f"User: {current_user.name or current_user.email}",
+            lesson_length=prompt_data.lesson_length,
             sub_category_id=prompt_data.sub_category_id,
-            prompt=prompt_data.prompt,
-            response=ai_response["response"],
-            ai_model=ai_response["model_used"],
-            response_time_ms=ai_response["response_time_ms"]
-        )
+            parallel_sections=prompt_data.parallel_sections
+        ))
         
-        db.add(new_prompt)
-        db.commit()
-        db.refresh(new_prompt)
+        # Create new prompt record
+        new_prompt = lesson_service.save_prompt(current_user.id, prompt_data, ai_response)
         
         return PromptResponse.model_validate(new_prompt)
         
     except AIServiceException as e:
-        raise HTTPException(status_code=503, detail=f"AI service error: {str(e)}")
+        raise HTTPException(status_code=e.status_code, detail=f"AI service error: {e.detail}", headers=e.headers)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ DEBUG: Error in create_prompt: {e}")
         db.rollback()
         raise HTTPException(status_code=500, detail="Failed to process prompt")
 
 
+@router.post("/batch", response_model=PromptBatchResponse)
+async def create_prompt_batch(
+    batch: PromptBatchCreate,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """
+    Generate lessons for several prompts in one request.
+    
+    Items are generated concurrently and every successful lesson is saved in
+    one transaction. Each item reports its own status, so one failure does
+    not fail the batch. Each item counts as one request against the user's rate limit;
+    a batch with more items than RATE_LIMIT_BURST needs a full bucket and leaves it in
+    debt, so the user's next request waits until the extra items have refilled.
+    The whole batch is cancelled if the client disconnects.
+    """
+    # Reject an oversized batch before it takes anything from the user's rate limit
+    if len(batch.items) > settings.lesson_batch_max_items:
+        raise ValidationException(f"A batch can contain at most {settings.lesson_batch_max_items} prompts")
+    user_rate_limiter.check(current_user, cost=len(batch.items))
+    lesson_service = LessonService(db, ai_service)
+    try:
+        results = await _cancel_on_disconnect(request, lesson_service.generate_batch(
+            current_user.id,
+            batch.items,
+            user_context=f"User: {current_user.name or current_user.email}"
+        ))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Batch generation failed: {e}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Failed to process batch")
+    
+    successful = sum(1 for result in results if result["success"])
+    return PromptBatchResponse(
+        processed=len(results),
+        successful=successful,
+        failed=len(results) - successful,
+        results=[
+            {
+                "index": result["index"],
+                "success": result["success"],
+                "status_code": result["status_code"],
+                "prompt": PromptResponse.model_validate(result["prompt"]) if result["success"] else None,
+                "error": result.get("error")
+            }
+            for result in results
+        ]
+    )
+
+
+async def _job_events(job: StreamingLessonJob, last_event_id: int = -1, announce: bool = False):
+    """
+    Server-Sent Events for a streaming lesson job.
+    
+    Each `chunk` event carries its index as the event ID, so a reconnecting
+    client can send it back as Last-Event-ID. The stream ends with a `done`
+    event holding the saved prompt, or an `error` event.
+    """
+    if announce:
+        yield _sse_event("job", job.to_dict())
+    async for index, chunk in lesson_jobs.follow(job, last_event_id):
+        yield _sse_event("chunk", {"content": chunk}, event_id=index)
+    
+    if job.status != LessonJob.COMPLETED:
+        yield _sse_event("error", {"detail": job.error or "Failed to process prompt"})
+        return
+    
+    # The lesson is already generated and saved; deliver it even if the request deadline has passed
+    with no_deadline():
+        db = SessionLocal()
+        try:
+            prompt = db.query(Prompt).filter(Prompt.id == job.prompt_id).first()
+            done = PromptResponse.model_validate(prompt).model_dump(mode="json")
+        finally:
+            db.close()
+    yield _sse_event("done", done)
+
+
+def _stream_response(job: StreamingLessonJob, last_event_id: int = -1, announce: bool = False) -> StreamingResponse:
+    """Wrap a streaming job's events in an SSE response that names the job."""
+    return StreamingResponse(
+        _job_events(job, last_event_id, announce),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Lesson-Job-Id": job.id}
+    )
+
+
+@router.post("/stream")
+async def create_prompt_stream(
+    prompt_data: PromptCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """
+    Create a new prompt and stream the AI response as Server-Sent Events.
+    
+    The lesson is generated as a background job: a `job` event with its ID
+    comes first, then `chunk` events while the lesson is generated, then a
+    `done` event with the saved prompt, or an `error` event if generation
+    fails. A client whose connection drops can resume with
+    GET /jobs/{job_id}/stream and Last-Event-ID; if none reconnects within
+    LESSON_STREAM_RESUME_SECONDS, generation stops (with
+    LESSON_KEEP_PARTIAL_ON_DISCONNECT the text so far is saved as a partial lesson).
+    """
+    _screen_prompt(prompt_data.prompt)
+    user_rate_limiter.check(current_user)
+    
+    lesson_service = LessonService(db, ai_service)
+    category_name, subcategory_name = lesson_service.get_context_names(prompt_data)
+    cached = lesson_service.get_cached_lesson(
+        prompt_data.prompt, category_name, subcategory_name, prompt_data.lesson_length,
+        prompt_data.sub_category_id
+    )
+    
+    # Reject up front while the AI queue is full, before the 200 stream starts
+    if not cached and ai_service.limiter.is_saturated():
+        overloaded = AIServiceOverloadedException(ai_service.limiter.retry_after_seconds)
+        raise HTTPException(status_code=overloaded.status_code, detail=f"AI service error: {overloaded.detail}", headers=overloaded.headers)
+    
+    user_id = current_user.id
+    user_context = f"User: {current_user.name or current_user.email}"
+    # The request session is only closed after the stream ends; end its transaction now so
+    # the pooled connection is free while the lesson streams (the job saves on its own session)
+    db.commit()
+    
+    job = lesson_jobs.start_stream(
+        ai_service,
+        user_id,
+        prompt_data,
+        category_name=category_name,
+        subcategory_name=subcategory_name,
+        user_context=user_context,
+        cached=cached
+    )
+    return _stream_response(job, announce=True)
+
+
+@router.get("/jobs/{job_id}/stream")
+async def resume_prompt_stream(
+    job_id: str,
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID", description="Index of the last chunk received"),
+    after: Optional[int] = Query(None, description="Same as Last-Event-ID, for clients that cannot set headers"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Resume a streamed lesson after the connection dropped.
+    
+    Replays the chunks after Last-Event-ID and follows the generation if it
+    is still running. Chunks are not kept once a job has finished, so the
+    stream of a finished job is only its `done` event, carrying the whole
+    saved prompt, or its `error` event.
+    """
+    job = lesson_jobs.get(job_id)
+    if not isinstance(job, StreamingLessonJob) or job.user_id != current_user.id:
+        raise LessonJobNotFoundException(job_id)
+    
+    resume_from = last_event_id if last_event_id is not None else after
+    return _stream_response(job, resume_from if resume_from is not None else -1)
+
+
+@router.get("/jobs/{job_id}", response_model=LessonJobResponse)
+async def get_lesson_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the status of a background lesson job, with the saved prompt once completed."""
+    job = lesson_jobs.get(job_id)
+    if not job or job.user_id != current_user.id:
+        raise LessonJobNotFoundException(job_id)
+    
+    job_data = job.to_dict()
+    if job.prompt_id:
+        prompt = db.query(Prompt).filter(Prompt.id == job.prompt_id).first()
+        if prompt:
+            job_data["result"] = PromptResponse.model_validate(prompt)
+    
+    return LessonJobResponse(**job_data)
+
+
 @router.get("/{prompt_id}", response_model=PromptResponse)
 async def get_prompt(
     prompt_id: int,
@@ -242,13 +622,50 @@ async def get_prompt(
     db: Session = Depends(get_db)
 ):
     """Get a specific prompt."""
-    prompt = db.query(Prompt).filter(
-        Prompt.id == prompt_id,
-        Prompt.user_id == current_user.id
+    prompt = _get_user_prompt(db, prompt_id, current_user)
+    return PromptResponse.model_validate(prompt)
+
+
+@router.get("/{prompt_id}/sections", response_model=LessonTocResponse)
+async def get_prompt_sections(
+    prompt_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the table of contents of a prompt's lesson, without the section content."""
+    _check_user_prompt(db, prompt_id, current_user)
+    sections = db.query(LessonSection).options(
+        load_only(
+            LessonSection.position,
+            LessonSection.level,
+            LessonSection.title,
+            LessonSection.anchor,
+            LessonSection.char_count
+        )
+    ).filter(LessonSection.prompt_id == prompt_id).order_by(LessonSection.position).all()
+    
+    return LessonTocResponse(
+        prompt_id=prompt_id,
+        total_chars=sum(section.char_count for section in sections),
+        sections=sections
+    )
+
+
+@router.get("/{prompt_id}/sections/{position}", response_model=LessonSectionResponse)
+async def get_prompt_section(
+    prompt_id: int,
+    position: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a single section of a prompt's lesson by its position in the table of contents."""
+    _check_user_prompt(db, prompt_id, current_user)
+    section = db.query(LessonSection).filter(
+        LessonSection.prompt_id == prompt_id,
+        LessonSection.position == position
     ).first()
     
-    if not prompt:
-        from ..core.exceptions import PromptNotFoundException
-        raise PromptNotFoundException(prompt_id)
+    if not section:
+        raise LessonSectionNotFoundException(prompt_id, position)
     
-    return PromptResponse.model_validate(prompt)
+    return LessonSectionResponse.model_validate(section)
@@ -25,7 +25,15 @@ class PromptBase(BaseModel):
 
 class PromptCreate(PromptBase):
     """Schema for prompt creation."""
-    pass
+    lesson_length: Optional[str] = Field(
+        None,
+        pattern="^(short|medium|long)$",
+        description="Desired lesson length; defaults to the category or global setting"
+    )
+    parallel_sections: bool = Field(
+        False,
+        description="Outline the lesson first, then generate its sections concurrently (medium and long lessons)"
+    )
 
 
 class PromptUpdate(BaseModel):
@@ -42,6 +50,9 @@ class PromptResponse(PromptBase):
     response: Optional[str] = Field(None, description="AI generated response")
     ai_model: str = Field(default="gpt-3.5-turbo", description="AI model used")
     response_time_ms: Optional[int] = Field(None, description="Response time in milliseconds")
+    cache_hit: bool = Field(default=False, description="Whether the response was served from the lesson cache")
+    partial: bool = Field(default=False, description="Whether the lesson was cut short because the client disconnected")
+    prompt_template: Optional[str] = Field(None, description="Prompt template id and version used, e.g. 'default:v1'")
     created_at: datetime
 
     class Config:
@@ -56,6 +67,65 @@ class PromptWithRelations(PromptResponse):
     sub_category_name: Optional[str] = Field(None, description="SubCategory name")
 
 
+class LessonJobResponse(BaseModel):
+    """Schema for background lesson job status."""
+    id: str = Field(..., description="Job ID")
+    status: str = Field(..., description="queued, running, completed or failed")
+    prompt_id: Optional[int] = Field(None, description="ID of the saved prompt once completed")
+    error: Optional[str] = Field(None, description="Error message if the job failed")
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    chunks: Optional[int] = Field(None, description="Chunks generated so far, for streamed lessons")
+    result: Optional[PromptResponse] = Field(None, description="Saved prompt once completed")
+
+
+class LessonSectionSummary(BaseModel):
+    """Table of contents entry for one lesson section."""
+    position: int = Field(..., description="Section index, starting at 0")
+    level: int = Field(..., description="Heading level (0 for text before the first heading)")
+    title: str
+    anchor: str = Field(..., description="URL-friendly section identifier")
+    char_count: int = Field(..., description="Length of the section markdown")
+    
+    class Config:
+        from_attributes = True
+
+
+class LessonSectionResponse(LessonSectionSummary):
+    """Schema for a single lesson section with its markdown."""
+    content: str
+
+
+class LessonTocResponse(BaseModel):
+    """Schema for a lesson's table of contents."""
+    prompt_id: int
+    total_chars: int
+    sections: List[LessonSectionSummary]
+
+
+class PromptBatchCreate(BaseModel):
+    """Schema for generating several lessons in one request."""
+    items: List[PromptCreate] = Field(..., min_length=1, description="Prompts to generate lessons for")
+
+
+class PromptBatchItemResult(BaseModel):
+    """Outcome of one item in a batch."""
+    index: int = Field(..., description="Position of the item in the request")
+    success: bool
+    status_code: int = Field(..., description="HTTP status the item would have had on its own")
+    prompt: Optional[PromptResponse] = Field(None, description="Saved prompt if generation succeeded")
+    error: Optional[str] = Field(None, description="Error message if generation failed")
+
+
+class PromptBatchResponse(BaseModel):
+    """Schema for batch lesson generation results."""
+    processed: int
+    successful: int
+    failed: int
+    results: List[PromptBatchItemResult]
+
+
 class PromptListResponse(BaseModel):
     """Schema for paginated prompt list responses."""
     prompts: List[PromptResponse]
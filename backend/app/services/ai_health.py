@@ -0,0 +1,114 @@
+"""
+Background health probe for the AI providers and the database.
+Checks reachability with calls that generate no tokens and caches the result,
+so /health answers from memory instead of calling the providers on every ping.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from ..core.config import settings
+from ..core.database import check_db_connection
+from .ai_providers import AIProvider
+from .ai_service import AIService
+
+logger = logging.getLogger(__name__)
+
+
+class AIHealthProbe:
+    """Periodically probes every provider and the database, keeping the latest result."""
+    
+    def __init__(self, interval_seconds: int = 30, timeout_seconds: float = 5.0):
+        self.interval_seconds = interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self.database = False
+        self.providers: List[Dict[str, Any]] = []
+        self.checked_at: Optional[datetime] = None
+        self._checked_monotonic: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self, ai: AIService) -> None:
+        """Start probing (call from the running event loop); the first probe runs immediately."""
+        if self._task:
+            return
+        self._task = asyncio.create_task(self._probe_loop(ai), name="ai-health-probe")
+    
+    async def stop(self) -> None:
+        """Stop probing."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    async def probe(self, ai: AIService) -> None:
+        """
+        Probe the database and every provider concurrently and store the result.
+        
+        Args:
+            ai: Service whose providers are probed
+        """
+        database, *providers = await asyncio.gather(
+            asyncio.to_thread(check_db_connection),
+            *(self._probe_provider(provider) for provider in ai.providers)
+        )
+        self.database = database
+        self.providers = providers
+        self.checked_at = datetime.utcnow()
+        self._checked_monotonic = time.monotonic()
+    
+    async def _probe_provider(self, provider: AIProvider) -> Dict[str, Any]:
+        """Check one provider, skipping the network call while its circuit is open."""
+        result = {"provider": provider.name, "model_name": provider.model_name, "circuit": provider.breaker.state}
+        if provider.breaker.is_open:
+            return {**result, "healthy": False, "latency_ms": None, "error": "circuit open"}
+        
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(provider.ping(), timeout=self.timeout_seconds)
+        except Exception as e:
+            logger.warning(f"AI health probe failed for {provider.name}: {e!r}")
+            return {**result, "healthy": False, "latency_ms": None, "error": type(e).__name__}
+        return {**result, "healthy": True, "latency_ms": int((time.perf_counter() - start) * 1000), "error": None}
+    
+    @property
+    def is_stale(self) -> bool:
+        """True if no probe finished within the last three intervals."""
+        return (
+            self._checked_monotonic is None
+            or time.monotonic() - self._checked_monotonic > 3 * self.interval_seconds
+        )
+    
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Return the cached health result.
+        
+        The AI service is healthy when at least one provider answered the last
+        probe (failover covers the others) and that probe is not stale.
+        
+        Returns:
+            Dictionary with "database", "ai_service", "providers" and "checked_at"
+        """
+        return {
+            "database": self.database,
+            "ai_service": not self.is_stale and any(provider["healthy"] for provider in self.providers),
+            "providers": self.providers,
+            "checked_at": self.checked_at.isoformat() + "Z" if self.checked_at else None,
+        }
+    
+    async def _probe_loop(self, ai: AIService) -> None:
+        """Probe every interval_seconds until cancelled."""
+        while True:
+            try:
+                await self.probe(ai)
+            except Exception as e:
+                logger.error(f"Health probe error: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+
+# Global health probe
+ai_health_probe = AIHealthProbe(
+    interval_seconds=settings.ai_health_probe_interval_seconds,
+    timeout_seconds=settings.ai_health_probe_timeout_seconds
+)
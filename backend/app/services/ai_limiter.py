@@ -0,0 +1,134 @@
+"""
+Admission control for outbound AI calls.
+Bounds concurrent provider requests and the number of requests waiting for a slot.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+
+from ..core.deadline import remaining, check_deadline
+from ..core.exceptions import AIServiceOverloadedException, DeadlineExceededException
+from .latency import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyLimiter:
+    """
+    Concurrency limiter with a bounded wait queue.
+    
+    At most max_concurrency calls run at once and at most max_queue_size wait
+    for a slot; further callers are rejected immediately with a 429 so they
+    can retry instead of piling up behind the provider's rate limit.
+    """
+    
+    def __init__(
+        self,
+        max_concurrency: int = 20,
+        max_queue_size: int = 100,
+        queue_timeout_seconds: float = 30.0,
+        retry_after_seconds: int = 5
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_times = LatencyWindow()
+    
+    def is_saturated(self) -> bool:
+        """True if a new caller would be rejected right now."""
+        return self._semaphore.locked() and self.waiting >= self.max_queue_size
+    
+    async def acquire(self) -> float:
+        """
+        Wait for a slot.
+        
+        Returns:
+            Time spent waiting in milliseconds
+            
+        Raises:
+            AIServiceOverloadedException: If the queue is full or the wait times out
+            DeadlineExceededException: If the request's deadline passes while waiting
+        """
+        start = time.monotonic()
+        check_deadline("start an AI request")
+        
+        if not self._semaphore.locked():
+            # Free slot and nobody queued: take it without waiting
+            await self._semaphore.acquire()
+        else:
+            if self.waiting >= self.max_queue_size:
+                self.rejected += 1
+                raise AIServiceOverloadedException(self.retry_after_seconds)
+            
+            # Never wait past the request's deadline
+            left = remaining()
+            timeout = self.queue_timeout_seconds if left is None else min(self.queue_timeout_seconds, left)
+            
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                if timeout < self.queue_timeout_seconds:
+                    raise DeadlineExceededException("Request deadline exceeded while waiting for the AI service")
+                logger.warning("AI request waited too long for a slot")
+                raise AIServiceOverloadedException(self.retry_after_seconds)
+            finally:
+                self.waiting -= 1
+        
+        wait_ms = (time.monotonic() - start) * 1000
+        self.wait_times.record(wait_ms)
+        self.active += 1
+        self.admitted += 1
+        return wait_ms
+    
+    async def try_acquire(self) -> bool:
+        """
+        Take a slot only if one is free right now, without queueing.
+        
+        For optional extra calls (hedged requests) that should never wait
+        behind, or crowd out, requests that need a slot.
+        
+        Returns:
+            True if a slot was taken; give it back with release()
+        """
+        if self._semaphore.locked() or self.waiting:
+            return False
+        await self._semaphore.acquire()
+        self.active += 1
+        self.admitted += 1
+        return True
+    
+    def release(self) -> None:
+        """Give back a slot taken with acquire()."""
+        self.active -= 1
+        self._semaphore.release()
+    
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[float]:
+        """Hold a slot for the duration of the block; yields the queue wait in ms."""
+        wait_ms = await self.acquire()
+        try:
+            yield wait_ms
+        finally:
+            self.release()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return current load, limits and queue wait statistics."""
+        return {
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue_size": self.max_queue_size,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "queue_wait": self.wait_times.snapshot(),
+        }
@@ -0,0 +1,273 @@
+"""
+AI provider implementations used by AIService.
+Wraps OpenAI and Google Gemini behind a common async streaming chat interface.
+"""
+import copy
+import json
+import logging
+from typing import Optional, Dict, Any, List, AsyncIterator
+
+import httpx
+import openai
+
+from ..core.config import settings
+from .latency import LatencyWindow
+from .resilience import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+
+class AIProvider:
+    """
+    Base class for chat-completion providers.
+    
+    Messages use the OpenAI chat format ({"role": ..., "content": ...});
+    providers translate them to their own wire format.
+    """
+    
+    name = "base"
+    
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        # Recent end-to-end and time-to-first-token latencies, used for hedging
+        self.latency = LatencyWindow()
+        self.first_token_latency = LatencyWindow()
+        self.breaker = CircuitBreaker(
+            self.name,
+            failure_threshold=settings.ai_circuit_failure_threshold,
+            recovery_seconds=settings.ai_circuit_recovery_seconds
+        )
+    
+    def stream(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        usage: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a completion as text chunks.
+        
+        Args:
+            messages: Chat messages in OpenAI format
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature
+            usage: Optional dictionary filled with "prompt_tokens" and
+                "completion_tokens" if the provider reports usage
+            
+        Returns:
+            Async iterator of text chunks
+        """
+        raise NotImplementedError
+    
+    async def ping(self) -> None:
+        """
+        Check that the provider is reachable and the model exists, without generating tokens.
+        
+        Raises:
+            Exception: If the provider cannot be reached or rejects the request
+        """
+        raise NotImplementedError
+    
+    def with_model(self, model_name: str) -> "AIProvider":
+        """
+        Return a provider for another model of the same API.
+        
+        The copy shares this provider's API client but has its own latency
+        windows and circuit breaker.
+        
+        Args:
+            model_name: Model the copy calls
+            
+        Returns:
+            New provider instance
+        """
+        provider = copy.copy(self)
+        AIProvider.__init__(provider, model_name)
+        return provider
+    
+    async def aclose(self) -> None:
+        """Release provider resources; the shared HTTP client is closed by AIService."""
+    
+    def get_info(self) -> Dict[str, Any]:
+        """Return provider name, model and recent latency statistics."""
+        return {
+            "provider": self.name,
+            "model_name": self.model_name,
+            "latency": self.latency.snapshot(),
+            "first_token_latency": self.first_token_latency.snapshot(),
+            "circuit_breaker": self.breaker.get_stats(),
+        }
+
+
+class OpenAIProvider(AIProvider):
+    """Chat completions through the OpenAI API."""
+    
+    name = "openai"
+    
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str,
+        http_client: httpx.AsyncClient,
+        base_url: Optional[str] = None
+    ):
+        super().__init__(model_name)
+        # Retries are handled by AIService's RetryPolicy, not the SDK
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=http_client,
+            max_retries=0
+        )
+    
+    async def ping(self) -> None:
+        await self.client.models.retrieve(self.model_name)
+    
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        usage: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if chunk.usage and usage is not None:
+                    # Sent in a final chunk with no choices
+                    usage["prompt_tokens"] = chunk.usage.prompt_tokens
+                    usage["completion_tokens"] = chunk.usage.completion_tokens
+        finally:
+            # Stop reading from the provider as soon as the consumer goes away
+            await stream.close()
+
+
+class GeminiProvider(AIProvider):
+    """Content generation through the Gemini REST API (generativelanguage.googleapis.com)."""
+    
+    name = "gemini"
+    
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str,
+        http_client: httpx.AsyncClient,
+        base_url: str = "https://generativelanguage.googleapis.com/v1beta"
+    ):
+        super().__init__(model_name)
+        self.api_key = api_key
+        self.http_client = http_client
+        self.base_url = base_url.rstrip("/")
+    
+    async def ping(self) -> None:
+        response = await self.http_client.get(
+            f"{self.base_url}/models/{self.model_name}",
+            headers={"x-goog-api-key": self.api_key}
+        )
+        response.raise_for_status()
+    
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        usage: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[str]:
+        async with self.http_client.stream(
+            "POST",
+            f"{self.base_url}/models/{self.model_name}:streamGenerateContent",
+            params={"alt": "sse"},
+            headers={"x-goog-api-key": self.api_key},
+            json=self._build_body(messages, max_tokens, temperature)
+        ) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = json.loads(line[len("data:"):])
+                if usage is not None:
+                    # Each chunk carries the running totals; the last one wins
+                    usage.update(self._extract_usage(payload))
+                text = self._extract_text(payload)
+                if text:
+                    yield text
+    
+    def _build_body(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float
+    ) -> Dict[str, Any]:
+        """Translate OpenAI-style messages into a Gemini generateContent request body."""
+        system_parts = [{"text": m["content"]} for m in messages if m["role"] == "system"]
+        contents = [
+            {
+                "role": "model" if m["role"] == "assistant" else "user",
+                "parts": [{"text": m["content"]}]
+            }
+            for m in messages if m["role"] != "system"
+        ]
+        body: Dict[str, Any] = {
+            "contents": contents,
+            "generationConfig": {
+                "maxOutputTokens": max_tokens,
+                "temperature": temperature
+            }
+        }
+        if system_parts:
+            body["systemInstruction"] = {"parts": system_parts}
+        return body
+    
+    @staticmethod
+    def _extract_text(payload: Dict[str, Any]) -> str:
+        """Concatenate the text parts of the first candidate."""
+        candidates = payload.get("candidates") or []
+        if not candidates:
+            return ""
+        parts = (candidates[0].get("content") or {}).get("parts") or []
+        return "".join(part.get("text", "") for part in parts)
+    
+    @staticmethod
+    def _extract_usage(payload: Dict[str, Any]) -> Dict[str, int]:
+        """Return prompt and completion token counts from usageMetadata, if present."""
+        metadata = payload.get("usageMetadata") or {}
+        usage = {}
+        if "promptTokenCount" in metadata:
+            usage["prompt_tokens"] = metadata["promptTokenCount"]
+        if "candidatesTokenCount" in metadata:
+            usage["completion_tokens"] = metadata["candidatesTokenCount"]
+        return usage
+
+
+def create_providers(http_client: httpx.AsyncClient) -> List[AIProvider]:
+    """
+    Build the configured providers, primary first.
+    
+    Args:
+        http_client: Shared async HTTP client for provider requests
+        
+    Returns:
+        List of providers that have an API key configured
+    """
+    providers: List[AIProvider] = []
+    
+    if settings.openai_api_key:
+        providers.append(OpenAIProvider(settings.openai_api_key, settings.openai_model, http_client))
+    if settings.gemini_api_key:
+        providers.append(GeminiProvider(settings.gemini_api_key, settings.gemini_model, http_client))
+    
+    # Primary provider goes first; the rest are failover / hedge targets
+    providers.sort(key=lambda provider: provider.name != settings.ai_primary_provider)
+    return providers
@@ -1,56 +1,133 @@
 """
-AI service for OpenAI API integration.
-Handles lesson generation, response formatting, and AI model management.
+AI service for OpenAI and Gemini API integration.
+Handles lesson generation, provider failover, response formatting, and AI model management.
 """
 import openai
+import asyncio
 import time
 import logging
-import ssl
 import httpx
-from typing import Optional, Dict, Any
+from fastapi import Request
+from typing import Optional, Dict, Any, List, AsyncIterator, Tuple
 from ..core.config import settings
-from ..core.exceptions import AIServiceException
+from ..core.deadline import remaining, has_time_for, within_deadline
+from ..core.exceptions import AIServiceException, ValidationException, DeadlineExceededException
+from .ai_providers import AIProvider, create_providers
+from .model_router import ModelRouter, create_model_router
+from .ai_limiter import ConcurrencyLimiter
+from .http_client import create_async_http_client, create_sync_http_client
+from .mock_provider import MockProvider, create_mock_transport, create_mock_sync_client
+from .token_budget import choose_max_tokens, resolve_lesson_length, count_tokens, count_message_tokens
+from .prompt_templates import prompt_templates
+from .lesson_outline import (
+    build_outline_messages,
+    parse_outline,
+    section_max_tokens,
+    build_section_messages,
+    format_header,
+    format_missing_section,
+    format_section,
+)
+from .resilience import (
+    RetryPolicy,
+    CircuitOpenError,
+    classify_error,
+    get_retry_after,
+    QUOTA,
+    RATE_LIMIT,
+    CIRCUIT_OPEN,
+    TIMEOUT,
+    CONNECTION,
+    SERVER,
+    AUTH,
+)
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 
 class AIService:
-    """Service for handling AI-powered lesson generation using OpenAI."""
+    """Service for handling AI-powered lesson generation using OpenAI and Gemini."""
     
-    def __init__(self):
+    def __init__(
+        self,
+        http_client: Optional[httpx.AsyncClient] = None,
+        sync_http_client: Optional[httpx.Client] = None
+    ):
+        """
+        Create the service and its providers.
+        
+        Args:
+            http_client: Pooled async client for provider calls; created if omitted
+            sync_http_client: Pooled sync client for the blocking helpers; created if omitted
+        """
         self.model_name = settings.openai_model
+        self.temperature = 0.7
+        self.hedges_started = 0
+        self.hedges_won = 0
+        self.hedges_skipped = 0
+        self.limiter = ConcurrencyLimiter(
+            max_concurrency=settings.ai_max_concurrency,
+            max_queue_size=settings.ai_max_queue_size,
+            queue_timeout_seconds=settings.ai_queue_timeout_seconds,
+            retry_after_seconds=settings.ai_retry_after_seconds
+        )
+        self.retry_policy = RetryPolicy(
+            max_retries=settings.ai_max_retries,
+            base_delay=settings.ai_retry_base_delay_seconds,
+            max_delay=settings.ai_retry_max_delay_seconds
+        )
+        self.retries = 0
         
-        # Create an SSL context that doesn't verify certificates for development
+        # Pooled HTTP clients with relaxed SSL for development
         # Note: This is not recommended for production!
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        
-        # Create custom HTTP client with relaxed SSL
-        http_client = httpx.Client(
-            verify=False,  # Disable SSL verification
-            timeout=30.0
-        )
+        self.http_client = http_client or create_async_http_client()
+        self.sync_http_client = sync_http_client or create_sync_http_client()
         
-        try:
-            self.client = openai.OpenAI(
-                api_key=settings.openai_api_key,
-                http_client=http_client
-            ) if settings.openai_api_key else None
-        except Exception as e:
-            logger.error(f"Failed to initialize OpenAI client: {e}")
-            self.client = None
+        # Model used by the blocking helpers (generate_lesson, health_check)
+        self.sync_model_name = settings.openai_model
         
-        if not self.client:
-            logger.error("Failed to initialize OpenAI client")
+        if settings.ai_mock_enabled:
+            # Local mock API for load testing: no network, no quota
+            transport = create_mock_transport()
+            self.client = create_mock_sync_client(transport)
+            self.sync_model_name = settings.ai_mock_model
+            self.providers: List[AIProvider] = [MockProvider(settings.ai_mock_model, transport)]
+            logger.warning("AI mock provider enabled - lessons are not generated by a real model")
+        else:
+            try:
+                self.client = openai.OpenAI(
+                    api_key=settings.openai_api_key,
+                    http_client=self.sync_http_client
+                ) if settings.openai_api_key else None
+            except Exception as e:
+                logger.error(f"Failed to initialize OpenAI client: {e}")
+                self.client = None
+            
+            # Async providers used from request handlers so generations don't block the event loop
+            try:
+                self.providers = create_providers(self.http_client)
+            except Exception as e:
+                logger.error(f"Failed to initialize AI providers: {e}")
+                self.providers = []
+        
+        if self.providers:
+            self.model_name = self.providers[0].model_name
+        else:
+            logger.error("Failed to initialize AI providers")
+        
+        # Optional routing among several models of the primary provider
+        self.router: Optional[ModelRouter] = None
+        if settings.ai_routing_enabled and self.providers:
+            self.router = create_model_router(self.providers[0])
     
     def generate_lesson(
         self,
         prompt: str,
         category_name: Optional[str] = None,
         subcategory_name: Optional[str] = None,
-        user_context: Optional[str] = None
+        user_context: Optional[str] = None,
+        lesson_length: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Generate a learning lesson based on user prompt and context.
@@ -60,12 +137,14 @@ class AIService:
             category_name: Selected category for context
             subcategory_name: Selected subcategory for context
             user_context: Additional user context
+            lesson_length: "short", "medium" or "long"; sets the token budget
             
         Returns:
             Dictionary containing response, model info, and timing
             
         Raises:
             AIServiceException: If AI service fails
+            DeadlineExceededException: If the request's deadline is too close to call the model
         """
         if not self.client:
             raise AIServiceException("AI service is not properly configured")
@@ -73,143 +152,693 @@ class AIService:
         start_time = time.time()
         
         try:
-            # Build enhanced prompt with context
-            enhanced_prompt = self._build_enhanced_prompt(
-                prompt, category_name, subcategory_name, user_context
-            )
+            self._check_deadline()
+            # Render the prompt template with context
+            lesson_length = resolve_lesson_length(lesson_length, category_name)
+            template = prompt_templates.select(prompt, category_name)
+            messages = template.render(prompt, category_name, subcategory_name, user_context, lesson_length)
             
             # Generate response using OpenAI
             response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """You are an expert tutor who creates comprehensive, detailed educational content. Create in-depth lessons with rich content and examples.
-
-Please provide extensive, detailed explanations with:
-- Clear headings for different topics
-- Detailed explanations with examples
-- Code examples where relevant (formatted properly)
-- Multiple practical examples
-- Real-world applications
-- Tips and best practices
-
-Make the content comprehensive and educational. Use markdown formatting for better structure."""
-                    },
-                    {
-                        "role": "user",
-                        "content": enhanced_prompt
-                    }
-                ],
-                max_tokens=3000,
-                temperature=0.7
+                model=self.sync_model_name,
+                messages=messages,
+                max_tokens=choose_max_tokens(messages, self.sync_model_name, lesson_length),
+                temperature=self.temperature,
+                timeout=remaining() or openai.NOT_GIVEN
             )
             
-            # Calculate response time
-            response_time_ms = int((time.time() - start_time) * 1000)
+            lesson_content = response.choices[0].message.content if response.choices else None
+            ai_response = self._format_response(lesson_content, self.sync_model_name, start_time)
+            ai_response["prompt_template"] = template.id
+            ai_response["lesson_length"] = lesson_length
+            ai_response.update(self._token_usage(
+                messages, lesson_content, self.sync_model_name,
+                {"prompt_tokens": response.usage.prompt_tokens, "completion_tokens": response.usage.completion_tokens}
+                if response.usage else {}
+            ))
+            return ai_response
+            
+        except (ValidationException, DeadlineExceededException):
+            raise
+        except Exception as e:
+            logger.error(f"AI generation failed: {e}")
+            raise self._translate_error(e)
+    
+    async def generate_lesson_async(
+        self,
+        prompt: str,
+        category_name: Optional[str] = None,
+        subcategory_name: Optional[str] = None,
+        user_context: Optional[str] = None,
+        lesson_length: Optional[str] = None,
+        parallel_sections: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Generate a learning lesson without blocking the event loop.
+        
+        Same contract as generate_lesson, but awaits the async providers so
+        request handlers keep serving other requests. Providers are tried in
+        order (primary first, or the model chosen by the router); with hedging
+        enabled a slow primary is raced against the alternate provider. Calls
+        wait for a limiter slot first,
+        transient errors are retried with jittered backoff, and providers
+        whose circuit breaker is open are skipped. The request's deadline
+        bounds the queue wait and the generation, and no retry is started
+        that could not finish before it.
+        
+        With parallel_sections, a medium or long lesson is outlined first and
+        its sections are generated concurrently (see _stream_outlined).
+        
+        Args:
+            prompt: User's learning prompt
+            category_name: Selected category for context
+            subcategory_name: Selected subcategory for context
+            user_context: Additional user context
+            lesson_length: "short", "medium" or "long"; sets the token budget
+            parallel_sections: Generate the lesson as an outline plus concurrent sections
+            
+        Returns:
+            Dictionary containing response, model info, timing and telemetry
+            (queue_wait_ms, first_token_ms, total_time_ms, retries,
+            prompt_tokens, completion_tokens; sections_generated and
+            sections_failed for outlined lessons)
+            
+        Raises:
+            AIServiceOverloadedException: If the limiter queue is full
+            AIServiceException: If AI service fails
+            DeadlineExceededException: If the request's deadline passes first
+        """
+        if not self.providers:
+            raise AIServiceException("AI service is not properly configured")
+        
+        start_time = time.time()
+        
+        try:
+            lesson_length = resolve_lesson_length(lesson_length, category_name)
+            template = prompt_templates.select(prompt, category_name)
+            messages = template.render(prompt, category_name, subcategory_name, user_context, lesson_length)
+            providers, prompt_tokens = self._route(prompt, category_name)
+            
+            if parallel_sections and self._can_outline(lesson_length):
+                stats: Dict[str, Any] = {}
+                
+                async def collect() -> str:
+                    return "".join([chunk async for chunk in self._stream_outlined(providers, messages, lesson_length, stats)])
+                
+                response = await within_deadline(collect(), "generate the lesson")
+                if response:
+                    ai_response = self._format_response(response, stats["model_used"], start_time)
+                    ai_response.update(stats)
+                    ai_response["lesson_length"] = lesson_length
+                    ai_response["prompt_template"] = template.id
+                    ai_response["total_time_ms"] = ai_response["response_time_ms"]
+                    return ai_response
             
-            # Extract text from response
-            if response.choices and response.choices[0].message.content:
-                lesson_content = response.choices[0].message.content
-            else:
-                raise AIServiceException("AI service returned empty response")
+            max_tokens = choose_max_tokens(messages, providers[0].model_name, lesson_length)
+            async with self.limiter.slot() as queue_wait_ms:
+                # Hedging sends the request to another provider, so it is a form of failover
+                if settings.ai_hedge_enabled and settings.ai_fallback_enabled and len(providers) > 1:
+                    generation = self._generate_hedged(providers[0], providers[1], messages, max_tokens)
+                else:
+                    generation = self._generate_with_failover(messages, max_tokens, providers)
+                result = await within_deadline(generation, "generate the lesson")
             
-            return {
-                "response": lesson_content,
-                "model_used": self.model_name,
-                "response_time_ms": response_time_ms,
-                "success": True
-            }
+            ai_response = self._format_response(result["response"], result["model_used"], start_time)
+            ai_response["queue_wait_ms"] = int(queue_wait_ms)
+            ai_response["retries"] = result.get("retries", 0)
+            ai_response["max_tokens"] = max_tokens
+            ai_response["lesson_length"] = lesson_length
+            ai_response["prompt_template"] = template.id
+            ai_response["first_token_ms"] = result.get("first_token_ms")
+            ai_response["total_time_ms"] = ai_response["response_time_ms"]
+            ai_response.update(self._token_usage(messages, result["response"], result["model_used"], result))
+            if self.router:
+                self.router.record(result["model_used"], prompt_tokens, ai_response["total_time_ms"] - queue_wait_ms)
+            return ai_response
             
+        except (AIServiceException, ValidationException, DeadlineExceededException):
+            raise
         except Exception as e:
             logger.error(f"AI generation failed: {e}")
-            response_time_ms = int((time.time() - start_time) * 1000)
-            
-            if "quota" in str(e).lower() or "limit" in str(e).lower():
-                raise AIServiceException("AI service quota exceeded. Please try again later.")
-            elif "api" in str(e).lower():
-                raise AIServiceException("AI service is temporarily unavailable")
-            else:
-                raise AIServiceException(f"AI generation failed: {str(e)}")
+            raise self._translate_error(e)
     
-    def _build_enhanced_prompt(
+    async def stream_lesson(
         self,
-        user_prompt: str,
+        prompt: str,
         category_name: Optional[str] = None,
         subcategory_name: Optional[str] = None,
-        user_context: Optional[str] = None
-    ) -> str:
+        user_context: Optional[str] = None,
+        stats: Optional[Dict[str, Any]] = None,
+        lesson_length: Optional[str] = None,
+        parallel_sections: bool = False
+    ) -> AsyncIterator[str]:
+        """
+        Stream a learning lesson as it is generated.
+        
+        The upstream completion stream is closed when the caller stops
+        iterating (e.g. the client disconnected), so no further tokens are read.
+        If a provider fails before sending anything, the next one is tried.
+        The request's deadline bounds the queue wait and the (re)connect
+        attempts; once chunks are flowing the client decides when to stop.
+        
+        With parallel_sections, the lesson's title and table of contents are
+        sent as soon as the outline is ready, followed by each section in
+        order as soon as it and the sections before it are done.
+        
+        Args:
+            prompt: User's learning prompt
+            category_name: Selected category for context
+            subcategory_name: Selected subcategory for context
+            user_context: Additional user context
+            stats: Optional dictionary filled with "model_used" once known and
+                with telemetry (queue_wait_ms, first_token_ms, retries,
+                prompt_tokens, completion_tokens) as it becomes available
+            lesson_length: "short", "medium" or "long"; sets the token budget
+            parallel_sections: Generate the lesson as an outline plus concurrent sections
+            
+        Yields:
+            Text chunks of the lesson in arrival order
+            
+        Raises:
+            AIServiceOverloadedException: If the limiter queue is full
+            AIServiceException: If AI service fails
+            DeadlineExceededException: If the request's deadline passes before streaming starts
+        """
+        if not self.providers:
+            raise AIServiceException("AI service is not properly configured")
+        
+        lesson_length = resolve_lesson_length(lesson_length, category_name)
+        template = prompt_templates.select(prompt, category_name)
+        messages = template.render(prompt, category_name, subcategory_name, user_context, lesson_length)
+        providers, prompt_tokens = self._route(prompt, category_name)
+        if stats is not None:
+            stats["prompt_template"] = template.id
+            stats["lesson_length"] = lesson_length
+        
+        if parallel_sections and self._can_outline(lesson_length):
+            outlined = False
+            try:
+                async for chunk in self._stream_outlined(providers, messages, lesson_length, stats if stats is not None else {}):
+                    outlined = True
+                    yield chunk
+            except (AIServiceException, DeadlineExceededException):
+                raise
+            except Exception as e:
+                logger.error(f"Outlined AI streaming failed: {e}")
+                raise self._translate_error(e)
+            if outlined:
+                return
+        
+        max_tokens = choose_max_tokens(messages, providers[0].model_name, lesson_length)
+        
+        async with self.limiter.slot() as queue_wait_ms:
+            if stats is not None:
+                stats["queue_wait_ms"] = int(queue_wait_ms)
+            slot_start = time.monotonic()
+            
+            for index, provider in enumerate(providers):
+                started = False
+                chunks: List[str] = []
+                try:
+                    async for chunk in self._stream_with_retry(provider, messages, max_tokens, stats):
+                        if not started:
+                            started = True
+                            if stats is not None:
+                                stats["model_used"] = provider.model_name
+                                stats["first_token_ms"] = int((time.monotonic() - slot_start) * 1000)
+                        chunks.append(chunk)
+                        yield chunk
+                    if stats is not None:
+                        stats.update(self._token_usage(messages, "".join(chunks), provider.model_name, stats))
+                    if self.router:
+                        self.router.record(provider.model_name, prompt_tokens, (time.monotonic() - slot_start) * 1000)
+                    return
+                except DeadlineExceededException:
+                    raise
+                except Exception as e:
+                    logger.error(f"AI streaming failed on {provider.name}: {e}")
+                    # Only fail over if nothing has reached the client yet
+                    if started or index == len(providers) - 1 or not settings.ai_fallback_enabled:
+                        raise self._translate_error(e)
+    
+    async def _generate_with_failover(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        providers: Optional[List[AIProvider]] = None
+    ) -> Dict[str, Any]:
+        """
+        Try each provider in order until one returns a completion.
+        
+        Completions are streamed and assembled (see _collect_stream), so the
+        time to first token is known for every generation, not only streamed
+        and hedged ones.
+        
+        Args:
+            messages: Chat messages to send
+            max_tokens: Completion token budget
+            providers: Providers in the order to try; defaults to self.providers
+            
+        Returns:
+            Provider result with "response", "model_used", "retries" and "first_token_ms"
+        """
+        providers = providers or self.providers
+        if not settings.ai_fallback_enabled:
+            providers = providers[:1]
+        last_error: Optional[Exception] = None
+        
+        for provider in providers:
+            try:
+                return await self._collect_stream(provider, messages, max_tokens)
+            except DeadlineExceededException:
+                raise
+            except Exception as e:
+                logger.warning(f"AI provider {provider.name} failed: {e}")
+                last_error = e
+        
+        raise last_error
+    
+    async def _stream_with_retry(
+        self,
+        provider: AIProvider,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        stats: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream from a provider behind its circuit breaker.
+        
+        Transient errors are retried only until the first chunk has been
+        yielded, and only while the request's deadline leaves time for
+        another attempt; after that a failure is raised to the caller.
+        
+        Args:
+            provider: Provider to stream from
+            messages: Chat messages to send
+            max_tokens: Completion token budget
+            stats: Optional dictionary that receives the "retries" count and
+                any token usage the provider reports
+            
+        Yields:
+            Text chunks in arrival order
+        """
+        attempt = 0
+        while True:
+            self._check_deadline()
+            self._check_circuit(provider)
+            started = False
+            usage: Dict[str, int] = {}
+            try:
+                async for chunk in provider.stream(messages, max_tokens, self.temperature, usage):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                provider.breaker.record_error(e)
+                if started or not self.retry_policy.should_retry(e, attempt):
+                    raise
+                delay = self.retry_policy.get_delay(attempt, e)
+                if not has_time_for(delay + settings.request_deadline_min_ai_seconds):
+                    raise
+                logger.warning(f"AI provider {provider.name} stream failed ({classify_error(e)}), retrying in {delay:.2f}s")
+                attempt += 1
+                self.retries += 1
+                if stats is not None:
+                    stats["retries"] = attempt
+                await asyncio.sleep(delay)
+                continue
+            
+            provider.breaker.record_success()
+            if stats is not None:
+                stats.update(usage)
+            return
+    
+    def _route(self, prompt: str, category_name: Optional[str]) -> Tuple[List[AIProvider], int]:
         """
-        Build an enhanced prompt with context for better AI responses.
+        Order the providers for a request, putting the router's choice first.
         
         Args:
-            user_prompt: Original user prompt
-            category_name: Category context
-            subcategory_name: Subcategory context
-            user_context: User context
+            prompt: User's learning prompt
+            category_name: Category of the request
             
         Returns:
-            Enhanced prompt string
+            Providers in the order to try, and the prompt's token count
+            (0 when routing is disabled)
+        """
+        if self.router is None:
+            return self.providers, 0
+        prompt_tokens = count_tokens(prompt, self.model_name)
+        chosen = self.router.route(prompt_tokens, category_name)
+        return [chosen, *(provider for provider in self.providers if provider is not chosen)], prompt_tokens
+    
+    def _check_deadline(self) -> None:
+        """Raise DeadlineExceededException if the request's deadline leaves too little time for an AI call."""
+        if not has_time_for(settings.request_deadline_min_ai_seconds):
+            raise DeadlineExceededException("Request deadline too close to call the AI service")
+    
+    def _check_circuit(self, provider: AIProvider) -> None:
+        """Raise CircuitOpenError if the provider's breaker does not allow a call."""
+        if not provider.breaker.allow_request():
+            raise CircuitOpenError(provider.name, provider.breaker.retry_after())
+    
+    async def _generate_hedged(
+        self,
+        primary: AIProvider,
+        alternate: AIProvider,
+        messages: List[Dict[str, str]],
+        max_tokens: int
+    ) -> Dict[str, Any]:
+        """
+        Race the alternate provider against a primary that is slow to start.
+        
+        The primary request is streamed; if no first token arrives within the
+        hedge delay, the same request is sent to the alternate provider and
+        the first successful completion wins. The loser is cancelled.
+        
+        The caller holds the primary's limiter slot. The hedge needs a second
+        slot and only starts if one is free right away; otherwise the primary
+        is simply awaited, so hedging never queues behind other requests.
+        
+        Args:
+            primary: Provider tried first
+            alternate: Provider used for the hedged request
+            messages: Chat messages to send
+            max_tokens: Completion token budget
+            
+        Returns:
+            Provider result with "response" and "model_used"
+        """
+        first_token = asyncio.Event()
+        primary_task = asyncio.create_task(self._collect_stream(primary, messages, max_tokens, first_token))
+        waiter = asyncio.create_task(first_token.wait())
+        tasks = {primary_task}
+        
+        try:
+            await asyncio.wait(
+                {primary_task, waiter},
+                timeout=self._hedge_delay(primary),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            
+            if first_token.is_set() or (primary_task.done() and primary_task.exception() is None):
+                return await primary_task
+            
+            if primary_task.done():
+                # Primary failed outright (or its circuit is open) - plain failover
+                logger.warning(f"AI provider {primary.name} failed: {primary_task.exception()}")
+                return await self._collect_stream(alternate, messages, max_tokens)
+            
+            if not await self.limiter.try_acquire():
+                self.hedges_skipped += 1
+                return await primary_task
+            
+            self.hedges_started += 1
+            hedge_task = asyncio.create_task(self._collect_stream(alternate, messages, max_tokens))
+            hedge_task.add_done_callback(lambda _: self.limiter.release())
+            tasks.add(hedge_task)
+            
+            pending = set(tasks)
+            last_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge_task:
+                            self.hedges_won += 1
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            waiter.cancel()
+            losers = [task for task in tasks if not task.done()]
+            for task in losers:
+                task.cancel()
+            # Wait for the loser to unwind so the hedge slot is free before returning
+            await asyncio.gather(*losers, return_exceptions=True)
+    
+    async def _collect_stream(
+        self,
+        provider: AIProvider,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        first_token: Optional[asyncio.Event] = None
+    ) -> Dict[str, Any]:
+        """
+        Stream a completion from a provider and assemble the full text.
+        
+        Records the provider's time to first token and total latency.
+        
+        Args:
+            provider: Provider to stream from
+            messages: Chat messages to send
+            max_tokens: Completion token budget
+            first_token: Event set when the first chunk arrives
+            
+        Returns:
+            Provider result with "response", "model_used", "retries",
+            "first_token_ms" and any token usage the provider reported
+        """
+        start = time.monotonic()
+        chunks: List[str] = []
+        stats: Dict[str, Any] = {}
+        try:
+            async for chunk in self._stream_with_retry(provider, messages, max_tokens, stats):
+                if not chunks:
+                    stats["first_token_ms"] = int((time.monotonic() - start) * 1000)
+                    provider.first_token_latency.record((time.monotonic() - start) * 1000)
+                    if first_token is not None:
+                        first_token.set()
+                chunks.append(chunk)
+        except asyncio.CancelledError:
+            if not chunks:
+                # Lower bound for a request that never produced a token, so p95 isn't biased low
+                provider.first_token_latency.record((time.monotonic() - start) * 1000)
+            raise
+        
+        provider.latency.record((time.monotonic() - start) * 1000)
+        return {"response": "".join(chunks), "model_used": provider.model_name, **stats, "retries": stats.get("retries", 0)}
+    
+    def _can_outline(self, lesson_length: str) -> bool:
+        """True if a lesson of this length is worth splitting into concurrently generated sections."""
+        return settings.lesson_parallel_sections_enabled and lesson_length != "short"
+    
+    async def _stream_outlined(
+        self,
+        providers: List[AIProvider],
+        messages: List[Dict[str, str]],
+        lesson_length: str,
+        stats: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """
+        Generate a lesson as an outline followed by concurrently generated sections.
+        
+        A short outline completion names the title and sections; then up to
+        lesson_section_concurrency sections are generated at once (each in
+        its own limiter slot), so wall time is roughly the outline plus the
+        slowest sections instead of one long serial completion. Yields nothing
+        if the outline has fewer than lesson_outline_min_sections headings;
+        the caller then falls back to a single completion.
+        
+        Once the header has been sent, a failed section is retried once and
+        then replaced by a note, so the client never gets a broken stream;
+        only the deadline still ends the lesson early.
+        
+        Every call fails over between providers, but none is hedged: the
+        sections already run in parallel, and hedging each would double the
+        calls. The router does not learn from these lessons either, since
+        their wall time is not comparable with a single completion.
+        
+        Args:
+            providers: Providers in the order to try
+            messages: Rendered lesson messages
+            lesson_length: Resolved lesson length; its budget is shared between the sections
+            stats: Filled with "model_used", "sections_generated", "sections_failed" and telemetry
+                (queue_wait_ms, first_token_ms, retries, max_tokens,
+                prompt_tokens, completion_tokens summed over every call)
+            
+        Yields:
+            Title and table of contents, then each section in order
         """
-        enhanced_parts = [
-            "You are an expert educational content creator. Generate a comprehensive, engaging learning lesson based on the following request."
-        ]
+        start = time.monotonic()
+        max_sections = settings.lesson_outline_max_sections
+        outline_messages = build_outline_messages(messages, max_sections)
+        outline = await self._complete_in_slot(
+            providers,
+            outline_messages,
+            min(settings.lesson_outline_max_tokens, choose_max_tokens(outline_messages, providers[0].model_name, lesson_length))
+        )
+        title, headings = parse_outline(outline["response"], max_sections)
+        if len(headings) < settings.lesson_outline_min_sections:
+            logger.info(f"Lesson outline has {len(headings)} sections, generating it in one completion")
+            return
         
-        # Add category context
-        if category_name:
-            enhanced_parts.append(f"Category: {category_name}")
+        max_tokens = section_max_tokens(lesson_length, len(headings))
+        title = title or headings[0]
+        # Bounds one lesson's share of the limiter, so a few outlined lessons can't take every slot
+        semaphore = asyncio.Semaphore(settings.lesson_section_concurrency)
         
-        if subcategory_name:
-            enhanced_parts.append(f"Subcategory: {subcategory_name}")
+        async def generate_section(index: int) -> Dict[str, Any]:
+            async with semaphore:
+                section = await self._complete_in_slot(
+                    providers, build_section_messages(messages, title, headings, index, max_tokens), max_tokens
+                )
+            if not section["response"]:
+                raise AIServiceException("AI service returned an empty lesson section")
+            return section
         
-        # Add user context if available
-        if user_context:
-            enhanced_parts.append(f"Learning Context: {user_context}")
+        tasks = [asyncio.create_task(generate_section(index)) for index in range(len(headings))]
+        stats.update({
+            "model_used": outline["model_used"],
+            "sections_generated": len(headings),
+            "sections_failed": 0,
+            "max_tokens": max_tokens,
+            "queue_wait_ms": outline["queue_wait_ms"],
+            "first_token_ms": int((time.monotonic() - start) * 1000),
+            "retries": outline["retries"],
+            "prompt_tokens": outline["prompt_tokens"],
+            "completion_tokens": outline["completion_tokens"],
+        })
         
-        # Add the main prompt
-        enhanced_parts.extend([
-            f"User Request: {user_prompt}",
-            "",
-            "Please provide a comprehensive, detailed lesson with rich content:",
-            "- Include extensive explanations and multiple examples",
-            "- Provide practical code examples where relevant",
-            "- Add real-world applications and use cases", 
-            "- Include tips, best practices, and common pitfalls",
-            "- Make the content thorough and educational",
-            "- Use clear headings and proper formatting",
-            "",
-            "Create content that is detailed, informative, and helps the learner gain deep understanding of the topic."
-        ])
+        try:
+            yield format_header(title, headings)
+            for index, (heading, task) in enumerate(zip(headings, tasks)):
+                try:
+                    section = await task
+                except DeadlineExceededException:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Lesson section '{heading}' failed, retrying it: {e}")
+                    try:
+                        await asyncio.sleep(settings.ai_retry_base_delay_seconds)
+                        section = await generate_section(index)
+                    except DeadlineExceededException:
+                        raise
+                    except Exception as e:
+                        logger.error(f"Lesson section '{heading}' failed again, leaving it out: {e}")
+                        stats["sections_failed"] += 1
+                        yield format_missing_section(heading)
+                        continue
+                stats["retries"] += section["retries"]
+                stats["prompt_tokens"] += section["prompt_tokens"]
+                stats["completion_tokens"] += section["completion_tokens"]
+                yield format_section(heading, section["response"])
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def _complete_in_slot(
+        self,
+        providers: List[AIProvider],
+        messages: List[Dict[str, str]],
+        max_tokens: int
+    ) -> Dict[str, Any]:
+        """
+        Run one completion in its own limiter slot, with failover.
         
-        return "\n".join(enhanced_parts)
+        Returns:
+            Provider result with "queue_wait_ms", "retries", "prompt_tokens" and "completion_tokens"
+        """
+        async with self.limiter.slot() as queue_wait_ms:
+            result = await self._generate_with_failover(messages, max_tokens, providers)
+        result["queue_wait_ms"] = int(queue_wait_ms)
+        result["retries"] = result.get("retries", 0)
+        result.update(self._token_usage(messages, result["response"], result["model_used"], result))
+        return result
     
-    def validate_prompt_content(self, prompt: str) -> bool:
+    def _hedge_delay(self, provider: AIProvider) -> float:
         """
-        Validate if the prompt content is appropriate for AI processing.
+        Seconds to wait for the primary's first token before hedging.
+        
+        Uses the configured percentile of the provider's recent time to first
+        token once enough samples exist, else the static ai_hedge_delay_ms.
+        """
+        delay_ms = float(settings.ai_hedge_delay_ms)
+        if len(provider.first_token_latency) >= settings.ai_hedge_min_samples:
+            delay_ms = provider.first_token_latency.percentile(settings.ai_hedge_percentile)
+        return max(delay_ms, settings.ai_hedge_min_delay_ms) / 1000
+    
+    def _format_response(
+        self,
+        lesson_content: Optional[str],
+        model_used: str,
+        start_time: float
+    ) -> Dict[str, Any]:
+        """
+        Build the lesson result dictionary.
         
         Args:
-            prompt: User prompt to validate
+            lesson_content: Generated lesson text
+            model_used: Model that produced the lesson
+            start_time: time.time() value taken before the request
             
         Returns:
-            True if prompt is valid, False otherwise
+            Dictionary containing response, model info, and timing
+            
+        Raises:
+            AIServiceException: If the completion has no content
         """
-        # Basic content validation
-        if not prompt or len(prompt.strip()) < 10:
-            return False
+        # Calculate response time
+        response_time_ms = int((time.time() - start_time) * 1000)
         
-        # Check for potentially harmful content (basic filtering)
-        harmful_keywords = [
-            "hack", "exploit", "illegal", "violence", "harmful",
-            "dangerous", "inappropriate", "explicit"
-        ]
+        if not lesson_content:
+            raise AIServiceException("AI service returned empty response")
         
-        prompt_lower = prompt.lower()
-        for keyword in harmful_keywords:
-            if keyword in prompt_lower:
-                logger.warning(f"Potentially harmful content detected in prompt: {keyword}")
-                return False
+        return {
+            "response": lesson_content,
+            "model_used": model_used,
+            "response_time_ms": response_time_ms,
+            "success": True
+        }
+    
+    @staticmethod
+    def _token_usage(
+        messages: List[Dict[str, str]],
+        response: Optional[str],
+        model: str,
+        reported: Dict[str, Any]
+    ) -> Dict[str, int]:
+        """
+        Return prompt and completion token counts for a generation.
         
-        return True
+        Uses the counts reported by the provider, estimating any that are
+        missing with the local tokenizer.
+        
+        Args:
+            messages: Chat messages that were sent
+            response: Generated text
+            model: Model that generated it
+            reported: Dictionary that may hold "prompt_tokens" and "completion_tokens"
+            
+        Returns:
+            Dictionary with "prompt_tokens" and "completion_tokens"
+        """
+        prompt_tokens = reported.get("prompt_tokens")
+        completion_tokens = reported.get("completion_tokens")
+        return {
+            "prompt_tokens": prompt_tokens if prompt_tokens is not None else count_message_tokens(messages, model),
+            "completion_tokens": completion_tokens if completion_tokens is not None else count_tokens(response or "", model),
+        }
+    
+    def _translate_error(self, error: Exception) -> AIServiceException:
+        """
+        Map a provider error to an AIServiceException with a user-facing message.
+        
+        Args:
+            error: Exception raised while generating
+            
+        Returns:
+            AIServiceException to raise
+        """
+        kind = classify_error(error)
+        retry_after = get_retry_after(error)
+        headers = {"Retry-After": str(int(retry_after + 0.999))} if retry_after else None
+        
+        if kind in (QUOTA, RATE_LIMIT):
+            return AIServiceException("AI service quota exceeded. Please try again later.", headers=headers)
+        elif kind in (CIRCUIT_OPEN, TIMEOUT, CONNECTION, SERVER, AUTH):
+            return AIServiceException("AI service is temporarily unavailable", headers=headers)
+        else:
+            return AIServiceException(f"AI generation failed: {str(error)}")
     
     def get_model_info(self) -> Dict[str, Any]:
         """
@@ -220,33 +849,62 @@ Make the content comprehensive and educational. Use markdown formatting for bett
         """
         return {
             "model_name": self.model_name,
-            "provider": "OpenAI",
-            "available": self.client is not None,
-            "api_configured": settings.openai_api_key is not None
+            "provider": self.providers[0].name if self.providers else "OpenAI",
+            "available": bool(self.providers),
+            "api_configured": settings.openai_api_key is not None or settings.gemini_api_key is not None or settings.ai_mock_enabled,
+            "providers": [provider.get_info() for provider in self.providers],
+            "hedging": {
+                "enabled": settings.ai_hedge_enabled,
+                "started": self.hedges_started,
+                "won": self.hedges_won,
+                "skipped_no_slot": self.hedges_skipped
+            },
+            "concurrency": self.limiter.get_stats(),
+            "retries": self.retries,
+            "routing": self.router.get_stats() if self.router else {"enabled": False},
+            "prompt_templates": prompt_templates.get_info()
         }
     
     def health_check(self) -> bool:
         """
         Perform a health check on the AI service.
         
+        Looks up the configured model instead of generating a completion, so
+        the check is free. /health uses the cached background probe instead
+        (see ai_health.py).
+        
         Returns:
             True if service is healthy, False otherwise
         """
-        if not self.client or not settings.openai_api_key:
+        if not self.client:
             return False
         
         try:
-            # Simple test generation
-            test_response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[{"role": "user", "content": "Say 'AI service is working'"}],
-                max_tokens=50
-            )
-            return test_response.choices[0].message.content is not None
+            return self.client.models.retrieve(self.sync_model_name).id is not None
         except Exception as e:
             logger.error(f"AI service health check failed: {e}")
             return False
+    
+    async def aclose(self) -> None:
+        """Close the providers and the pooled HTTP connections."""
+        for provider in self.providers:
+            await provider.aclose()
+        if self.client:
+            self.client.close()
+        await self.http_client.aclose()
+        self.sync_http_client.close()
 
 
-# Global AI service instance
-ai_service = AIService()
+def get_ai_service(request: Request) -> AIService:
+    """
+    FastAPI dependency returning the application-wide AI service.
+    
+    The instance is created and closed in the application lifespan (see main.py).
+    
+    Args:
+        request: Current request
+        
+    Returns:
+        Shared AIService instance
+    """
+    return request.app.state.ai_service
@@ -0,0 +1,71 @@
+"""
+Pooled HTTP clients for outbound AI provider calls.
+One set of clients is created per application (see the FastAPI lifespan in main.py)
+so every request reuses the same keep-alive connections.
+"""
+import logging
+import httpx
+from ..core.config import settings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    """Return True if HTTP/2 is enabled and the h2 package is installed."""
+    if not settings.ai_http2_enabled:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1")
+        return False
+
+
+def _limits() -> httpx.Limits:
+    """Connection-pool limits shared by the sync and async clients."""
+    return httpx.Limits(
+        max_connections=settings.ai_http_max_connections,
+        max_keepalive_connections=settings.ai_http_max_keepalive_connections,
+        keepalive_expiry=settings.ai_http_keepalive_expiry_seconds
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    """Request timeouts; connect is kept short so a dead host fails fast."""
+    return httpx.Timeout(
+        settings.ai_http_timeout_seconds,
+        connect=settings.ai_http_connect_timeout_seconds,
+        pool=settings.ai_http_pool_timeout_seconds
+    )
+
+
+def create_async_http_client() -> httpx.AsyncClient:
+    """
+    Create the async client used by the AI providers.
+    
+    Returns:
+        httpx.AsyncClient with tuned pool limits, timeouts and HTTP/2 when available
+    """
+    return httpx.AsyncClient(
+        verify=False,  # Disable SSL verification (development setting, see AIService)
+        http2=_http2_available(),
+        limits=_limits(),
+        timeout=_timeout()
+    )
+
+
+def create_sync_http_client() -> httpx.Client:
+    """
+    Create the sync client used by the blocking OpenAI helpers (health check, scripts).
+    
+    Returns:
+        httpx.Client with the same pool limits and timeouts
+    """
+    return httpx.Client(
+        verify=False,  # Disable SSL verification
+        http2=_http2_available(),
+        limits=_limits(),
+        timeout=_timeout()
+    )
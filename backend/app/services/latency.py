@@ -0,0 +1,52 @@
+"""
+Rolling latency statistics for AI calls.
+Keeps a bounded window of recent samples and answers percentile queries.
+"""
+import math
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class LatencyWindow:
+    """Fixed-size window of recent latency samples in milliseconds."""
+    
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+    
+    def record(self, latency_ms: float) -> None:
+        """Add a latency sample, dropping the oldest one when the window is full."""
+        self._samples.append(latency_ms)
+    
+    def percentile(self, pct: float) -> Optional[float]:
+        """
+        Return the nearest-rank percentile of the window.
+        
+        Args:
+            pct: Percentile between 0 and 100
+            
+        Returns:
+            Latency in milliseconds, or None if there are no samples
+        """
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        rank = max(1, math.ceil(pct / 100 * len(ordered)))
+        return ordered[min(rank, len(ordered)) - 1]
+    
+    def mean(self) -> Optional[float]:
+        """Return the mean of the window, or None if there are no samples."""
+        if not self._samples:
+            return None
+        return sum(self._samples) / len(self._samples)
+    
+    def __len__(self) -> int:
+        return len(self._samples)
+    
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        """Return count, mean, p50 and p95 of the window."""
+        return {
+            "count": len(self._samples),
+            "mean_ms": self.mean(),
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+        }
@@ -0,0 +1,218 @@
+"""
+Exact-match lesson cache in front of the AI provider.
+Combines an in-process LRU tier with a persistent PostgreSQL tier.
+"""
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.lesson_cache import LessonCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalize a prompt for exact-match comparison.
+    
+    Lowercases, collapses whitespace and strips trailing punctuation so
+    trivially different spellings of the same request share a key.
+    
+    Args:
+        prompt: Raw user prompt
+        
+    Returns:
+        Normalized prompt string
+    """
+    return " ".join(prompt.lower().split()).rstrip(" ?!.")
+
+
+def make_cache_key(
+    prompt: str,
+    category_name: Optional[str],
+    subcategory_name: Optional[str],
+    model: str,
+    lesson_length: str = "long",
+    template_id: str = ""
+) -> str:
+    """
+    Build the cache key for a lesson request.
+    
+    Args:
+        prompt: User's learning prompt
+        category_name: Category context
+        subcategory_name: Subcategory context
+        model: Configured primary AI model (see LessonService._cache_key)
+        lesson_length: Requested lesson length
+        template_id: Prompt template the lesson is generated with
+        
+    Returns:
+        SHA-256 hex digest of the normalized request tuple
+    """
+    normalized = [
+        normalize_prompt(prompt),
+        (category_name or "").strip().lower(),
+        (subcategory_name or "").strip().lower(),
+        model,
+        lesson_length,
+        template_id,
+    ]
+    return hashlib.sha256(json.dumps(normalized).encode("utf-8")).hexdigest()
+
+
+class LessonCache:
+    """Two-tier lesson cache: in-process LRU with TTL backed by the lesson_cache table."""
+    
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: int = 3600,
+        db_ttl_seconds: int = 7 * 24 * 3600,
+        enabled: bool = True
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_ttl_seconds = db_ttl_seconds
+        self.enabled = enabled
+        # cache_key -> (expires_at monotonic, cached lesson)
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+    
+    def get(self, db: Session, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached lesson, checking memory first and then the database.
+        
+        Args:
+            db: Database session for the persistent tier
+            key: Cache key from make_cache_key
+            
+        Returns:
+            Dictionary with "response" and "model_used", or None on a miss
+        """
+        if not self.enabled:
+            return None
+        
+        cached = self._get_memory(key)
+        if cached is not None:
+            self.memory_hits += 1
+            return cached
+        
+        try:
+            entry = db.query(LessonCacheEntry).filter(LessonCacheEntry.cache_key == key).first()
+            if entry and entry.created_at and entry.created_at < datetime.utcnow() - timedelta(seconds=self.db_ttl_seconds):
+                entry = None
+            if entry:
+                entry.hit_count = (entry.hit_count or 0) + 1
+                entry.last_hit_at = datetime.utcnow()
+                db.commit()
+                cached = {"response": entry.response, "model_used": entry.ai_model}
+                self._set_memory(key, cached)
+                self.db_hits += 1
+                return cached
+        except SQLAlchemyError as e:
+            logger.warning(f"Lesson cache lookup failed: {e}")
+            db.rollback()
+        
+        self.misses += 1
+        return None
+    
+    def set(
+        self,
+        db: Session,
+        key: str,
+        prompt: str,
+        category_name: Optional[str],
+        subcategory_name: Optional[str],
+        model: str,
+        response: str
+    ) -> None:
+        """
+        Store a generated lesson in both cache tiers.
+        
+        Args:
+            db: Database session for the persistent tier
+            key: Cache key from make_cache_key
+            prompt: User's learning prompt
+            category_name: Category context
+            subcategory_name: Subcategory context
+            model: AI model that generated the lesson
+            response: Generated lesson content
+        """
+        if not self.enabled:
+            return
+        
+        self._set_memory(key, {"response": response, "model_used": model})
+        
+        try:
+            entry = db.query(LessonCacheEntry).filter(LessonCacheEntry.cache_key == key).first()
+            if entry:
+                entry.response = response
+                entry.ai_model = model
+                entry.created_at = datetime.utcnow()
+            else:
+                db.add(LessonCacheEntry(
+                    cache_key=key,
+                    prompt=prompt,
+                    category_name=category_name,
+                    subcategory_name=subcategory_name,
+                    ai_model=model,
+                    response=response
+                ))
+            db.commit()
+        except SQLAlchemyError as e:
+            # Another worker may have inserted the same key concurrently
+            logger.warning(f"Lesson cache store failed: {e}")
+            db.rollback()
+    
+    def clear(self) -> None:
+        """Drop all in-process entries (the persistent tier is kept)."""
+        self._entries.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache size and hit counters."""
+        return {
+            "enabled": self.enabled,
+            "memory_entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+        }
+    
+    def _get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a live in-process entry and mark it most recently used."""
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, cached = item
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return cached
+    
+    def _set_memory(self, key: str, cached: Dict[str, Any]) -> None:
+        """Insert an in-process entry, evicting the least recently used ones."""
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, cached)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+# Global lesson cache instance
+lesson_cache = LessonCache(
+    max_entries=settings.lesson_cache_max_entries,
+    ttl_seconds=settings.lesson_cache_ttl_seconds,
+    db_ttl_seconds=settings.lesson_cache_db_ttl_seconds,
+    enabled=settings.lesson_cache_enabled
+)
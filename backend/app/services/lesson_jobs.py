@@ -0,0 +1,472 @@
+"""
+Background lesson jobs.
+Runs lesson generation on a pool of asyncio workers so requests can return immediately.
+Streamed lessons also run as jobs, with their chunks buffered so a client whose
+connection dropped can resume the stream instead of paying for a new generation.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Optional, Dict, Any, List, AsyncIterator, Tuple, Set
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..core.deadline import no_deadline
+from ..core.exceptions import (
+    AIServiceException,
+    AIServiceOverloadedException,
+    DeadlineExceededException,
+    ValidationException
+)
+from ..schemas.prompt import PromptCreate
+from .ai_service import AIService
+from .lesson_service import LessonService
+from .token_budget import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class LessonJob:
+    """A queued lesson generation and its outcome."""
+    
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    
+    def __init__(self, user_id: int, prompt_data: PromptCreate, user_context: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.prompt_data = prompt_data
+        self.user_context = user_context
+        self.status = self.QUEUED
+        self.prompt_id: Optional[int] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        # Monotonic time used for expiry
+        self.finished_monotonic: Optional[float] = None
+    
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.COMPLETED, self.FAILED)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert job to dictionary."""
+        return {
+            "id": self.id,
+            "status": self.status,
+            "prompt_id": self.prompt_id,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class StreamingLessonJob(LessonJob):
+    """A lesson job generated as a stream, buffering its chunks for resuming clients."""
+    
+    def __init__(self, user_id: int, prompt_data: PromptCreate, user_context: Optional[str] = None):
+        super().__init__(user_id, prompt_data, user_context)
+        self.chunks: List[str] = []
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        # Pending cancellation while no client follows the stream
+        self.abandon_timer: Optional[asyncio.TimerHandle] = None
+        self._updated = asyncio.Event()
+    
+    def append(self, chunk: str) -> None:
+        """Buffer a chunk and wake up the subscribers."""
+        self.chunks.append(chunk)
+        self.notify()
+    
+    def notify(self) -> None:
+        """Wake up every subscriber waiting for a new chunk or the end of the job."""
+        self._updated.set()
+        self._updated = asyncio.Event()
+    
+    async def wait_for_update(self) -> None:
+        """Wait until a chunk is appended or the job finishes."""
+        await self._updated.wait()
+    
+    def release_chunks(self) -> None:
+        """Drop the chunk buffer of a finished job nobody is reading; the `done` event carries the whole lesson."""
+        if self.is_finished and not self.subscribers:
+            self.chunks = []
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert job to dictionary, including the number of buffered chunks."""
+        return {**super().to_dict(), "chunks": len(self.chunks)}
+
+
+class LessonJobQueue:
+    """In-process job queue drained by a fixed pool of worker tasks."""
+    
+    def __init__(
+        self,
+        workers: int = 4,
+        max_pending: int = 500,
+        ttl_seconds: int = 3600,
+        stream_resume_seconds: float = 30.0,
+        prune_interval_seconds: float = 60.0
+    ):
+        self.worker_count = workers
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self.stream_resume_seconds = stream_resume_seconds
+        self.prune_interval_seconds = prune_interval_seconds
+        self.jobs: Dict[str, LessonJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._pruner: Optional[asyncio.Task] = None
+        self._streams: Set[asyncio.Task] = set()
+        self.streams_resumed = 0
+        self.streams_abandoned = 0
+    
+    def start(self) -> None:
+        """Start the worker pool (call from the running event loop)."""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._workers = [
+            asyncio.create_task(self._worker(index), name=f"lesson-job-worker-{index}")
+            for index in range(self.worker_count)
+        ]
+        # Expire finished jobs even while no new ones are submitted
+        self._pruner = asyncio.create_task(self._prune_loop(), name="lesson-job-prune")
+        logger.info(f"Started {self.worker_count} lesson job workers")
+    
+    async def stop(self) -> None:
+        """Cancel the workers and running streams; queued jobs that have not started are dropped."""
+        tasks = [*self._workers, *self._streams, *([self._pruner] if self._pruner else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._pruner = None
+    
+    def submit(
+        self,
+        ai: AIService,
+        user_id: int,
+        prompt_data: PromptCreate,
+        user_context: Optional[str] = None
+    ) -> LessonJob:
+        """
+        Queue a lesson generation.
+        
+        Args:
+            ai: AI service the worker generates with
+            user_id: Owner of the resulting prompt
+            prompt_data: Submitted prompt
+            user_context: Additional user context
+            
+        Returns:
+            The queued job
+            
+        Raises:
+            AIServiceOverloadedException: If the job queue is full
+        """
+        if self._queue is None:
+            self.start()
+        self._prune()
+        
+        job = LessonJob(user_id, prompt_data, user_context)
+        try:
+            self._queue.put_nowait((job, ai))
+        except asyncio.QueueFull:
+            raise AIServiceOverloadedException(settings.ai_retry_after_seconds)
+        
+        self.jobs[job.id] = job
+        return job
+    
+    def start_stream(
+        self,
+        ai: AIService,
+        user_id: int,
+        prompt_data: PromptCreate,
+        category_name: Optional[str] = None,
+        subcategory_name: Optional[str] = None,
+        user_context: Optional[str] = None,
+        cached: Optional[Dict[str, Any]] = None
+    ) -> StreamingLessonJob:
+        """
+        Start streaming a lesson in the background.
+        
+        The generation is not tied to the request that started it: clients
+        read it with follow() and may reconnect. Once nobody has followed it
+        for stream_resume_seconds, it is cancelled.
+        
+        Args:
+            ai: AI service to stream from
+            user_id: Owner of the resulting prompt
+            prompt_data: Submitted prompt
+            category_name: Category context
+            subcategory_name: Subcategory context
+            user_context: Additional user context
+            cached: Cached lesson result to replay instead of generating
+            
+        Returns:
+            The running job
+        """
+        self._prune()
+        job = StreamingLessonJob(user_id, prompt_data, user_context)
+        job.status = LessonJob.RUNNING
+        job.started_at = datetime.utcnow()
+        # The stream outlives the request, so it must not inherit its deadline
+        with no_deadline():
+            job.task = asyncio.create_task(
+                self._run_stream(job, ai, category_name, subcategory_name, cached),
+                name=f"lesson-stream-{job.id}"
+            )
+        self._streams.add(job.task)
+        job.task.add_done_callback(self._streams.discard)
+        self.jobs[job.id] = job
+        return job
+    
+    async def follow(self, job: StreamingLessonJob, last_event_id: int = -1) -> AsyncIterator[Tuple[int, str]]:
+        """
+        Yield a streaming job's chunks after last_event_id until the job finishes.
+        
+        Args:
+            job: Job to follow
+            last_event_id: Index of the last chunk the client received (-1 for none)
+            
+        Yields:
+            (index, chunk) pairs; the index is the SSE event ID to resume from
+        """
+        if last_event_id >= 0:
+            self.streams_resumed += 1
+        if job.abandon_timer:
+            job.abandon_timer.cancel()
+            job.abandon_timer = None
+        job.subscribers += 1
+        try:
+            position = last_event_id + 1
+            while True:
+                while position < len(job.chunks):
+                    yield position, job.chunks[position]
+                    position += 1
+                if job.is_finished:
+                    return
+                await job.wait_for_update()
+        finally:
+            job.subscribers -= 1
+            if not job.subscribers and not job.is_finished:
+                job.abandon_timer = asyncio.get_running_loop().call_later(
+                    self.stream_resume_seconds, self._abandon_if_idle, job
+                )
+            job.release_chunks()
+    
+    def get(self, job_id: str) -> Optional[LessonJob]:
+        """Return a job by ID, or None if unknown or expired."""
+        return self.jobs.get(job_id)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return worker and queue counters."""
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": len(self._workers),
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "jobs": counts,
+            "streams_running": len(self._streams),
+            "streams_resumed": self.streams_resumed,
+            "streams_abandoned": self.streams_abandoned,
+        }
+    
+    async def _worker(self, index: int) -> None:
+        """Take jobs off the queue and run them until cancelled."""
+        while True:
+            job, ai = await self._queue.get()
+            try:
+                await self._run(job, ai)
+            except Exception as e:
+                logger.error(f"Lesson job {job.id} crashed: {e}")
+                self._finish(job, LessonJob.FAILED, error="Failed to process prompt")
+            finally:
+                self._queue.task_done()
+    
+    async def _run(self, job: LessonJob, ai: AIService) -> None:
+        """Generate the lesson for a job and save the Prompt row."""
+        job.status = LessonJob.RUNNING
+        job.started_at = datetime.utcnow()
+        
+        db = SessionLocal()
+        try:
+            lesson_service = LessonService(db, ai)
+            category_name, subcategory_name = lesson_service.get_context_names(job.prompt_data)
+            ai_response = await lesson_service.generate_lesson(
+                prompt=job.prompt_data.prompt,
+                category_name=category_name,
+                subcategory_name=subcategory_name,
+                user_context=job.user_context,
+                lesson_length=job.prompt_data.lesson_length,
+                sub_category_id=job.prompt_data.sub_category_id,
+                parallel_sections=job.prompt_data.parallel_sections
+            )
+            new_prompt = lesson_service.save_prompt(job.user_id, job.prompt_data, ai_response)
+            job.prompt_id = new_prompt.id
+            self._finish(job, LessonJob.COMPLETED)
+        except AIServiceException as e:
+            db.rollback()
+            self._finish(job, LessonJob.FAILED, error=f"AI service error: {e.detail}")
+        except ValidationException as e:
+            db.rollback()
+            self._finish(job, LessonJob.FAILED, error=e.detail)
+        finally:
+            db.close()
+    
+    async def _run_stream(
+        self,
+        job: StreamingLessonJob,
+        ai: AIService,
+        category_name: Optional[str],
+        subcategory_name: Optional[str],
+        cached: Optional[Dict[str, Any]]
+    ) -> None:
+        """Stream a job's lesson into its buffer, then save the Prompt row."""
+        start_time = time.time()
+        stats: Dict[str, Any] = {}
+        try:
+            if cached:
+                job.append(cached["response"])
+            else:
+                async for chunk in ai.stream_lesson(
+                    prompt=job.prompt_data.prompt,
+                    category_name=category_name,
+                    subcategory_name=subcategory_name,
+                    user_context=job.user_context,
+                    stats=stats,
+                    lesson_length=job.prompt_data.lesson_length,
+                    parallel_sections=job.prompt_data.parallel_sections
+                ):
+                    job.append(chunk)
+        except AIServiceException as e:
+            self._finish(job, LessonJob.FAILED, error=f"AI service error: {e.detail}")
+            return
+        except (ValidationException, DeadlineExceededException) as e:
+            self._finish(job, LessonJob.FAILED, error=e.detail)
+            return
+        except asyncio.CancelledError:
+            if settings.lesson_keep_partial_on_disconnect and job.chunks:
+                self._save_stream(job, ai, category_name, subcategory_name, stats, start_time, partial=True)
+            self._finish(job, LessonJob.FAILED, error="Client disconnected before the lesson was finished")
+            raise
+        except Exception as e:
+            logger.error(f"Lesson stream {job.id} failed: {e}")
+            self._finish(job, LessonJob.FAILED, error="Failed to process prompt")
+            return
+        
+        if cached:
+            ai_response = {**cached, "response_time_ms": int((time.time() - start_time) * 1000)}
+        else:
+            ai_response = None
+        self._save_stream(job, ai, category_name, subcategory_name, stats, start_time, ai_response=ai_response)
+    
+    def _save_stream(
+        self,
+        job: StreamingLessonJob,
+        ai: AIService,
+        category_name: Optional[str],
+        subcategory_name: Optional[str],
+        stats: Dict[str, Any],
+        start_time: float,
+        ai_response: Optional[Dict[str, Any]] = None,
+        partial: bool = False
+    ) -> None:
+        """
+        Save the streamed lesson and finish the job.
+        
+        A complete, freshly generated lesson is also cached. A partial lesson
+        (the client went away) is only kept in the user's history. The save
+        ignores the request's deadline: the lesson is already paid for.
+        """
+        response_time_ms = int((time.time() - start_time) * 1000)
+        response = "".join(job.chunks)
+        model_used = stats.get("model_used", ai.model_name)
+        if ai_response is None:
+            ai_response = {
+                "response": response,
+                "model_used": model_used,
+                "response_time_ms": response_time_ms,
+                "cache_hit": False,
+                "partial": partial,
+                "prompt_template": stats.get("prompt_template"),
+                "lesson_length": stats.get("lesson_length"),
+                "queue_wait_ms": stats.get("queue_wait_ms"),
+                "first_token_ms": stats.get("first_token_ms"),
+                "total_time_ms": response_time_ms,
+                "retries": stats.get("retries", 0),
+                "prompt_tokens": stats.get("prompt_tokens"),
+                # The provider's usage report never arrives for an interrupted stream
+                "completion_tokens": count_tokens(response, model_used) if partial else stats.get("completion_tokens")
+            }
+        
+        db = SessionLocal()
+        try:
+            with no_deadline():
+                lesson_service = LessonService(db, ai)
+                if not ai_response.get("cache_hit", False) and not partial:
+                    lesson_service.cache_lesson(
+                        job.prompt_data.prompt, category_name, subcategory_name, ai_response, job.prompt_data.lesson_length
+                    )
+                new_prompt = lesson_service.save_prompt(job.user_id, job.prompt_data, ai_response)
+            job.prompt_id = new_prompt.id
+            if not partial:
+                self._finish(job, LessonJob.COMPLETED)
+        except Exception as e:
+            logger.error(f"Saving lesson stream {job.id} failed: {e}")
+            db.rollback()
+            self._finish(job, LessonJob.FAILED, error="Failed to process prompt")
+        finally:
+            db.close()
+    
+    def _abandon_if_idle(self, job: StreamingLessonJob) -> None:
+        """Cancel a streaming job nobody has followed since the resume window opened."""
+        job.abandon_timer = None
+        if job.subscribers or job.is_finished or job.task is None:
+            return
+        logger.info(f"Lesson stream {job.id} abandoned by its client, cancelling generation")
+        self.streams_abandoned += 1
+        job.task.cancel()
+    
+    def _finish(self, job: LessonJob, status: str, error: Optional[str] = None) -> None:
+        job.status = status
+        job.error = error
+        job.finished_at = datetime.utcnow()
+        job.finished_monotonic = time.monotonic()
+        if isinstance(job, StreamingLessonJob):
+            job.notify()
+            # Subscribers still replaying the buffer release it when they leave (see follow())
+            job.release_chunks()
+    
+    def _prune(self) -> None:
+        """Forget finished jobs older than the TTL."""
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished_monotonic is not None and job.finished_monotonic < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+    
+    async def _prune_loop(self) -> None:
+        """Prune expired jobs every prune_interval_seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.prune_interval_seconds)
+            self._prune()
+
+
+# Global lesson job queue
+lesson_jobs = LessonJobQueue(
+    workers=settings.lesson_job_workers,
+    max_pending=settings.lesson_job_max_pending,
+    ttl_seconds=settings.lesson_job_ttl_seconds,
+    stream_resume_seconds=settings.lesson_stream_resume_seconds
+)
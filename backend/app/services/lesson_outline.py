@@ -0,0 +1,121 @@
+"""
+Outline-then-sections lesson generation helpers.
+A long lesson is planned with a short outline completion, then each section is
+generated by its own completion so the sections can run concurrently. This
+module builds the messages for both phases and assembles the result; the calls
+themselves are made by AIService.
+"""
+import re
+from typing import Optional, Dict, List, Tuple
+
+from ..core.config import settings
+from .token_budget import LESSON_LENGTH_TOKENS
+
+# "# Title" / "## Heading", plus numbered or bulleted lines from models that ignore the format
+OUTLINE_LINE_PATTERN = re.compile(r"^\s*(?:(#{1,6})|\d+[.)]|[-*+])\s+(.+?)\s*#*\s*$")
+
+
+def build_outline_messages(messages: List[Dict[str, str]], max_sections: int) -> List[Dict[str, str]]:
+    """
+    Ask for the lesson's outline instead of the lesson.
+    
+    The template's system message is kept unchanged, so the prompt prefix is
+    shared with the section requests and single-completion lessons.
+    
+    Args:
+        messages: Rendered lesson messages (system + user)
+        max_sections: Most section headings to ask for
+    
+    Returns:
+        Chat messages for the outline completion
+    """
+    instruction = (
+        "\n\nDo not write the lesson yet. Reply only with its outline: "
+        "a title line starting with '# ', then 2 to "
+        f"{max_sections} section headings, each on its own line starting with '## '."
+    )
+    return [*messages[:-1], {"role": "user", "content": messages[-1]["content"] + instruction}]
+
+
+def parse_outline(text: Optional[str], max_sections: int) -> Tuple[Optional[str], List[str]]:
+    """
+    Read the title and section headings from an outline completion.
+    
+    Args:
+        text: Outline completion
+        max_sections: Headings beyond this are dropped
+    
+    Returns:
+        (title, headings); title is None if the outline has no title line
+    """
+    title: Optional[str] = None
+    headings: List[str] = []
+    for line in (text or "").splitlines():
+        match = OUTLINE_LINE_PATTERN.match(line)
+        if not match:
+            continue
+        heading = match.group(2).strip().strip("*").strip()
+        if not heading:
+            continue
+        if match.group(1) == "#" and title is None and not headings:
+            title = heading
+        elif heading not in headings:
+            headings.append(heading)
+    return title, headings[:max_sections]
+
+
+def section_max_tokens(lesson_length: str, sections: int) -> int:
+    """Completion budget of one section: the lesson's budget shared between its sections."""
+    budget = LESSON_LENGTH_TOKENS.get(lesson_length, LESSON_LENGTH_TOKENS["long"])
+    return max(budget // max(sections, 1), settings.lesson_section_min_tokens)
+
+
+def build_section_messages(
+    messages: List[Dict[str, str]],
+    title: str,
+    headings: List[str],
+    index: int,
+    max_tokens: int
+) -> List[Dict[str, str]]:
+    """
+    Ask for one section of an outlined lesson.
+    
+    The whole outline is included so each section stays within its own scope.
+    
+    Args:
+        messages: Rendered lesson messages (system + user)
+        title: Lesson title
+        headings: All section headings, in order
+        index: Position of the section to write
+        max_tokens: Completion budget of the section
+    
+    Returns:
+        Chat messages for the section completion
+    """
+    outline = "\n".join(f"{position + 1}. {heading}" for position, heading in enumerate(headings))
+    instruction = (
+        f"\n\nThe lesson \"{title}\" has these sections:\n{outline}\n\n"
+        f"Write only section {index + 1}, \"{headings[index]}\". Start with the line "
+        f"'## {headings[index]}', use '###' for any subheadings, and do not cover the other sections. "
+        f"Aim for about {max_tokens * 3 // 5} words."
+    )
+    return [*messages[:-1], {"role": "user", "content": messages[-1]["content"] + instruction}]
+
+
+def format_header(title: str, headings: List[str]) -> str:
+    """Lesson title and table of contents, sent to the client as soon as the outline is known."""
+    contents = "\n".join(f"{position + 1}. {heading}" for position, heading in enumerate(headings))
+    return f"# {title}\n\n**In this lesson:**\n{contents}\n\n"
+
+
+def format_missing_section(heading: str) -> str:
+    """Stand-in for a section that could not be generated, so the rest of the lesson still reads in order."""
+    return f"## {heading}\n\n_This section could not be generated. Try regenerating the lesson._\n\n"
+
+
+def format_section(heading: str, content: str) -> str:
+    """Normalize a generated section so it starts with its own heading and ends with a blank line."""
+    content = content.strip()
+    if not content.lstrip("#").strip().lower().startswith(heading.lower()):
+        content = f"## {heading}\n\n{content}"
+    return content + "\n\n"
@@ -0,0 +1,354 @@
+"""
+Off-peak pre-generation of popular lessons.
+Mines the most frequent normalized prompts per subcategory from the prompts table,
+generates their lessons during the configured off-peak hours and serves them from
+an in-process index so matching requests skip the AI provider entirely.
+"""
+import asyncio
+import hashlib
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, date
+from typing import Optional, Dict, Any, List, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..core.deadline import no_deadline
+from ..models.prompt import Prompt
+from ..models.category import Category, SubCategory
+from ..models.pregenerated_lesson import PregeneratedLesson
+from .ai_service import AIService
+from .lesson_cache import normalize_prompt
+from .prompt_templates import prompt_templates
+from .token_budget import resolve_lesson_length
+
+logger = logging.getLogger(__name__)
+
+
+def hash_prompt(prompt: str) -> str:
+    """Return the lookup hash of a prompt's normalized form."""
+    return hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+
+
+class LessonPregenerator:
+    """Scheduled job that pre-generates popular lessons, plus the lookup index they are served from."""
+    
+    def __init__(
+        self,
+        enabled: bool = True,
+        top_n: int = 10,
+        min_count: int = 3,
+        lookback_days: int = 30,
+        refresh_days: int = 7,
+        concurrency: int = 2,
+        off_peak_start_hour: int = 2,
+        off_peak_end_hour: int = 5,
+        check_interval_seconds: int = 600
+    ):
+        self.enabled = enabled
+        self.top_n = top_n
+        self.min_count = min_count
+        self.lookback_days = lookback_days
+        self.refresh_days = refresh_days
+        self.concurrency = concurrency
+        self.off_peak_start_hour = off_peak_start_hour
+        self.off_peak_end_hour = off_peak_end_hour
+        self.check_interval_seconds = check_interval_seconds
+        # (sub_category_id, prompt_hash) -> pre-generated lesson
+        self._lessons: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._run_task: Optional[asyncio.Task] = None
+        self.last_run_date: Optional[date] = None
+        self.last_run_at: Optional[datetime] = None
+        self.last_run_stats: Dict[str, int] = {}
+        self.hits = 0
+    
+    def start(self, ai: AIService) -> None:
+        """Load the index and start the scheduler (call from the running event loop)."""
+        if not self.enabled or self._task:
+            return
+        self._task = asyncio.create_task(self._scheduler(ai), name="lesson-pregeneration")
+        logger.info(
+            f"Lesson pre-generation scheduled daily between {self.off_peak_start_hour:02d}:00 "
+            f"and {self.off_peak_end_hour:02d}:00 UTC"
+        )
+    
+    async def stop(self) -> None:
+        """Cancel the scheduler and any run in progress."""
+        tasks = [task for task in (self._task, self._run_task) if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._run_task = None
+    
+    def trigger(self, ai: AIService) -> bool:
+        """
+        Start a run now, outside the schedule.
+        
+        Args:
+            ai: AI service to generate with
+        
+        Returns:
+            False if a run is already in progress
+        """
+        if self.is_running:
+            return False
+        # Called from a request handler; the run must not inherit its deadline
+        with no_deadline():
+            self._run_task = asyncio.create_task(self.run(ai), name="lesson-pregeneration-run")
+        return True
+    
+    @property
+    def is_running(self) -> bool:
+        return self._run_task is not None and not self._run_task.done()
+    
+    def lookup(
+        self,
+        sub_category_id: Optional[int],
+        prompt: str,
+        category_name: Optional[str] = None,
+        lesson_length: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Return the pre-generated lesson for a request, if one matches.
+        
+        The lesson must have been generated with the same lesson length and
+        prompt template the request would use.
+        
+        Args:
+            sub_category_id: Subcategory of the request
+            prompt: User's learning prompt
+            category_name: Category context
+            lesson_length: Requested lesson length
+        
+        Returns:
+            Dictionary with "response", "model_used" and "prompt_template", or None
+        """
+        if not self.enabled or not sub_category_id or not self._lessons:
+            return None
+        
+        lesson = self._lessons.get((sub_category_id, hash_prompt(prompt)))
+        if lesson is None:
+            return None
+        if lesson["lesson_length"] != resolve_lesson_length(lesson_length, category_name):
+            return None
+        if lesson["prompt_template"] != prompt_templates.select(prompt, category_name).id:
+            return None
+        
+        self.hits += 1
+        return lesson
+    
+    def load(self, db: Session) -> None:
+        """Rebuild the in-process index from the pregenerated_lessons table."""
+        try:
+            rows = db.query(PregeneratedLesson).all()
+        except SQLAlchemyError as e:
+            logger.warning(f"Loading pre-generated lessons failed: {e}")
+            db.rollback()
+            return
+        
+        self._lessons = {
+            (row.sub_category_id, row.prompt_hash): {
+                "response": row.response,
+                "model_used": row.ai_model,
+                "prompt_template": row.prompt_template,
+                "lesson_length": row.lesson_length,
+            }
+            for row in rows
+        }
+    
+    def reload(self) -> None:
+        """Rebuild the index in a session of its own (blocking: run it in a thread from the event loop)."""
+        db = SessionLocal()
+        try:
+            self.load(db)
+        finally:
+            db.close()
+    
+    def mine_popular_prompts(self, db: Session) -> List[Dict[str, Any]]:
+        """
+        Find the most frequent normalized prompts per subcategory.
+        
+        Args:
+            db: Database session
+        
+        Returns:
+            Candidates with "sub_category_id", "normalized_prompt", "prompt"
+            (most common spelling) and "count", most popular first
+        """
+        cutoff = datetime.utcnow() - timedelta(days=self.lookback_days)
+        rows = db.query(Prompt.sub_category_id, Prompt.prompt).filter(
+            Prompt.sub_category_id.isnot(None),
+            Prompt.created_at >= cutoff
+        ).yield_per(1000)
+        
+        counts: Dict[int, Counter] = {}
+        spellings: Dict[Tuple[int, str], Counter] = {}
+        for sub_category_id, prompt in rows:
+            normalized = normalize_prompt(prompt)
+            counts.setdefault(sub_category_id, Counter())[normalized] += 1
+            spellings.setdefault((sub_category_id, normalized), Counter())[prompt.strip()] += 1
+        
+        candidates = []
+        for sub_category_id, counter in counts.items():
+            for normalized, count in counter.most_common(self.top_n):
+                if count < self.min_count:
+                    break
+                candidates.append({
+                    "sub_category_id": sub_category_id,
+                    "normalized_prompt": normalized,
+                    "prompt": spellings[(sub_category_id, normalized)].most_common(1)[0][0],
+                    "count": count,
+                })
+        candidates.sort(key=lambda candidate: candidate["count"], reverse=True)
+        return candidates
+    
+    async def run(self, ai: AIService) -> Dict[str, int]:
+        """
+        Mine popular prompts and (re)generate lessons that are missing or stale.
+        
+        Args:
+            ai: AI service to generate with
+        
+        Returns:
+            Counters: candidates, generated, skipped, failed
+        """
+        stats = {"candidates": 0, "generated": 0, "skipped": 0, "failed": 0}
+        db = SessionLocal()
+        try:
+            # The queries block, so they run in a worker thread; the session is only used by one thread at a time
+            candidates, names, existing = await asyncio.to_thread(self._load_run_inputs, db)
+            stats["candidates"] = len(candidates)
+            stale_before = datetime.utcnow() - timedelta(days=self.refresh_days)
+            semaphore = asyncio.Semaphore(self.concurrency)
+            
+            async def generate(candidate: Dict[str, Any]) -> None:
+                category_name, subcategory_name = names.get(candidate["sub_category_id"], (None, None))
+                lesson_length = resolve_lesson_length(None, category_name)
+                template_id = prompt_templates.select(candidate["prompt"], category_name).id
+                prompt_hash = hash_prompt(candidate["prompt"])
+                row = existing.get((candidate["sub_category_id"], prompt_hash))
+                
+                if row is not None:
+                    row.request_count = candidate["count"]
+                    if (
+                        row.generated_at and row.generated_at >= stale_before
+                        and row.lesson_length == lesson_length
+                        and row.prompt_template == template_id
+                    ):
+                        stats["skipped"] += 1
+                        return
+                
+                try:
+                    async with semaphore:
+                        ai_response = await ai.generate_lesson_async(
+                            prompt=candidate["prompt"],
+                            category_name=category_name,
+                            subcategory_name=subcategory_name,
+                            lesson_length=lesson_length
+                        )
+                except Exception as e:
+                    logger.warning(f"Pre-generating '{candidate['prompt'][:50]}' failed: {e}")
+                    stats["failed"] += 1
+                    return
+                
+                if row is None:
+                    row = PregeneratedLesson(
+                        sub_category_id=candidate["sub_category_id"],
+                        prompt_hash=prompt_hash,
+                        normalized_prompt=candidate["normalized_prompt"],
+                        request_count=candidate["count"]
+                    )
+                    db.add(row)
+                row.prompt = candidate["prompt"]
+                row.lesson_length = lesson_length
+                row.prompt_template = ai_response.get("prompt_template", template_id)
+                row.ai_model = ai_response["model_used"]
+                row.response = ai_response["response"]
+                row.generated_at = datetime.utcnow()
+                stats["generated"] += 1
+            
+            await asyncio.gather(*(generate(candidate) for candidate in candidates))
+            await asyncio.to_thread(self._commit_and_load, db)
+        except Exception as e:
+            logger.exception(f"Lesson pre-generation failed: {e}")
+            db.rollback()
+        finally:
+            db.close()
+        
+        self.last_run_at = datetime.utcnow()
+        self.last_run_stats = stats
+        logger.info(f"Lesson pre-generation finished: {stats}")
+        return stats
+    
+    def _load_run_inputs(
+        self, db: Session
+    ) -> Tuple[List[Dict[str, Any]], Dict[int, Tuple[str, str]], Dict[Tuple[int, str], PregeneratedLesson]]:
+        """Return a run's candidates, subcategory context names and existing lessons by (subcategory, hash)."""
+        candidates = self.mine_popular_prompts(db)
+        names = {
+            sub_id: (category_name, sub_name)
+            for sub_id, sub_name, category_name in db.query(
+                SubCategory.id, SubCategory.name, Category.name
+            ).join(Category, SubCategory.category_id == Category.id).all()
+        }
+        existing = {
+            (row.sub_category_id, row.prompt_hash): row
+            for row in db.query(PregeneratedLesson).all()
+        }
+        return candidates, names, existing
+    
+    def _commit_and_load(self, db: Session) -> None:
+        """Save a run's lessons and rebuild the index from them."""
+        db.commit()
+        self.load(db)
+    
+    def is_off_peak(self, hour: int) -> bool:
+        """Return True if the UTC hour falls in the off-peak window (which may wrap midnight)."""
+        if self.off_peak_start_hour <= self.off_peak_end_hour:
+            return self.off_peak_start_hour <= hour < self.off_peak_end_hour
+        return hour >= self.off_peak_start_hour or hour < self.off_peak_end_hour
+    
+    async def _scheduler(self, ai: AIService) -> None:
+        """Refresh the index periodically and run once per day during off-peak hours."""
+        while True:
+            try:
+                # Also picks up lessons generated by other workers
+                await asyncio.to_thread(self.reload)
+                
+                now = datetime.utcnow()
+                if self.is_off_peak(now.hour) and self.last_run_date != now.date() and not self.is_running:
+                    self.last_run_date = now.date()
+                    self.trigger(ai)
+            except Exception as e:
+                logger.error(f"Lesson pre-generation scheduler error: {e}")
+            await asyncio.sleep(self.check_interval_seconds)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return index size, hits and the last run's counters."""
+        return {
+            "enabled": self.enabled,
+            "lessons": len(self._lessons),
+            "hits": self.hits,
+            "running": self.is_running,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_run": self.last_run_stats,
+        }
+
+
+# Global lesson pre-generator
+lesson_pregenerator = LessonPregenerator(
+    enabled=settings.lesson_pregeneration_enabled,
+    top_n=settings.lesson_pregeneration_top_n,
+    min_count=settings.lesson_pregeneration_min_count,
+    lookback_days=settings.lesson_pregeneration_lookback_days,
+    refresh_days=settings.lesson_pregeneration_refresh_days,
+    concurrency=settings.lesson_pregeneration_concurrency,
+    off_peak_start_hour=settings.lesson_pregeneration_start_hour,
+    off_peak_end_hour=settings.lesson_pregeneration_end_hour,
+    check_interval_seconds=settings.lesson_pregeneration_check_interval_seconds
+)
@@ -0,0 +1,407 @@
+"""
+Lesson service tying together context lookup, caching, AI generation and persistence.
+Used by the prompt routes so every entry point follows the same lesson pipeline.
+"""
+import asyncio
+import time
+import logging
+from typing import Optional, Dict, Any, List, Tuple
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..core.exceptions import AIServiceException
+from ..models.prompt import Prompt
+from ..models.lesson_section import LessonSection
+from ..models.category import Category, SubCategory
+from ..schemas.prompt import PromptCreate
+from .ai_service import AIService
+from .lesson_cache import lesson_cache, make_cache_key
+from .single_flight import SingleFlight
+from .token_budget import resolve_lesson_length, count_tokens
+from .prompt_templates import prompt_templates
+from .lesson_pregeneration import lesson_pregenerator
+from .rate_limiter import user_rate_limiter
+from .semantic_index import semantic_index
+from ..utils.markdown_sections import split_sections
+from ..utils.content_filter import content_filter
+
+logger = logging.getLogger(__name__)
+
+# Identical lesson requests that arrive while one is generating share its result
+lesson_flight = SingleFlight()
+
+
+class LessonService:
+    """Service for producing lessons and storing them as prompt records."""
+    
+    def __init__(self, db: Session, ai: AIService):
+        self.db = db
+        self.ai = ai
+    
+    def get_context_names(self, prompt_data: PromptCreate) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Look up the category and subcategory names used as AI context.
+        
+        Args:
+            prompt_data: Submitted prompt with optional category IDs
+            
+        Returns:
+            Tuple of (category_name, subcategory_name)
+        """
+        category_name = None
+        subcategory_name = None
+        
+        if prompt_data.category_id:
+            category = self.db.query(Category).filter(Category.id == prompt_data.category_id).first()
+            if category:
+                category_name = category.name
+        
+        if prompt_data.sub_category_id:
+            subcategory = self.db.query(SubCategory).filter(SubCategory.id == prompt_data.sub_category_id).first()
+            if subcategory:
+                subcategory_name = subcategory.name
+        
+        return category_name, subcategory_name
+    
+    def get_cached_lesson(
+        self,
+        prompt: str,
+        category_name: Optional[str] = None,
+        subcategory_name: Optional[str] = None,
+        lesson_length: Optional[str] = None,
+        sub_category_id: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Return a pre-generated, cached or near-duplicate lesson in the
+        generate_lesson result format, if any.
+        
+        Args:
+            prompt: User's learning prompt
+            category_name: Category context
+            subcategory_name: Subcategory context
+            lesson_length: Requested lesson length
+            sub_category_id: Subcategory ID, used for pre-generated lessons
+            
+        Returns:
+            Lesson result dictionary with cache_hit=True, or None on a miss
+        """
+        start_time = time.time()
+        cached = lesson_pregenerator.lookup(sub_category_id, prompt, category_name, lesson_length)
+        if cached is None:
+            key = self._cache_key(prompt, category_name, subcategory_name, lesson_length)
+            cached = lesson_cache.get(self.db, key)
+        if cached is None:
+            cached = self._find_similar_lesson(prompt, category_name, lesson_length, sub_category_id)
+        if cached is None:
+            return None
+        
+        return {
+            "response": cached["response"],
+            "model_used": cached["model_used"],
+            "response_time_ms": int((time.time() - start_time) * 1000),
+            "success": True,
+            "cache_hit": True,
+            "prompt_template": prompt_templates.select(prompt, category_name).id
+        }
+    
+    def _find_similar_lesson(
+        self,
+        prompt: str,
+        category_name: Optional[str],
+        lesson_length: Optional[str],
+        sub_category_id: Optional[int]
+    ) -> Optional[Dict[str, Any]]:
+        """Return the stored lesson of a near-duplicate prompt in the same subcategory, if any."""
+        match = semantic_index.search(sub_category_id, prompt, resolve_lesson_length(lesson_length, category_name))
+        if match is None:
+            return None
+        row = self.db.query(Prompt.response, Prompt.ai_model).filter(Prompt.id == match["prompt_id"]).first()
+        if row is None or not row.response:
+            return None
+        logger.info(f"Serving lesson of prompt {match['prompt_id']} for a near-duplicate (similarity {match['similarity']})")
+        return {"response": row.response, "model_used": row.ai_model}
+    
+    def cache_lesson(
+        self,
+        prompt: str,
+        category_name: Optional[str],
+        subcategory_name: Optional[str],
+        ai_response: Dict[str, Any],
+        lesson_length: Optional[str] = None
+    ) -> None:
+        """
+        Store a freshly generated lesson in the lesson cache.
+        
+        Args:
+            prompt: User's learning prompt
+            category_name: Category context
+            subcategory_name: Subcategory context
+            ai_response: Result returned by the AI service
+            lesson_length: Requested lesson length
+        """
+        key = self._cache_key(prompt, category_name, subcategory_name, lesson_length)
+        lesson_cache.set(
+            self.db, key, prompt, category_name, subcategory_name,
+            ai_response["model_used"], ai_response["response"]
+        )
+    
+    async def generate_lesson(
+        self,
+        prompt: str,
+        category_name: Optional[str] = None,
+        subcategory_name: Optional[str] = None,
+        user_context: Optional[str] = None,
+        lesson_length: Optional[str] = None,
+        sub_category_id: Optional[int] = None,
+        parallel_sections: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Produce a lesson, serving it from the pre-generated lessons or the cache when possible.
+        
+        Concurrent identical requests are coalesced: only the first one calls
+        the AI provider and the others wait for its result. The session's
+        transaction is committed before generation starts, so no database
+        connection is checked out while the lesson is generated; objects
+        loaded on the session are expired and reload on next access.
+        
+        Args:
+            prompt: User's learning prompt
+            category_name: Category context
+            subcategory_name: Subcategory context
+            user_context: Additional user context
+            lesson_length: Requested lesson length
+            sub_category_id: Subcategory ID, used for pre-generated lessons
+            parallel_sections: Generate a new lesson as an outline plus concurrent sections
+            
+        Returns:
+            Lesson result dictionary including a cache_hit flag
+            
+        Raises:
+            AIServiceException: If AI generation fails
+        """
+        cached = self.get_cached_lesson(prompt, category_name, subcategory_name, lesson_length, sub_category_id)
+        if cached:
+            return cached
+        
+        # End the read transaction so the pooled connection is not held while the AI generates
+        self.db.commit()
+        
+        start_time = time.time()
+        key = self._cache_key(prompt, category_name, subcategory_name, lesson_length)
+        shared_response, shared = await lesson_flight.do(
+            key,
+            lambda: self.ai.generate_lesson_async(
+                prompt=prompt,
+                category_name=category_name,
+                subcategory_name=subcategory_name,
+                user_context=user_context,
+                lesson_length=lesson_length,
+                parallel_sections=parallel_sections
+            )
+        )
+        
+        # Each caller gets its own copy; the leader is responsible for caching
+        ai_response = dict(shared_response)
+        ai_response["cache_hit"] = False
+        if shared:
+            ai_response["response_time_ms"] = int((time.time() - start_time) * 1000)
+            # Every requester pays for the lesson against their daily quota, but the
+            # generation's tokens are recorded once, on the leader's prompt
+            ai_response["charged_tokens"] = shared_response.get("completion_tokens")
+            ai_response["prompt_tokens"] = ai_response["completion_tokens"] = 0
+        else:
+            self.cache_lesson(prompt, category_name, subcategory_name, ai_response, lesson_length)
+        return ai_response
+    
+    def _cache_key(
+        self,
+        prompt: str,
+        category_name: Optional[str],
+        subcategory_name: Optional[str],
+        lesson_length: Optional[str]
+    ) -> str:
+        """
+        Cache and coalescing key for a request, using the resolved lesson length and template.
+        
+        The key holds the configured primary model, not the model_used of the
+        lesson: the key is needed before generation, when routing and failover
+        have not picked a model yet, and a lesson from a fallback or routed
+        model answers the request just as well. Changing the primary model
+        (OPENAI_MODEL) starts a fresh cache, so lessons follow model upgrades.
+        
+        parallel_sections is deliberately not part of the key: it only changes
+        how a lesson is generated, not what it covers, and a cached lesson is
+        faster than either way of generating one.
+        """
+        return make_cache_key(
+            prompt, category_name, subcategory_name, self.ai.model_name,
+            resolve_lesson_length(lesson_length, category_name),
+            prompt_templates.select(prompt, category_name).id
+        )
+    
+    def save_prompt(self, user_id: int, prompt_data: PromptCreate, ai_response: Dict[str, Any]) -> Prompt:
+        """
+        Persist a prompt together with its generated lesson and count the
+        generated tokens against the user's daily quota.
+        
+        Args:
+            user_id: Owner of the prompt
+            prompt_data: Submitted prompt
+            ai_response: Lesson result dictionary
+            
+        Returns:
+            The saved Prompt record
+        """
+        new_prompt = self._build_prompt(user_id, prompt_data, ai_response)
+        
+        self.db.add(new_prompt)
+        self.db.commit()
+        self.db.refresh(new_prompt)
+        self._record_usage(user_id, ai_response)
+        self._index_lesson(new_prompt, ai_response)
+        return new_prompt
+    
+    async def generate_batch(
+        self,
+        user_id: int,
+        items: List[PromptCreate],
+        user_context: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Generate lessons for several prompts concurrently and save them together.
+        
+        The caller bounds the batch size (the route checks lesson_batch_max_items).
+        
+        At most lesson_batch_concurrency items are generated at once (the global
+        AI limiter still applies), each with a database session of its own for
+        its context and cache lookups. Successful items are inserted in a
+        single transaction on this service's session; failed items are
+        reported without affecting the others.
+        
+        Args:
+            user_id: Owner of the prompts
+            items: Submitted prompts
+            user_context: Additional user context
+            
+        Returns:
+            One result per item, in request order, with "index", "success",
+            "status_code" and either "prompt" (saved Prompt) or "error"
+        """
+        # The items use sessions of their own; don't hold this one's connection meanwhile
+        self.db.commit()
+        
+        semaphore = asyncio.Semaphore(settings.lesson_batch_concurrency)
+        context_names: Dict[Tuple[Optional[int], Optional[int]], Tuple[Optional[str], Optional[str]]] = {}
+        
+        async def run(index: int, prompt_data: PromptCreate) -> Dict[str, Any]:
+            if not content_filter.is_allowed(prompt_data.prompt):
+                return {"index": index, "success": False, "status_code": 422, "error": "Prompt contains content that is not allowed"}
+            
+            try:
+                async with semaphore:
+                    # A Session must not be shared between concurrently running items
+                    item_db = SessionLocal()
+                    try:
+                        item_service = LessonService(item_db, self.ai)
+                        ids = (prompt_data.category_id, prompt_data.sub_category_id)
+                        if ids not in context_names:
+                            context_names[ids] = item_service.get_context_names(prompt_data)
+                        category_name, subcategory_name = context_names[ids]
+                        
+                        ai_response = await item_service.generate_lesson(
+                            prompt=prompt_data.prompt,
+                            category_name=category_name,
+                            subcategory_name=subcategory_name,
+                            user_context=user_context,
+                            lesson_length=prompt_data.lesson_length,
+                            sub_category_id=prompt_data.sub_category_id,
+                            parallel_sections=prompt_data.parallel_sections
+                        )
+                    finally:
+                        item_db.close()
+                return {"index": index, "success": True, "status_code": 200, "ai_response": ai_response}
+            except AIServiceException as e:
+                return {"index": index, "success": False, "status_code": e.status_code, "error": f"AI service error: {e.detail}"}
+            except HTTPException as e:
+                return {"index": index, "success": False, "status_code": e.status_code, "error": e.detail}
+            except Exception as e:
+                logger.exception(f"Batch item {index} failed: {e}")
+                return {"index": index, "success": False, "status_code": 500, "error": "Failed to process prompt"}
+        
+        results = await asyncio.gather(*(run(index, item) for index, item in enumerate(items)))
+        
+        # One transaction for every successful item
+        saved = []
+        for result in results:
+            if result["success"]:
+                ai_response = result.pop("ai_response")
+                result["prompt"] = self._build_prompt(user_id, items[result["index"]], ai_response)
+                saved.append((result["prompt"], ai_response))
+        
+        if saved:
+            self.db.add_all([prompt for prompt, _ in saved])
+            self.db.commit()
+            for prompt, ai_response in saved:
+                self.db.refresh(prompt)
+                self._record_usage(user_id, ai_response)
+                self._index_lesson(prompt, ai_response)
+        
+        return results
+    
+    def _record_usage(self, user_id: int, ai_response: Dict[str, Any]) -> None:
+        """
+        Count a freshly generated lesson's tokens against the user's daily quota; cache hits are free.
+        
+        A coalesced request is charged the tokens of the generation it shared
+        (charged_tokens), like the request that ran it.
+        """
+        if not ai_response.get("cache_hit", False):
+            tokens = ai_response.get("charged_tokens", ai_response.get("completion_tokens"))
+            if tokens is None:
+                tokens = count_tokens(ai_response["response"], ai_response["model_used"])
+            user_rate_limiter.record_tokens(user_id, tokens)
+    
+    def _index_lesson(self, prompt: Prompt, ai_response: Dict[str, Any]) -> None:
+        """Add a freshly generated, complete lesson to the near-duplicate index."""
+        if ai_response.get("partial", False):
+            return
+        if not ai_response.get("cache_hit", False) and ai_response.get("lesson_length"):
+            semantic_index.add(prompt.sub_category_id, prompt.prompt, prompt.id, ai_response["lesson_length"])
+    
+    def _build_sections(self, response: str) -> List[LessonSection]:
+        """Split a lesson into unsaved LessonSection records."""
+        return [
+            LessonSection(
+                position=section["position"],
+                level=section["level"],
+                title=section["title"],
+                anchor=section["anchor"],
+                content=section["content"],
+                char_count=len(section["content"])
+            )
+            for section in split_sections(response)
+        ]
+    
+    def _build_prompt(self, user_id: int, prompt_data: PromptCreate, ai_response: Dict[str, Any]) -> Prompt:
+        """Create an unsaved Prompt record, with its lesson sections, from a lesson result."""
+        return Prompt(
+            user_id=user_id,
+            category_id=prompt_data.category_id,
+            sub_category_id=prompt_data.sub_category_id,
+            prompt=prompt_data.prompt,
+            response=ai_response["response"],
+            ai_model=ai_response["model_used"],
+            response_time_ms=ai_response["response_time_ms"],
+            cache_hit=ai_response.get("cache_hit", False),
+            prompt_template=ai_response.get("prompt_template"),
+            prompt_tokens=ai_response.get("prompt_tokens"),
+            completion_tokens=ai_response.get("completion_tokens"),
+            queue_wait_ms=ai_response.get("queue_wait_ms"),
+            first_token_ms=ai_response.get("first_token_ms"),
+            total_time_ms=ai_response.get("total_time_ms"),
+            retries=ai_response.get("retries"),
+            partial=ai_response.get("partial", False),
+            sections=self._build_sections(ai_response["response"])
+        )
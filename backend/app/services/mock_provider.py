@@ -0,0 +1,290 @@
+"""
+Local mock of the OpenAI chat-completions API for load and latency testing.
+Enabled with AI_MOCK_ENABLED=true; requests go through the real OpenAI SDK and an
+in-process httpx transport, so the full request path runs with no network or quota.
+"""
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from typing import Optional, Dict, Any, List, Iterator, AsyncIterator
+
+import httpx
+import openai
+
+from ..core.config import settings
+from .ai_providers import OpenAIProvider
+
+MOCK_BASE_URL = "http://mock-openai.local/v1"
+
+_FILLER_WORDS = (
+    "the concept builds on earlier ideas and shows how each part works together "
+    "with a clear example that the learner can follow step by step before moving on"
+).split()
+
+
+class MockChatTransport(httpx.AsyncBaseTransport, httpx.BaseTransport):
+    """
+    httpx transport answering POST /chat/completions like the OpenAI API.
+    
+    Latency is time-to-first-token sampled from the configured distribution plus
+    a per-token delay; a share of requests fail with 429 or 500 responses.
+    """
+    
+    def __init__(
+        self,
+        latency_ms: float = 500.0,
+        latency_distribution: str = "lognormal",
+        latency_sigma: float = 0.5,
+        tokens_per_second: float = 200.0,
+        response_tokens: int = 400,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            latency_ms: Mean time to first token
+            latency_distribution: "fixed", "uniform", "exponential" or "lognormal"
+            latency_sigma: Shape of the lognormal distribution
+            tokens_per_second: Generation speed after the first token
+            response_tokens: Mean response size in tokens (capped by max_tokens)
+            error_rate: Fraction of requests answered with HTTP 500
+            rate_limit_rate: Fraction of requests answered with HTTP 429
+            seed: Random seed for reproducible runs
+        """
+        self.latency_ms = latency_ms
+        self.latency_distribution = latency_distribution
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+    
+    def sample_latency_ms(self) -> float:
+        """Draw a time-to-first-token from the configured distribution."""
+        mean = self.latency_ms
+        if mean <= 0 or self.latency_distribution == "fixed":
+            return max(mean, 0.0)
+        if self.latency_distribution == "uniform":
+            return self.random.uniform(0, 2 * mean)
+        if self.latency_distribution == "exponential":
+            return self.random.expovariate(1 / mean)
+        # lognormal with the requested mean: a realistic long tail
+        sigma = self.latency_sigma
+        return self.random.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma)
+    
+    def _plan(self, request: httpx.Request) -> Dict[str, Any]:
+        """Decide outcome, delays and content for one request."""
+        self.requests += 1
+        body = json.loads(request.content or b"{}")
+        roll = self.random.random()
+        
+        if roll < self.rate_limit_rate:
+            status = 429
+        elif roll < self.rate_limit_rate + self.error_rate:
+            status = 500
+        else:
+            status = 200
+        
+        max_tokens = body.get("max_tokens") or self.response_tokens
+        size = max(1, int(self.random.gauss(self.response_tokens, self.response_tokens * 0.2)))
+        words = self._words(min(size, max_tokens), body.get("messages") or [])
+        return {
+            "status": status,
+            "body": body,
+            "words": words,
+            "first_token_s": self.sample_latency_ms() / 1000,
+            "per_token_s": 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0,
+        }
+    
+    def _words(self, count: int, messages: List[Dict[str, Any]]) -> List[str]:
+        """Build a markdown-ish lesson of roughly count tokens."""
+        topic = str(messages[-1].get("content", "the topic")).splitlines()[-1][:60] if messages else "the topic"
+        words = [f"# Lesson: {topic}\n\n"]
+        for index in range(count):
+            if index and index % 80 == 0:
+                words.append(f"\n\n## Part {index // 80 + 1}\n\n")
+            words.append(_FILLER_WORDS[index % len(_FILLER_WORDS)] + " ")
+        return words
+    
+    def _error_response(self, plan: Dict[str, Any], request: httpx.Request) -> httpx.Response:
+        """Build an OpenAI-style error response."""
+        self.errors += 1
+        if plan["status"] == 429:
+            return httpx.Response(
+                429,
+                headers={"retry-after": "1"},
+                json={"error": {"message": "Rate limit reached (mock)", "type": "requests", "code": "rate_limit_exceeded"}},
+                request=request
+            )
+        return httpx.Response(
+            500,
+            json={"error": {"message": "The server had an error (mock)", "type": "server_error", "code": None}},
+            request=request
+        )
+    
+    def _completion(self, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """Non-streaming chat.completion payload."""
+        content = "".join(plan["words"])
+        return {
+            "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": plan["body"].get("model", settings.ai_mock_model),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": self._usage(plan),
+        }
+    
+    def _usage(self, plan: Dict[str, Any]) -> Dict[str, int]:
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 4 for m in plan["body"].get("messages") or [])
+        completion_tokens = len(plan["words"])
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+    
+    def _chunk(self, plan: Dict[str, Any], chunk_id: str, delta: Dict[str, Any], finish_reason: Optional[str] = None) -> bytes:
+        payload = {
+            "id": chunk_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": plan["body"].get("model", settings.ai_mock_model),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+    
+    def _events(self, plan: Dict[str, Any]) -> Iterator[bytes]:
+        """SSE events for a streamed completion; delays are applied by the caller."""
+        chunk_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        yield self._chunk(plan, chunk_id, {"role": "assistant", "content": ""})
+        for word in plan["words"]:
+            yield self._chunk(plan, chunk_id, {"content": word})
+        yield self._chunk(plan, chunk_id, {}, finish_reason="stop")
+        if (plan["body"].get("stream_options") or {}).get("include_usage"):
+            payload = {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": plan["body"].get("model", settings.ai_mock_model),
+                "choices": [],
+                "usage": self._usage(plan),
+            }
+            yield f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+        yield b"data: [DONE]\n\n"
+    
+    def _model(self, request: httpx.Request) -> httpx.Response:
+        """Answer a models.retrieve call (used by health checks) immediately."""
+        model_id = request.url.path.rsplit("/", 1)[-1]
+        return httpx.Response(200, json={"id": model_id, "object": "model", "created": 0, "owned_by": "mock"}, request=request)
+    
+    def _not_found(self, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(404, json={"error": {"message": "Unknown mock endpoint", "type": "invalid_request_error"}}, request=request)
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "GET" and "/models/" in request.url.path:
+            return self._model(request)
+        if not request.url.path.endswith("/chat/completions"):
+            return self._not_found(request)
+        
+        plan = self._plan(request)
+        await asyncio.sleep(plan["first_token_s"])
+        if plan["status"] != 200:
+            return self._error_response(plan, request)
+        
+        if not plan["body"].get("stream"):
+            await asyncio.sleep(plan["per_token_s"] * len(plan["words"]))
+            return httpx.Response(200, json=self._completion(plan), request=request)
+        
+        async def stream() -> AsyncIterator[bytes]:
+            for index, event in enumerate(self._events(plan)):
+                if index > 1:
+                    await asyncio.sleep(plan["per_token_s"])
+                yield event
+        
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=stream(), request=request)
+    
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "GET" and "/models/" in request.url.path:
+            return self._model(request)
+        if not request.url.path.endswith("/chat/completions"):
+            return self._not_found(request)
+        
+        plan = self._plan(request)
+        time.sleep(plan["first_token_s"])
+        if plan["status"] != 200:
+            return self._error_response(plan, request)
+        
+        if not plan["body"].get("stream"):
+            time.sleep(plan["per_token_s"] * len(plan["words"]))
+            return httpx.Response(200, json=self._completion(plan), request=request)
+        
+        def stream() -> Iterator[bytes]:
+            for index, event in enumerate(self._events(plan)):
+                if index > 1:
+                    time.sleep(plan["per_token_s"])
+                yield event
+        
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=stream(), request=request)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return request counters and the active configuration."""
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_ms": self.latency_ms,
+            "latency_distribution": self.latency_distribution,
+            "tokens_per_second": self.tokens_per_second,
+            "response_tokens": self.response_tokens,
+            "error_rate": self.error_rate,
+            "rate_limit_rate": self.rate_limit_rate,
+        }
+
+
+def create_mock_transport() -> MockChatTransport:
+    """Build the mock transport from settings."""
+    return MockChatTransport(
+        latency_ms=settings.ai_mock_latency_ms,
+        latency_distribution=settings.ai_mock_latency_distribution,
+        latency_sigma=settings.ai_mock_latency_sigma,
+        tokens_per_second=settings.ai_mock_tokens_per_second,
+        response_tokens=settings.ai_mock_response_tokens,
+        error_rate=settings.ai_mock_error_rate,
+        rate_limit_rate=settings.ai_mock_rate_limit_rate,
+        seed=settings.ai_mock_seed
+    )
+
+
+class MockProvider(OpenAIProvider):
+    """OpenAI provider wired to the in-process mock API instead of api.openai.com."""
+    
+    name = "mock"
+    
+    def __init__(self, model_name: str, transport: MockChatTransport):
+        self.transport = transport
+        self.http_client = httpx.AsyncClient(transport=transport)
+        super().__init__("mock-key", model_name, self.http_client, base_url=MOCK_BASE_URL)
+    
+    async def aclose(self) -> None:
+        await self.http_client.aclose()
+    
+    def get_info(self) -> Dict[str, Any]:
+        info = super().get_info()
+        info["mock"] = self.transport.get_stats()
+        return info
+
+
+def create_mock_sync_client(transport: MockChatTransport) -> openai.OpenAI:
+    """Sync OpenAI client served by the mock transport (health check, scripts)."""
+    return openai.OpenAI(
+        api_key="mock-key",
+        base_url=MOCK_BASE_URL,
+        http_client=httpx.Client(transport=transport),
+        max_retries=0
+    )
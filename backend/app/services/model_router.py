@@ -0,0 +1,139 @@
+"""
+Latency-aware model routing.
+Chooses which configured model serves a lesson request: a manual override or
+per-category model wins, short prompts go to whichever model has been fastest
+on short prompts recently, and everything else uses the primary model.
+"""
+import logging
+import random
+from typing import Optional, Dict, Any, List
+
+from ..core.config import settings
+from .ai_providers import AIProvider
+from .latency import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRouter:
+    """Picks a provider per request among the primary provider's configured models."""
+    
+    def __init__(
+        self,
+        providers: List[AIProvider],
+        small_prompt_tokens: int = 40,
+        model_by_category: Optional[Dict[str, str]] = None,
+        override_model: Optional[str] = None,
+        min_samples: int = 10,
+        explore_percent: float = 5.0
+    ):
+        """
+        Create the router.
+        
+        Args:
+            providers: Candidate providers, the default (primary) model first
+            small_prompt_tokens: Prompts with at most this many tokens are routed to the fastest model
+            model_by_category: Category name -> model name, checked before the prompt length
+            override_model: Model used for every request when set
+            min_samples: Short-prompt latency samples a model needs before it is compared
+            explore_percent: Share of short prompts sent to a random model to keep its latency fresh
+        """
+        self.providers = providers
+        self.default = providers[0]
+        self.small_prompt_tokens = small_prompt_tokens
+        self.model_by_category = {name.lower(): model for name, model in (model_by_category or {}).items()}
+        self.override_model = override_model
+        self.min_samples = min_samples
+        self.explore_percent = explore_percent
+        self._by_model: Dict[str, AIProvider] = {provider.model_name: provider for provider in providers}
+        # Per-model latency of short-prompt generations, excluding queue wait
+        self.small_prompt_latency: Dict[str, LatencyWindow] = {provider.model_name: LatencyWindow() for provider in providers}
+        self.routed: Dict[str, int] = {provider.model_name: 0 for provider in providers}
+        
+        for model in [override_model, *self.model_by_category.values()]:
+            if model and model not in self._by_model:
+                logger.warning(f"Routing model '{model}' is not configured (AI_ROUTING_MODELS); it will be ignored")
+    
+    def route(self, prompt_tokens: int, category_name: Optional[str] = None) -> AIProvider:
+        """
+        Choose the provider for a request.
+        
+        Order: manual override, per-category model, fastest model for short
+        prompts, then the default model.
+        
+        Args:
+            prompt_tokens: Token count of the user's prompt (without the template)
+            category_name: Category of the request
+        
+        Returns:
+            Provider to try first
+        """
+        provider = self._by_model.get(self.override_model or "")
+        if provider is None and category_name:
+            provider = self._by_model.get(self.model_by_category.get(category_name.lower(), ""))
+        if provider is None and self.is_small(prompt_tokens):
+            provider = self._fastest()
+        provider = provider or self.default
+        self.routed[provider.model_name] += 1
+        return provider
+    
+    def is_small(self, prompt_tokens: int) -> bool:
+        """True if a prompt is short enough for latency-based routing."""
+        return len(self.providers) > 1 and prompt_tokens <= self.small_prompt_tokens
+    
+    def record(self, model_name: str, prompt_tokens: int, latency_ms: float) -> None:
+        """
+        Record the generation time of a short prompt for its model.
+        
+        Args:
+            model_name: Model that generated the lesson
+            prompt_tokens: Token count of the user's prompt
+            latency_ms: Generation time, excluding queue wait
+        """
+        if self.is_small(prompt_tokens) and model_name in self.small_prompt_latency:
+            self.small_prompt_latency[model_name].record(latency_ms)
+    
+    def _fastest(self) -> AIProvider:
+        """Model with the lowest median short-prompt latency, measuring unsampled models first."""
+        unsampled = [p for p in self.providers if len(self.small_prompt_latency[p.model_name]) < self.min_samples]
+        if unsampled:
+            return min(unsampled, key=lambda p: len(self.small_prompt_latency[p.model_name]))
+        if random.random() * 100 < self.explore_percent:
+            return random.choice(self.providers)
+        return min(self.providers, key=lambda p: self.small_prompt_latency[p.model_name].percentile(50))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return routing configuration, counts and per-model short-prompt latency."""
+        return {
+            "enabled": True,
+            "models": [provider.model_name for provider in self.providers],
+            "default_model": self.default.model_name,
+            "override_model": self.override_model,
+            "model_by_category": self.model_by_category,
+            "small_prompt_tokens": self.small_prompt_tokens,
+            "routed": self.routed,
+            "small_prompt_latency": {model: window.snapshot() for model, window in self.small_prompt_latency.items()},
+        }
+
+
+def create_model_router(primary: AIProvider) -> ModelRouter:
+    """
+    Build the router for the primary provider from the AI_ROUTING_* settings.
+    
+    Each extra model reuses the primary provider's API client.
+    
+    Args:
+        primary: Primary provider, serving the default model
+    
+    Returns:
+        Router over the default model plus AI_ROUTING_MODELS
+    """
+    extra_models = [model for model in settings.ai_routing_models if model != primary.model_name]
+    return ModelRouter(
+        [primary, *(primary.with_model(model) for model in dict.fromkeys(extra_models))],
+        small_prompt_tokens=settings.ai_routing_small_prompt_tokens,
+        model_by_category=settings.ai_routing_model_by_category,
+        override_model=settings.ai_routing_override_model,
+        min_samples=settings.ai_routing_min_samples,
+        explore_percent=settings.ai_routing_explore_percent
+    )
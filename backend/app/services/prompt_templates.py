@@ -0,0 +1,197 @@
+"""
+Versioned prompt templates for lesson generation.
+Templates are compiled once at import time. The system message of a template is
+fully static, so every request for a category starts with a byte-identical prefix
+that provider-side prompt caching can reuse; per-request data only goes in the
+user message at the end.
+"""
+import string
+import zlib
+from typing import Optional, Dict, Any, List, Tuple
+from ..core.config import settings
+from .token_budget import LESSON_LENGTH_GUIDANCE
+
+# Shared static instructions; identical for every template of a version
+_BASE_SYSTEM_V1 = """You are an expert tutor who creates comprehensive, detailed educational content. Create in-depth lessons with rich content and examples.
+
+Please provide extensive, detailed explanations with:
+- Clear headings for different topics
+- Detailed explanations with examples
+- Code examples where relevant (formatted properly)
+- Multiple practical examples
+- Real-world applications
+- Tips and best practices
+
+Make the content comprehensive and educational. Use markdown formatting for better structure.
+
+For every lesson:
+- Include extensive explanations and multiple examples
+- Provide practical code examples where relevant
+- Add real-world applications and use cases
+- Include tips, best practices, and common pitfalls
+- Make the content thorough and educational
+- Use clear headings and proper formatting
+
+Create content that is detailed, informative, and helps the learner gain deep understanding of the topic."""
+
+_USER_TEMPLATE_V1 = "{context}User Request: {prompt}{guidance}"
+
+# Fields a user template may reference
+TEMPLATE_FIELDS = frozenset({"context", "prompt", "guidance"})
+
+DEFAULT_TEMPLATE = "default"
+
+
+class PromptTemplate:
+    """A named, versioned prompt template compiled into a static system message and user-message parts."""
+    
+    def __init__(self, name: str, version: str, system: str, user_template: str):
+        """
+        Compile a template.
+        
+        Args:
+            name: Template name (a category name or "default")
+            version: Template version, e.g. "v1"
+            system: Static system message
+            user_template: str.format-style user message using TEMPLATE_FIELDS
+        
+        Raises:
+            ValueError: If the user template references an unknown field
+        """
+        self.name = name
+        self.version = version
+        self.id = f"{name}:{version}"
+        self.system_message = {"role": "system", "content": system}
+        self._parts = self._compile(user_template)
+    
+    @staticmethod
+    def _compile(user_template: str) -> List[Tuple[str, Optional[str]]]:
+        """Split the user template into (literal, field) pairs once."""
+        parts = []
+        for literal, field, _spec, _conversion in string.Formatter().parse(user_template):
+            if field is not None and field not in TEMPLATE_FIELDS:
+                raise ValueError(f"Unknown prompt template field: {field}")
+            parts.append((literal, field))
+        return parts
+    
+    def render(
+        self,
+        prompt: str,
+        category_name: Optional[str] = None,
+        subcategory_name: Optional[str] = None,
+        user_context: Optional[str] = None,
+        lesson_length: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Build the chat messages for a request.
+        
+        Args:
+            prompt: User's learning prompt
+            category_name: Category context
+            subcategory_name: Subcategory context
+            user_context: Additional user context
+            lesson_length: Lesson length whose guidance is appended
+        
+        Returns:
+            List of chat messages (static system + user)
+        """
+        context_lines = []
+        if category_name:
+            context_lines.append(f"Category: {category_name}\n")
+        if subcategory_name:
+            context_lines.append(f"Subcategory: {subcategory_name}\n")
+        if user_context:
+            context_lines.append(f"Learning Context: {user_context}\n")
+        
+        guidance = LESSON_LENGTH_GUIDANCE.get(lesson_length)
+        values = {
+            "context": "".join(context_lines),
+            "prompt": prompt,
+            "guidance": f"\n\n{guidance}" if guidance else "",
+        }
+        
+        user_content = "".join(
+            literal + (values[field] if field is not None else "")
+            for literal, field in self._parts
+        )
+        return [self.system_message, {"role": "user", "content": user_content}]
+
+
+class PromptTemplateRegistry:
+    """Holds compiled templates and picks the one to use for a request."""
+    
+    def __init__(self):
+        self._templates: Dict[Tuple[str, str], PromptTemplate] = {}
+    
+    def register(self, template: PromptTemplate) -> None:
+        """Add a compiled template, replacing any with the same name and version."""
+        self._templates[(template.name, template.version)] = template
+    
+    def get(self, name: str, version: str) -> Optional[PromptTemplate]:
+        """Return a template by name and version, or None."""
+        return self._templates.get((name, version))
+    
+    def select(self, prompt: str, category_name: Optional[str] = None) -> PromptTemplate:
+        """
+        Choose the template for a request.
+        
+        The category's own template is used when one exists, otherwise the
+        default. When an A/B candidate version is configured, a stable share of
+        prompts (by prompt hash) gets that version instead, so the same prompt
+        always maps to the same template and cache entry.
+        
+        Args:
+            prompt: User's learning prompt
+            category_name: Category context
+        
+        Returns:
+            Compiled template
+        """
+        version = settings.prompt_template_version
+        candidate = settings.prompt_template_candidate_version
+        if candidate and settings.prompt_template_candidate_percent > 0:
+            bucket = zlib.crc32(prompt.strip().lower().encode("utf-8")) % 100
+            if bucket < settings.prompt_template_candidate_percent:
+                version = candidate
+        
+        for name in (category_name, DEFAULT_TEMPLATE):
+            if name and (name, version) in self._templates:
+                return self._templates[(name, version)]
+        
+        # Unknown version configured: fall back to the baseline default template
+        return self._templates[(DEFAULT_TEMPLATE, "v1")]
+    
+    def get_info(self) -> Dict[str, Any]:
+        """Return registered template ids and the active A/B configuration."""
+        return {
+            "templates": sorted(template.id for template in self._templates.values()),
+            "version": settings.prompt_template_version,
+            "candidate_version": settings.prompt_template_candidate_version,
+            "candidate_percent": settings.prompt_template_candidate_percent,
+        }
+
+
+def _create_registry() -> PromptTemplateRegistry:
+    """Compile the built-in templates."""
+    registry = PromptTemplateRegistry()
+    registry.register(PromptTemplate(DEFAULT_TEMPLATE, "v1", _BASE_SYSTEM_V1, _USER_TEMPLATE_V1))
+    registry.register(PromptTemplate(
+        "Technology", "v1",
+        _BASE_SYSTEM_V1 + "\n\nFor technology topics, include runnable code samples with short explanations of each step.",
+        _USER_TEMPLATE_V1
+    ))
+    registry.register(PromptTemplate(
+        "Science", "v1",
+        _BASE_SYSTEM_V1 + "\n\nFor science topics, state key definitions and formulas clearly and work through at least one example problem.",
+        _USER_TEMPLATE_V1
+    ))
+    registry.register(PromptTemplate(
+        "Language", "v1",
+        _BASE_SYSTEM_V1 + "\n\nFor language topics, include vocabulary lists, example sentences with translations, and pronunciation tips.",
+        _USER_TEMPLATE_V1
+    ))
+    return registry
+
+
+# Global template registry, compiled once at startup
+prompt_templates = _create_registry()
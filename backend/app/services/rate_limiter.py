@@ -0,0 +1,293 @@
+"""
+Per-user rate limiting for lesson generation.
+A token bucket bounds each user's request rate, and a daily quota bounds the
+tokens generated for them. Counters are kept in memory and synced to the
+user_ai_usage table periodically, so checks need no database round trip.
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from datetime import datetime, date, timedelta
+from typing import Optional, Dict, Any, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..core.exceptions import RateLimitExceededException
+from ..models.user import User
+from ..models.user_usage import UserUsage
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Classic token bucket: holds up to capacity tokens, refilled continuously at rate per second."""
+    
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def consume(self, amount: float = 1.0) -> float:
+        """
+        Take tokens from the bucket if enough are available.
+        
+        An amount larger than the capacity could never be available at once;
+        it is taken from a full bucket, which goes into debt for the rest and
+        refills from below zero.
+        
+        Args:
+            amount: Tokens to take
+        
+        Returns:
+            0 if the tokens were taken, otherwise seconds until they would be available
+        """
+        self._refill()
+        needed = min(amount, self.capacity)
+        if self.tokens >= needed:
+            self.tokens -= amount
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (needed - self.tokens) / self.rate
+    
+    @property
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class UserRateLimiter:
+    """Per-user request token buckets plus a daily generated-token quota."""
+    
+    def __init__(
+        self,
+        enabled: bool = True,
+        requests_per_minute: float = 10.0,
+        burst: int = 5,
+        daily_token_quota: int = 100000,
+        sync_interval_seconds: int = 15,
+        exempt_admins: bool = True
+    ):
+        self.enabled = enabled
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.daily_token_quota = daily_token_quota
+        self.sync_interval_seconds = sync_interval_seconds
+        self.exempt_admins = exempt_admins
+        self._buckets: Dict[int, TokenBucket] = {}
+        # (user_id, UTC date) -> {"tokens", "requests", "pending_tokens", "pending_requests"}
+        self._usage: Dict[Tuple[int, date], Dict[str, int]] = {}
+        # sync() runs in a worker thread; guards the counters and buckets against check()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.rate_limited = 0
+        self.quota_exceeded = 0
+        self.last_sync_at: Optional[datetime] = None
+    
+    def start(self) -> None:
+        """Start the periodic sync (call from the running event loop)."""
+        if not self.enabled or self._task:
+            return
+        self._task = asyncio.create_task(self._sync_loop(), name="ai-usage-sync")
+    
+    async def stop(self) -> None:
+        """Stop the periodic sync and flush pending counters."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.enabled:
+            await asyncio.to_thread(self.sync)
+    
+    def check(self, user: User, cost: int = 1) -> None:
+        """
+        Admit a request for a user or raise.
+        
+        Args:
+            user: Requesting user
+            cost: Lesson requests this request stands for; each takes a token from the user's
+                bucket. A cost above the burst needs a full bucket and leaves it in debt, so
+                callers bound it (batches by lesson_batch_max_items).
+        
+        Raises:
+            RateLimitExceededException: If the daily quota is used up or the bucket is empty
+        """
+        if not self.enabled or (self.exempt_admins and user.role == "admin"):
+            return
+        
+        with self._lock:
+            usage = self._get_usage(user.id)
+            if self.daily_token_quota > 0 and usage["tokens"] >= self.daily_token_quota:
+                self.quota_exceeded += 1
+                raise RateLimitExceededException(
+                    "Daily AI quota exceeded. Please try again tomorrow.",
+                    retry_after=self._seconds_until_midnight()
+                )
+            
+            bucket = self._buckets.get(user.id)
+            if bucket is None:
+                bucket = self._buckets[user.id] = TokenBucket(self.burst, self.requests_per_minute / 60)
+            wait = bucket.consume(cost)
+            if wait > 0:
+                self.rate_limited += 1
+                raise RateLimitExceededException(
+                    "Too many lesson requests. Please slow down.",
+                    retry_after=max(1, math.ceil(min(wait, 24 * 3600)))
+                )
+            
+            usage["requests"] += cost
+            usage["pending_requests"] += cost
+    
+    def record_tokens(self, user_id: int, tokens: int) -> None:
+        """
+        Add generated tokens to a user's daily usage.
+        
+        Args:
+            user_id: User the lesson was generated for
+            tokens: Completion tokens generated
+        """
+        if not self.enabled or tokens <= 0:
+            return
+        with self._lock:
+            usage = self._get_usage(user_id)
+            usage["tokens"] += tokens
+            usage["pending_tokens"] += tokens
+    
+    def get_usage(self, user_id: int) -> Dict[str, Any]:
+        """Return a user's usage today and remaining quota."""
+        with self._lock:
+            usage = dict(self._get_usage(user_id))
+        return {
+            "date": self._today().isoformat(),
+            "tokens_used": usage["tokens"],
+            "requests": usage["requests"],
+            "daily_token_quota": self.daily_token_quota,
+            "tokens_remaining": max(self.daily_token_quota - usage["tokens"], 0) if self.daily_token_quota > 0 else None,
+        }
+    
+    def sync(self, db: Optional[Session] = None) -> None:
+        """
+        Write pending counters to the database and reload today's totals.
+        
+        Totals from the database include usage recorded by other workers.
+        This does blocking database I/O: from the event loop, run it with
+        asyncio.to_thread(). The lock is only held while counters are read
+        or updated, never across a query.
+        
+        Args:
+            db: Database session; a new one is opened if omitted
+        """
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            with self._lock:
+                pending = [
+                    (key, usage, usage["pending_tokens"], usage["pending_requests"])
+                    for key, usage in self._usage.items()
+                    if usage["pending_tokens"] or usage["pending_requests"]
+                ]
+            for (user_id, usage_date), _, pending_tokens, pending_requests in pending:
+                updated = db.query(UserUsage).filter(
+                    UserUsage.user_id == user_id,
+                    UserUsage.usage_date == usage_date
+                ).update({
+                    UserUsage.tokens_used: UserUsage.tokens_used + pending_tokens,
+                    UserUsage.requests: UserUsage.requests + pending_requests,
+                }, synchronize_session=False)
+                if not updated:
+                    db.add(UserUsage(
+                        user_id=user_id,
+                        usage_date=usage_date,
+                        tokens_used=pending_tokens,
+                        requests=pending_requests
+                    ))
+            db.commit()
+            
+            today = self._today()
+            rows = db.query(UserUsage).filter(UserUsage.usage_date == today).all()
+            with self._lock:
+                # Keep whatever was counted while the flush was running
+                for _, usage, pending_tokens, pending_requests in pending:
+                    usage["pending_tokens"] -= pending_tokens
+                    usage["pending_requests"] -= pending_requests
+                
+                for row in rows:
+                    usage = self._get_usage(row.user_id)
+                    usage["tokens"] = row.tokens_used + usage["pending_tokens"]
+                    usage["requests"] = row.requests + usage["pending_requests"]
+                
+                # Forget finished days and idle buckets
+                self._usage = {
+                    key: usage for key, usage in self._usage.items()
+                    if key[1] == today or usage["pending_tokens"] or usage["pending_requests"]
+                }
+                self._buckets = {user_id: bucket for user_id, bucket in self._buckets.items() if not bucket.is_full}
+            self.last_sync_at = datetime.utcnow()
+        except SQLAlchemyError as e:
+            # Pending counters are kept and retried on the next sync
+            logger.warning(f"AI usage sync failed: {e}")
+            db.rollback()
+        finally:
+            if own_session:
+                db.close()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return limiter configuration and counters."""
+        return {
+            "enabled": self.enabled,
+            "requests_per_minute": self.requests_per_minute,
+            "burst": self.burst,
+            "daily_token_quota": self.daily_token_quota,
+            "active_buckets": len(self._buckets),
+            "rate_limited": self.rate_limited,
+            "quota_exceeded": self.quota_exceeded,
+            "last_sync_at": self.last_sync_at.isoformat() if self.last_sync_at else None,
+        }
+    
+    def _get_usage(self, user_id: int) -> Dict[str, int]:
+        """Return today's in-memory usage entry for a user, creating it if needed."""
+        return self._usage.setdefault(
+            (user_id, self._today()),
+            {"tokens": 0, "requests": 0, "pending_tokens": 0, "pending_requests": 0}
+        )
+    
+    async def _sync_loop(self) -> None:
+        """Sync counters every sync_interval_seconds until cancelled."""
+        while True:
+            try:
+                await asyncio.to_thread(self.sync)
+            except Exception as e:
+                logger.error(f"AI usage sync error: {e}")
+            await asyncio.sleep(self.sync_interval_seconds)
+    
+    @staticmethod
+    def _today() -> date:
+        return datetime.utcnow().date()
+    
+    @staticmethod
+    def _seconds_until_midnight() -> int:
+        now = datetime.utcnow()
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        return max(1, int((midnight - now).total_seconds()))
+
+
+# Global per-user rate limiter
+user_rate_limiter = UserRateLimiter(
+    enabled=settings.rate_limit_enabled,
+    requests_per_minute=settings.rate_limit_requests_per_minute,
+    burst=settings.rate_limit_burst,
+    daily_token_quota=settings.daily_token_quota,
+    sync_interval_seconds=settings.ai_usage_sync_interval_seconds,
+    exempt_admins=settings.rate_limit_exempt_admins
+)
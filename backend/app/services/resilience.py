@@ -0,0 +1,236 @@
+"""
+Resilience helpers for AI provider calls.
+Structured error classification, jittered retry policy and a per-provider circuit breaker.
+"""
+import logging
+import random
+import time
+from typing import Optional, Dict, Any
+
+import httpx
+import openai
+
+logger = logging.getLogger(__name__)
+
+# Error kinds returned by classify_error
+RATE_LIMIT = "rate_limit"
+QUOTA = "quota"
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+SERVER = "server"
+AUTH = "auth"
+BAD_REQUEST = "bad_request"
+CIRCUIT_OPEN = "circuit_open"
+UNKNOWN = "unknown"
+
+# Transient failures worth retrying
+RETRYABLE_KINDS = {RATE_LIMIT, TIMEOUT, CONNECTION, SERVER}
+
+# Failures that say the provider itself is unhealthy and count towards the breaker
+PROVIDER_FAILURE_KINDS = {RATE_LIMIT, TIMEOUT, CONNECTION, SERVER}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+    
+    def __init__(self, provider_name: str, retry_after: int):
+        super().__init__(f"Circuit breaker open for {provider_name}")
+        self.provider_name = provider_name
+        self.retry_after = retry_after
+
+
+def _status_kind(status_code: int) -> str:
+    """Map an HTTP status code from a provider to an error kind."""
+    if status_code == 429:
+        return RATE_LIMIT
+    if status_code in (401, 403):
+        return AUTH
+    if status_code == 408:
+        return TIMEOUT
+    if status_code >= 500:
+        return SERVER
+    return BAD_REQUEST
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    Classify an exception raised by a provider call.
+    
+    Uses the OpenAI SDK and httpx exception types rather than message text.
+    
+    Args:
+        error: Exception raised by the provider
+        
+    Returns:
+        One of the error kind constants in this module
+    """
+    if isinstance(error, CircuitOpenError):
+        return CIRCUIT_OPEN
+    
+    # OpenAI SDK errors (APITimeoutError subclasses APIConnectionError, so check it first)
+    if isinstance(error, openai.APITimeoutError):
+        return TIMEOUT
+    if isinstance(error, openai.APIConnectionError):
+        return CONNECTION
+    if isinstance(error, openai.RateLimitError):
+        # 429 is also used for an exhausted billing quota, which retrying won't fix
+        return QUOTA if getattr(error, "code", None) == "insufficient_quota" else RATE_LIMIT
+    if isinstance(error, (openai.AuthenticationError, openai.PermissionDeniedError)):
+        return AUTH
+    if isinstance(error, openai.APIStatusError):
+        return _status_kind(error.status_code)
+    
+    # httpx errors (Gemini provider)
+    if isinstance(error, httpx.TimeoutException):
+        return TIMEOUT
+    if isinstance(error, httpx.TransportError):
+        return CONNECTION
+    if isinstance(error, httpx.HTTPStatusError):
+        return _status_kind(error.response.status_code)
+    
+    return UNKNOWN
+
+
+def get_retry_after(error: BaseException) -> Optional[float]:
+    """Return the provider's Retry-After hint in seconds, if the error carries one."""
+    if isinstance(error, CircuitOpenError):
+        return float(error.retry_after)
+    
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        value = response.headers.get("retry-after")
+        return float(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for retryable errors."""
+    
+    def __init__(self, max_retries: int = 2, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+    
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        """
+        Decide whether to retry after a failed attempt.
+        
+        Args:
+            error: Exception from the failed attempt
+            attempt: Number of retries already made
+            
+        Returns:
+            True if the error is transient and retries remain
+        """
+        return attempt < self.max_retries and classify_error(error) in RETRYABLE_KINDS
+    
+    def get_delay(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """
+        Delay before the next retry.
+        
+        Full jitter: uniform between 0 and base * 2^attempt (capped), but never
+        shorter than a Retry-After hint from the provider.
+        
+        Args:
+            attempt: Number of retries already made
+            error: Exception from the failed attempt
+            
+        Returns:
+            Delay in seconds
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        hint = get_retry_after(error) if error is not None else None
+        if hint is not None:
+            delay = max(delay, min(hint, self.max_delay))
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one provider.
+    
+    After failure_threshold consecutive provider failures the circuit opens
+    and calls fail fast. Once recovery_seconds have passed a single probe
+    call is let through (half-open); success closes the circuit, failure
+    opens it for another recovery period.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+    
+    def allow_request(self) -> bool:
+        """Return True if a call may go to the provider now."""
+        if self.state == self.CLOSED:
+            return True
+        
+        now = time.monotonic()
+        if now - self.opened_at >= self.recovery_seconds:
+            # Let one probe through; others keep failing fast until it reports back
+            # or another recovery period passes
+            self.state = self.HALF_OPEN
+            self.opened_at = now
+            return True
+        return False
+    
+    @property
+    def is_open(self) -> bool:
+        """True while the breaker is open and its recovery period has not passed."""
+        return self.state == self.OPEN and time.monotonic() - self.opened_at < self.recovery_seconds
+    
+    def record_success(self) -> None:
+        """Report a call that reached a healthy provider."""
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit breaker for {self.name} closed")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+    
+    def record_failure(self) -> None:
+        """Report a call that failed because the provider is unhealthy."""
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(f"Circuit breaker for {self.name} opened after {self.consecutive_failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+    
+    def record_error(self, error: BaseException) -> None:
+        """
+        Record a failed call if it says something about the provider's health.
+        
+        Only transport errors, timeouts, 5xx and 429 responses count as
+        failures. Anything else (a rejected request, bad credentials, an
+        exhausted quota, a bug on our side) is not recorded at all: it
+        neither opens the circuit nor resets its failure count.
+        """
+        if classify_error(error) in PROVIDER_FAILURE_KINDS:
+            self.record_failure()
+    
+    def retry_after(self) -> int:
+        """Seconds until the next probe is allowed."""
+        if self.state == self.CLOSED:
+            return 0
+        remaining = self.recovery_seconds - (time.monotonic() - self.opened_at)
+        return max(1, int(remaining + 0.999))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return breaker state and counters."""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "retry_after_seconds": self.retry_after(),
+        }
@@ -0,0 +1,292 @@
+"""
+Near-duplicate lesson lookup.
+Embeds prompts as hashed TF-IDF vectors (local, no embedding API) and searches
+an in-process NumPy index, partitioned by subcategory, so a rephrased question
+can be answered with a lesson that was already generated.
+"""
+import asyncio
+import logging
+import math
+import re
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.prompt import Prompt
+from ..models.category import Category
+from .token_budget import resolve_lesson_length
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - the index is disabled without NumPy
+    np = None
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Question scaffolding that says nothing about the topic
+STOP_WORDS = frozenset("""
+a an the and or of to in on for with about into from by at as is are was were be been it its this that these
+those what whats which who how why when where does do did can could would should will please me my i you your
+we our explain explained explaining describe tell teach show give learn understand introduction intro
+overview basics basic simple simply guide lesson example examples
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split a prompt into topic terms.
+    
+    Lowercases, drops stop words and strips a plural "s" so that
+    "what are decorators in Python" and "explain python decorator" share terms.
+    
+    Args:
+        text: Prompt text
+    
+    Returns:
+        Terms in order of appearance
+    """
+    terms = []
+    for word in WORD_PATTERN.findall(text.lower()):
+        if word in STOP_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def embed_terms(text: str, dimensions: int) -> "np.ndarray":
+    """
+    Hash a prompt's term frequencies into a fixed-size vector.
+    
+    Each term lands in one bucket (crc32 modulo dimensions) with a sign taken
+    from the hash, which keeps collisions from always adding up. Term
+    frequency is dampened as 1 + log(count). IDF weights are applied at search time.
+    
+    Args:
+        text: Prompt text
+        dimensions: Vector size
+    
+    Returns:
+        float32 vector of length dimensions
+    """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for term, count in Counter(tokenize(text)).items():
+        digest = zlib.crc32(term.encode("utf-8"))
+        sign = 1.0 if digest & 0x80000000 else -1.0
+        vector[digest % dimensions] += sign * (1.0 + math.log(count))
+    return vector
+
+
+class _Partition:
+    """Vectors of one subcategory, with document frequencies for IDF weighting."""
+    
+    def __init__(self, dimensions: int, max_entries: int):
+        self.max_entries = max_entries
+        self.vectors: List["np.ndarray"] = []
+        self.entries: List[Dict[str, Any]] = []
+        self.document_frequency = np.zeros(dimensions, dtype=np.float32)
+        # Cached IDF-weighted, L2-normalized matrix; rebuilt after changes
+        self._matrix: Optional["np.ndarray"] = None
+        self._idf: Optional["np.ndarray"] = None
+    
+    def add(self, vector: "np.ndarray", entry: Dict[str, Any]) -> None:
+        if len(self.entries) >= self.max_entries:
+            # Drop the oldest lesson
+            self.document_frequency -= self.vectors.pop(0) != 0
+            self.entries.pop(0)
+        self.vectors.append(vector)
+        self.entries.append(entry)
+        self.document_frequency += vector != 0
+        self._matrix = None
+    
+    def search(self, vector: "np.ndarray") -> Tuple[Optional[Dict[str, Any]], float]:
+        """Return the most similar entry and its cosine similarity."""
+        if not self.entries or not vector.any():
+            return None, 0.0
+        if self._matrix is None:
+            self._idf = np.log((1 + len(self.entries)) / (1 + self.document_frequency)) + 1
+            matrix = np.vstack(self.vectors) * self._idf
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            self._matrix = matrix / np.maximum(norms, 1e-12)
+        
+        query = vector * self._idf
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        similarities = self._matrix @ query
+        best = int(np.argmax(similarities))
+        return self.entries[best], float(similarities[best])
+
+
+class SemanticLessonIndex:
+    """Finds an already generated lesson whose prompt is a near duplicate of a new one."""
+    
+    def __init__(
+        self,
+        enabled: bool = True,
+        threshold: float = 0.85,
+        dimensions: int = 1024,
+        max_entries_per_subcategory: int = 1000,
+        lookback_days: int = 30
+    ):
+        if enabled and np is None:
+            logger.warning("Semantic lesson lookup requires NumPy, which is not installed; it is disabled")
+        self.enabled = enabled and np is not None
+        self.threshold = threshold
+        self.dimensions = dimensions
+        self.max_entries_per_subcategory = max_entries_per_subcategory
+        self.lookback_days = lookback_days
+        # (sub_category_id, lesson_length) -> partition
+        self._partitions: Dict[Tuple[int, str], _Partition] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.lookups = 0
+        self.hits = 0
+    
+    def start(self) -> None:
+        """Load recent lessons into the index in the background (call from the running event loop)."""
+        if not self.enabled or self._task:
+            return
+        self._task = asyncio.create_task(self._load_in_background(), name="semantic-index-load")
+    
+    async def stop(self) -> None:
+        """Cancel a load still in progress."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    def add(self, sub_category_id: Optional[int], prompt: str, prompt_id: int, lesson_length: str) -> None:
+        """
+        Index a freshly generated lesson.
+        
+        Args:
+            sub_category_id: Subcategory of the prompt; prompts without one are not indexed
+            prompt: User's learning prompt
+            prompt_id: ID of the saved Prompt holding the lesson
+            lesson_length: Resolved lesson length of the generation
+        """
+        if not self.enabled or not sub_category_id:
+            return
+        vector = embed_terms(prompt, self.dimensions)
+        if not vector.any():
+            return
+        key = (sub_category_id, lesson_length)
+        partition = self._partitions.get(key)
+        if partition is None:
+            partition = self._partitions[key] = _Partition(self.dimensions, self.max_entries_per_subcategory)
+        partition.add(vector, {"prompt_id": prompt_id, "prompt": prompt})
+    
+    def search(
+        self,
+        sub_category_id: Optional[int],
+        prompt: str,
+        lesson_length: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Find a near-duplicate prompt in the same subcategory.
+        
+        Args:
+            sub_category_id: Subcategory of the request
+            prompt: User's learning prompt
+            lesson_length: Resolved lesson length of the request
+        
+        Returns:
+            Dictionary with "prompt_id", "prompt" and "similarity", or None
+            if no prompt indexed with the same lesson length reaches the threshold
+        """
+        partition = self._partitions.get((sub_category_id, lesson_length)) if self.enabled and sub_category_id else None
+        if partition is None:
+            return None
+        
+        self.lookups += 1
+        entry, similarity = partition.search(embed_terms(prompt, self.dimensions))
+        if entry is None or similarity < self.threshold:
+            return None
+        
+        self.hits += 1
+        return {"prompt_id": entry["prompt_id"], "prompt": entry["prompt"], "similarity": round(similarity, 4)}
+    
+    def load(self, db: Session) -> None:
+        """
+        Index generated lessons from the last lookback_days.
+        
+        Args:
+            db: Database session
+        """
+        for row in self.fetch_recent(db):
+            self.add(*row)
+    
+    def fetch_recent(self, db: Session) -> List[Tuple[int, str, int, str]]:
+        """
+        Read generated lessons from the last lookback_days, oldest first.
+        
+        The prompts table does not record lesson length, so these lessons are
+        indexed with the length their category resolves to by default.
+        
+        Args:
+            db: Database session
+        
+        Returns:
+            (sub_category_id, prompt, prompt_id, lesson_length) tuples for add()
+        """
+        cutoff = datetime.utcnow() - timedelta(days=self.lookback_days)
+        try:
+            rows = db.query(Prompt.sub_category_id, Prompt.prompt, Prompt.id, Category.name).outerjoin(
+                Category, Prompt.category_id == Category.id
+            ).filter(
+                Prompt.sub_category_id.isnot(None),
+                Prompt.response.isnot(None),
+                Prompt.cache_hit.is_(False),
+                Prompt.partial.is_(False),
+                Prompt.created_at >= cutoff
+            ).order_by(Prompt.created_at).all()
+        except SQLAlchemyError as e:
+            logger.warning(f"Loading the semantic lesson index failed: {e}")
+            db.rollback()
+            return []
+        return [
+            (sub_category_id, prompt, prompt_id, resolve_lesson_length(None, category_name))
+            for sub_category_id, prompt, prompt_id, category_name in rows
+        ]
+    
+    async def _load_in_background(self) -> None:
+        """Read recent lessons in a worker thread, then index them on the event loop."""
+        def fetch() -> List[Tuple[int, str, int, str]]:
+            db = SessionLocal()
+            try:
+                return self.fetch_recent(db)
+            finally:
+                db.close()
+        
+        rows = await asyncio.to_thread(fetch)
+        for row in rows:
+            self.add(*row)
+        logger.info(f"Semantic lesson index loaded {len(rows)} lessons")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return index size and lookup counters."""
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "subcategories": len({sub_category_id for sub_category_id, _ in self._partitions}),
+            "lessons": sum(len(partition.entries) for partition in self._partitions.values()),
+            "lookups": self.lookups,
+            "hits": self.hits,
+        }
+
+
+# Global semantic lesson index
+semantic_index = SemanticLessonIndex(
+    enabled=settings.semantic_lookup_enabled,
+    threshold=settings.semantic_lookup_threshold,
+    dimensions=settings.semantic_lookup_dimensions,
+    max_entries_per_subcategory=settings.semantic_lookup_max_entries_per_subcategory,
+    lookback_days=settings.semantic_lookup_lookback_days
+)
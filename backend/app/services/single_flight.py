@@ -0,0 +1,83 @@
+"""
+Single-flight request coalescing for asyncio code.
+Concurrent calls sharing a key wait on one in-flight task instead of each doing the work.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into a single task."""
+    
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self.started = 0
+        self.coalesced = 0
+        self.abandoned = 0
+    
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run fn for key, or join the call already in flight for that key.
+        
+        The shared task is shielded, so a caller that is cancelled (e.g. its
+        client disconnected) does not cancel the work other callers wait on.
+        When the last waiting caller is cancelled, nobody needs the result
+        and the task is cancelled too.
+        
+        Args:
+            key: Identity of the work; equal keys are coalesced
+            fn: Zero-argument coroutine function doing the work
+            
+        Returns:
+            Tuple of (result, shared) where shared is True if this caller
+            joined another caller's in-flight task
+        """
+        task = self._in_flight.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.create_task(fn())
+            self._in_flight[key] = task
+            self.started += 1
+            task.add_done_callback(lambda done: self._forget(key, done))
+        
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            if not task.done() and self._waiters[key] == 1:
+                self.abandoned += 1
+                task.cancel()
+                # New callers must start fresh instead of joining the cancelled task
+                if self._in_flight.get(key) is task:
+                    del self._in_flight[key]
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+    
+    def in_flight(self) -> int:
+        """Number of distinct keys currently being worked on."""
+        return len(self._in_flight)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Return in-flight and coalescing counters."""
+        return {
+            "in_flight": len(self._in_flight),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+        }
+    
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        """Remove a finished task and retrieve its exception so it is never left unobserved."""
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Single-flight task for {key[:12]} failed: {task.exception()}")
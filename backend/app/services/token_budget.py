@@ -0,0 +1,153 @@
+"""
+Token budgeting for lesson generation.
+Estimates prompt size with a local tokenizer and picks max_tokens for each request.
+"""
+import logging
+from functools import lru_cache
+from typing import Optional, Dict, List
+
+from ..core.config import settings
+from ..core.exceptions import ValidationException
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tokenizer is optional
+    tiktoken = None
+
+# Completion budget for each lesson length
+LESSON_LENGTH_TOKENS: Dict[str, int] = {
+    "short": 600,
+    "medium": 1500,
+    "long": 3000,
+}
+
+# Wording added to the prompt so the model aims for the budget instead of being cut off
+LESSON_LENGTH_GUIDANCE: Dict[str, str] = {
+    "short": "Keep the lesson short and focused: a brief explanation and one example (about 300 words).",
+    "medium": "Write a medium-length lesson with the key explanations and a few examples (about 800 words).",
+    "long": "Write a full, in-depth lesson.",
+}
+
+# Context window per model family (longest matching prefix wins)
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4.1": 1047576,
+    "gpt-4": 8192,
+    "gemini-1.5": 1048576,
+    "gemini-2": 1048576,
+    "gemini-pro": 32760,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Per-message overhead of the chat format (role markers etc.)
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+
+@lru_cache(maxsize=16)
+def _get_encoding(model: str):
+    """Return the tiktoken encoding for a model, or None if unavailable."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        try:
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(f"Tokenizer unavailable, using character estimate: {e}")
+            return None
+    except Exception as e:
+        # Encoding files could not be loaded (e.g. no network on first use)
+        logger.warning(f"Tokenizer unavailable, using character estimate: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    """
+    Count the tokens in text for a model.
+    
+    Uses tiktoken when available, else a conservative ~3 characters per token.
+    
+    Args:
+        text: Text to measure
+        model: Model name
+        
+    Returns:
+        Token count
+    """
+    encoding = _get_encoding(model) if not model.startswith("gemini") else None
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(text) // 3 + 1
+
+
+def count_message_tokens(messages: List[Dict[str, str]], model: str) -> int:
+    """Count the prompt tokens of a list of chat messages."""
+    total = TOKENS_PER_REPLY
+    for message in messages:
+        total += TOKENS_PER_MESSAGE + count_tokens(message["content"], model)
+    return total
+
+
+def get_context_window(model: str) -> int:
+    """Return the context window of a model."""
+    matches = [prefix for prefix in MODEL_CONTEXT_WINDOWS if model.startswith(prefix)]
+    if not matches:
+        return DEFAULT_CONTEXT_WINDOW
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
+
+
+def resolve_lesson_length(requested: Optional[str] = None, category_name: Optional[str] = None) -> str:
+    """
+    Pick the lesson length for a request.
+    
+    Order: explicit request, per-category setting, then the global default.
+    
+    Args:
+        requested: Lesson length sent with the request
+        category_name: Category of the request
+        
+    Returns:
+        One of the LESSON_LENGTH_TOKENS keys
+    """
+    if requested in LESSON_LENGTH_TOKENS:
+        return requested
+    if category_name:
+        by_category = {name.lower(): length for name, length in settings.lesson_length_by_category.items()}
+        length = by_category.get(category_name.lower())
+        if length in LESSON_LENGTH_TOKENS:
+            return length
+    return settings.default_lesson_length if settings.default_lesson_length in LESSON_LENGTH_TOKENS else "long"
+
+
+def choose_max_tokens(messages: List[Dict[str, str]], model: str, lesson_length: str = "long") -> int:
+    """
+    Choose max_tokens for a completion.
+    
+    The lesson length sets the target; it is lowered if the prompt plus the
+    completion would not fit in the model's context window.
+    
+    Args:
+        messages: Chat messages that will be sent
+        model: Model name
+        lesson_length: One of the LESSON_LENGTH_TOKENS keys
+        
+    Returns:
+        Completion token budget
+        
+    Raises:
+        ValidationException: If the prompt leaves too little room for a lesson
+    """
+    target = LESSON_LENGTH_TOKENS.get(lesson_length, LESSON_LENGTH_TOKENS["long"])
+    prompt_tokens = count_message_tokens(messages, model)
+    available = get_context_window(model) - prompt_tokens - settings.token_budget_safety_margin
+    
+    if available < settings.token_budget_min_completion_tokens:
+        raise ValidationException("Prompt is too long for the AI model")
+    
+    return min(target, available)
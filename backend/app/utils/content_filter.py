@@ -0,0 +1,114 @@
+"""
+Prompt content pre-filter.
+Matches all blocked terms with one compiled regular expression so disallowed
+prompts are rejected before any database or AI work.
+"""
+import logging
+import re
+from typing import Optional, Iterable, List, Dict, Any
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Inflectional endings only (make -> makes, making). Derivational endings such as -ly or
+# -ation would turn a blocked word into unrelated vocabulary (explicit -> explicitly)
+INFLECTION_SUFFIXES = r"(?:s|es|e?d|ing)?"
+
+
+def _word_pattern(word: str) -> str:
+    """
+    Regex for one word of a blocked term, with its inflections.
+    
+    A final "e" may be dropped (make -> making) and a final consonant
+    doubled (stab -> stabbing). Words shorter than three letters match as is.
+    """
+    if len(word) < 3 or not word[-1].isalpha():
+        return re.escape(word)
+    if word.endswith("e"):
+        stem = re.escape(word[:-1]) + "e?"
+    elif word[-1] not in "aeiouy":
+        stem = re.escape(word) + re.escape(word[-1]) + "?"
+    else:
+        stem = re.escape(word)
+    return stem + INFLECTION_SUFFIXES
+
+
+def _term_pattern(term: str) -> str:
+    """Regex for one blocked term: its words, inflected, separated by any whitespace."""
+    return r"\s+".join(_word_pattern(word) for word in term.split())
+
+
+class ContentFilter:
+    """Case-insensitive matcher for blocked phrases and their inflections, at word boundaries."""
+    
+    def __init__(self, terms: Iterable[str]):
+        """
+        Compile the matcher.
+        
+        Args:
+            terms: Blocked phrases (or words); blank entries are ignored
+        """
+        self.terms: List[str] = sorted(
+            {" ".join(term.lower().split()) for term in terms if term and term.strip()},
+            key=len,
+            reverse=True
+        )
+        self.checks = 0
+        self.blocked = 0
+        self._pattern: Optional[re.Pattern] = None
+        if self.terms:
+            # Longest terms first so phrases win over their words
+            alternatives = "|".join(_term_pattern(term) for term in self.terms)
+            self._pattern = re.compile(rf"\b(?:{alternatives})\b", re.IGNORECASE)
+    
+    @classmethod
+    def from_settings(cls) -> "ContentFilter":
+        """Build the filter from CONTENT_FILTER_BLOCKED_TERMS and CONTENT_FILTER_TERMS_FILE."""
+        terms = list(settings.content_filter_blocked_terms) if settings.content_filter_enabled else []
+        if settings.content_filter_enabled and settings.content_filter_terms_file:
+            try:
+                with open(settings.content_filter_terms_file, encoding="utf-8") as terms_file:
+                    terms.extend(
+                        line.strip() for line in terms_file
+                        if line.strip() and not line.lstrip().startswith("#")
+                    )
+            except OSError as e:
+                logger.error(f"Failed to load content filter terms file: {e}")
+        return cls(terms)
+    
+    def find(self, text: str) -> Optional[str]:
+        """
+        Return the first blocked term in the text, or None.
+        
+        Args:
+            text: Text to scan
+        
+        Returns:
+            Matched term as it appears in the text, or None if the text is allowed
+        """
+        self.checks += 1
+        if self._pattern is None or not text:
+            return None
+        match = self._pattern.search(text)
+        if match is None:
+            return None
+        self.blocked += 1
+        return match.group(0)
+    
+    def is_allowed(self, text: str) -> bool:
+        """Return True if the text contains no blocked term."""
+        return self.find(text) is None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return term count and check counters."""
+        return {
+            "enabled": self._pattern is not None,
+            "terms": len(self.terms),
+            "checks": self.checks,
+            "blocked": self.blocked,
+        }
+
+
+# Global content filter, compiled once at startup
+content_filter = ContentFilter.from_settings()
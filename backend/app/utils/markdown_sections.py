@@ -0,0 +1,78 @@
+"""
+Markdown lesson splitting utilities.
+Splits a generated lesson into sections at its headings for partial retrieval.
+"""
+import re
+from typing import Dict, Any, List
+
+# ATX headings ("# Title" ... "###### Title"); fenced code blocks are skipped
+HEADING_PATTERN = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$")
+FENCE_PATTERN = re.compile(r"^\s*(```|~~~)")
+SLUG_STRIP_PATTERN = re.compile(r"[^\w\s-]")
+SLUG_SPACE_PATTERN = re.compile(r"[\s_-]+")
+
+INTRODUCTION_TITLE = "Introduction"
+
+
+def slugify(title: str) -> str:
+    """
+    Build a URL anchor from a heading title.
+    
+    Args:
+        title: Heading text
+    
+    Returns:
+        Lowercase, hyphen-separated anchor
+    """
+    slug = SLUG_STRIP_PATTERN.sub("", title.lower())
+    return SLUG_SPACE_PATTERN.sub("-", slug).strip("-")[:100] or "section"
+
+
+def split_sections(markdown: str) -> List[Dict[str, Any]]:
+    """
+    Split a markdown lesson into sections at each heading.
+    
+    Each section's content starts with its heading line and runs until the
+    next heading of any level. Text before the first heading becomes an
+    "Introduction" section with level 0. Anchors are made unique by suffixing.
+    
+    Args:
+        markdown: Lesson markdown
+    
+    Returns:
+        List of dicts with position, level, title, anchor and content
+    """
+    sections: List[Dict[str, Any]] = []
+    current = {"level": 0, "title": INTRODUCTION_TITLE, "lines": []}
+    in_fence = False
+    
+    for line in (markdown or "").splitlines():
+        if FENCE_PATTERN.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING_PATTERN.match(line)
+        if match:
+            sections.append(current)
+            current = {"level": len(match.group(1)), "title": match.group(2).strip(), "lines": []}
+        current["lines"].append(line)
+    sections.append(current)
+    
+    result = []
+    seen_anchors: Dict[str, int] = {}
+    for section in sections:
+        content = "\n".join(section["lines"]).strip()
+        if not content:
+            continue
+        anchor = slugify(section["title"])
+        if anchor in seen_anchors:
+            seen_anchors[anchor] += 1
+            anchor = f"{anchor}-{seen_anchors[anchor]}"
+        else:
+            seen_anchors[anchor] = 0
+        result.append({
+            "position": len(result),
+            "level": section["level"],
+            "title": section["title"][:300],
+            "anchor": anchor,
+            "content": content,
+        })
+    return result
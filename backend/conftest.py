@@ -0,0 +1,83 @@
+"""
+Shared pytest fixtures: the app on a throwaway SQLite database with the
+in-process mock AI provider, so the behaviour tests need no network or quota.
+"""
+import os
+import random
+import sys
+import tempfile
+import uuid
+
+# Configure the app before it is imported
+_db_dir = tempfile.mkdtemp(prefix="learning-platform-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_dir}/test.db"
+os.environ["AI_MOCK_ENABLED"] = "true"
+os.environ["AI_MOCK_LATENCY_DISTRIBUTION"] = "fixed"
+os.environ["AI_MOCK_LATENCY_MS"] = "50"
+os.environ["AI_MOCK_TOKENS_PER_SECOND"] = "2000"
+os.environ["AI_MOCK_RESPONSE_TOKENS"] = "100"
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.core.auth import create_access_token
+from app.core.database import SessionLocal
+from app.models.user import User
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Test client with the application lifespan running."""
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def mock_transport(client, monkeypatch):
+    """The mock AI API behind the running app, reseeded so response sizes repeat; tests may tune its latency."""
+    transport = app.state.ai_service.providers[0].transport
+    monkeypatch.setattr(transport, "random", random.Random(0))
+    return transport
+
+
+def _headers_for(role: str) -> dict:
+    db = SessionLocal()
+    try:
+        user = User(
+            name=f"Test {role}",
+            email=f"{role}-{uuid.uuid4().hex[:8]}@example.com",
+            password_hash="x",
+            role=role
+        )
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        token = create_access_token({"sub": str(user.id), "user_id": user.id, "email": user.email, "role": user.role})
+        return {"Authorization": f"Bearer {token}"}
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def user_headers(client):
+    """Auth headers of a fresh regular user."""
+    return _headers_for("user")
+
+
+@pytest.fixture
+def admin_headers(client):
+    """Auth headers of a fresh admin."""
+    return _headers_for("admin")
+
+
+@pytest.fixture
+def lesson_batch():
+    """Build a POST /api/prompts/batch body of size distinct prompts about topic."""
+    def build(size: int, topic: str) -> dict:
+        return {"items": [{"prompt": f"Explain {topic}, part {index}"} for index in range(size)]}
+    return build
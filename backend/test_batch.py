@@ -0,0 +1,45 @@
+"""
+Tests for batch lesson generation (POST /api/prompts/batch).
+"""
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.prompt import Prompt
+from app.services.rate_limiter import user_rate_limiter
+
+
+def test_oversized_batch_does_not_consume_rate_limit(client, user_headers, monkeypatch, lesson_batch):
+    """A batch over lesson_batch_max_items is rejected before it takes rate-limit tokens."""
+    monkeypatch.setattr(user_rate_limiter, "enabled", True)
+    monkeypatch.setattr(user_rate_limiter, "burst", settings.lesson_batch_max_items + 10)
+    monkeypatch.setattr(user_rate_limiter, "_buckets", {})
+    
+    response = client.post(
+        "/api/prompts/batch", json=lesson_batch(settings.lesson_batch_max_items + 1, "batch limits"), headers=user_headers
+    )
+    
+    assert response.status_code == 422
+    assert client.get("/api/prompts/my-usage", headers=user_headers).json()["requests"] == 0
+    assert all(bucket.is_full for bucket in user_rate_limiter._buckets.values())
+
+
+def test_batch_saves_items_and_records_usage(client, user_headers, lesson_batch):
+    """Successful items are saved and their tokens counted; blocked items fail on their own."""
+    items = lesson_batch(2, "per-item sessions")["items"] + [{"prompt": "Explain how to build a bomb at home"}]
+    
+    response = client.post("/api/prompts/batch", json={"items": items}, headers=user_headers)
+    
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["processed"], body["successful"], body["failed"]) == (3, 2, 1)
+    assert body["results"][2]["status_code"] == 422
+    saved_ids = [result["prompt"]["id"] for result in body["results"] if result["success"]]
+    db = SessionLocal()
+    try:
+        saved = db.query(Prompt).filter(Prompt.id.in_(saved_ids)).all()
+        assert len(saved) == 2
+        generated_tokens = sum(prompt.completion_tokens for prompt in saved)
+    finally:
+        db.close()
+    
+    usage = client.get("/api/prompts/my-usage", headers=user_headers).json()
+    assert usage["tokens_used"] == generated_tokens > 0
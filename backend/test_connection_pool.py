@@ -0,0 +1,61 @@
+"""
+Tests that lesson generation does not hold pooled database connections
+while the AI provider is working.
+"""
+import asyncio
+
+import httpx
+
+from app.main import app
+from app.core.database import engine
+from app.services.rate_limiter import user_rate_limiter
+
+CONCURRENT_REQUESTS = 8
+
+
+async def _checked_out_during(requests) -> tuple:
+    """Send requests concurrently; return (pooled connections checked out mid-generation, responses)."""
+    limiter = app.state.ai_service.limiter
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver", timeout=30) as http:
+        tasks = [asyncio.ensure_future(http.post(path, json=body, headers=headers)) for path, body, headers in requests]
+        for _ in range(200):
+            if limiter.active >= len(requests):
+                break
+            await asyncio.sleep(0.01)
+        checked_out = engine.pool.checkedout()
+        responses = await asyncio.gather(*tasks)
+    return checked_out, responses
+
+
+def _lesson_requests(path: str, headers: dict, topic: str) -> list:
+    return [(path, {"prompt": f"Explain {topic}, part {index}"}, headers) for index in range(CONCURRENT_REQUESTS)]
+
+
+def test_generations_release_db_connections(client, mock_transport, user_headers, monkeypatch):
+    """Concurrent POST /api/prompts/ generations hold no database connection while they wait on the AI."""
+    monkeypatch.setattr(mock_transport, "latency_ms", 1000.0)
+    monkeypatch.setattr(user_rate_limiter, "enabled", False)
+    
+    checked_out, responses = client.portal.call(
+        _checked_out_during, _lesson_requests("/api/prompts/", user_headers, "connection pools")
+    )
+    
+    assert [response.status_code for response in responses] == [200] * CONCURRENT_REQUESTS
+    assert checked_out == 0
+    assert engine.pool.checkedout() == 0
+
+
+def test_streams_release_db_connections(client, mock_transport, user_headers, monkeypatch):
+    """Concurrent SSE streams hold no database connection while the lesson streams."""
+    monkeypatch.setattr(mock_transport, "latency_ms", 1000.0)
+    monkeypatch.setattr(user_rate_limiter, "enabled", False)
+    
+    checked_out, responses = client.portal.call(
+        _checked_out_during, _lesson_requests("/api/prompts/stream", user_headers, "streamed pools")
+    )
+    
+    assert [response.status_code for response in responses] == [200] * CONCURRENT_REQUESTS
+    assert all("event: done" in response.text for response in responses)
+    assert checked_out == 0
+    assert engine.pool.checkedout() == 0
@@ -0,0 +1,73 @@
+"""
+Tests for the prompt content pre-filter.
+"""
+from app.core.config import settings
+from app.utils.content_filter import ContentFilter, content_filter
+
+LEGITIMATE_PROMPTS = [
+    "Explain explicit type conversion in C++",
+    "Exploration vs exploitation in reinforcement learning",
+    "What causes an illegal instruction exception?",
+    "Hash collisions and hacking password databases",
+    "When is dangerouslySetInnerHTML safe, and why is it dangerously named?",
+    "Why is it harmful to catch every exception?",
+    "Which buffer overflow exploits did stack canaries stop?",
+    "How do bomb calorimeters measure energy?",
+]
+
+
+def test_inflections_are_blocked():
+    """Inflected forms of every word of a blocked phrase are caught, not only the exact phrase."""
+    for prompt in [
+        "How do I make a bomb?",
+        "Steps for making a bomb at home",
+        "Who builds a bomb like that?",
+        "Explain how to cook meth",
+    ]:
+        assert content_filter.find(prompt), prompt
+
+
+def test_stem_changes_are_blocked():
+    """A dropped final 'e' or a doubled final consonant still matches."""
+    phrases = ContentFilter(["abuse", "stab"])
+    assert phrases.find("Ways of abusing a system")
+    assert phrases.find("Describe stabbing techniques")
+
+
+def test_legitimate_cs_prompts_are_allowed():
+    """Ordinary programming and science lessons pass the default filter."""
+    assert content_filter.terms == sorted(settings.content_filter_blocked_terms, key=len, reverse=True)
+    for prompt in LEGITIMATE_PROMPTS:
+        assert content_filter.is_allowed(prompt), prompt
+
+
+def test_derived_words_are_allowed():
+    """Only inflections match; words derived from a blocked word are different vocabulary."""
+    words = ContentFilter(["explicit", "explore", "danger"])
+    for prompt in ["Explain it explicitly", "Exploration strategies", "Why it's dangerously slow", "Dangerous defaults"]:
+        assert words.is_allowed(prompt), prompt
+    assert words.find("Explores the dangers")
+
+
+def test_words_containing_a_term_are_allowed():
+    """Terms only match at word boundaries, so unrelated words that contain them pass."""
+    words = ContentFilter(["hack", "harm"])
+    for prompt in [
+        "Tell me about Shackleton's Antarctic expedition",
+        "How do I organise a hackathon?",
+        "Explain the difference between harmless and benign tumours",
+    ]:
+        assert words.is_allowed(prompt), prompt
+
+
+def test_phrases_match_with_flexible_whitespace():
+    """Multi-word terms match across any whitespace."""
+    phrases = ContentFilter(["build a weapon"])
+    assert phrases.find("how to build  a\nweapons cache")
+    assert phrases.is_allowed("how to build a website")
+
+
+def test_legitimate_prompt_is_not_rejected(client, user_headers):
+    """The prompt route accepts a CS lesson that a word-based filter rejected."""
+    response = client.post("/api/prompts/", json={"prompt": LEGITIMATE_PROMPTS[0]}, headers=user_headers)
+    assert response.status_code == 200
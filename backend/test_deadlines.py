@@ -0,0 +1,60 @@
+"""
+Tests for per-request deadlines: requests stop at their deadline, work that
+outlives the request does not inherit it.
+"""
+import asyncio
+import time
+
+from app.core.config import settings
+from app.core.deadline import start_deadline, reset_deadline, remaining
+from app.services.lesson_pregeneration import lesson_pregenerator
+
+
+def test_prompt_stops_at_request_deadline(client, mock_transport, user_headers, monkeypatch):
+    """A lesson slower than the X-Request-Timeout budget ends in 504 at the deadline."""
+    monkeypatch.setattr(mock_transport, "latency_ms", 3000.0)
+    started = time.monotonic()
+    response = client.post(
+        "/api/prompts/",
+        json={"prompt": "Explain deadline propagation in web services"},
+        headers={**user_headers, settings.request_timeout_header: "1.5"}
+    )
+    elapsed = time.monotonic() - started
+    assert response.status_code == 504
+    assert response.json()["type"] == "deadline_exceeded"
+    assert elapsed < 2.5
+
+
+def test_stream_outlives_request_deadline(client, mock_transport, user_headers, monkeypatch):
+    """A streamed lesson runs in the background and is not cut off by the request deadline."""
+    monkeypatch.setattr(mock_transport, "latency_ms", 1500.0)
+    response = client.post(
+        "/api/prompts/stream",
+        json={"prompt": "Explain background jobs and request lifetimes"},
+        headers={**user_headers, settings.request_timeout_header: "1"}
+    )
+    assert response.status_code == 200
+    assert "event: done" in response.text
+    assert "event: error" not in response.text
+
+
+def test_pregeneration_run_ignores_request_deadline(monkeypatch):
+    """A run triggered from a request handler starts without the request's deadline."""
+    seen = []
+    
+    async def fake_run(ai):
+        seen.append(remaining())
+    
+    monkeypatch.setattr(lesson_pregenerator, "run", fake_run)
+    monkeypatch.setattr(lesson_pregenerator, "_run_task", None)
+    
+    async def trigger_from_request():
+        token = start_deadline(2.0)
+        try:
+            assert lesson_pregenerator.trigger(None)
+        finally:
+            reset_deadline(token)
+        await lesson_pregenerator._run_task
+    
+    asyncio.run(trigger_from_request())
+    assert seen == [None]
@@ -0,0 +1,76 @@
+"""
+Tests for cancelling lesson generation when the client disconnects.
+The app is driven over raw ASGI through the full middleware stack, since
+TestClient cannot drop a connection mid-request.
+"""
+import asyncio
+import json
+import time
+
+from app.main import app
+from app.core.database import SessionLocal
+from app.models.prompt import Prompt
+
+
+async def _post_then_disconnect(path: str, body: dict, headers: dict, disconnect_after: float) -> list:
+    """POST body to path, report http.disconnect after disconnect_after seconds; return the sent messages."""
+    payload = json.dumps(body).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"testserver"), (b"content-type", b"application/json")]
+        + [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80),
+    }
+    disconnected = asyncio.Event()
+    asyncio.get_running_loop().call_later(disconnect_after, disconnected.set)
+    body_sent = False
+    
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+    
+    sent = []
+    
+    async def send(message):
+        sent.append(message)
+    
+    await app(scope, receive, send)
+    return sent
+
+
+def test_disconnect_cancels_generation(client, mock_transport, user_headers, monkeypatch):
+    """A client that hangs up mid-generation frees the AI slot and no lesson is saved."""
+    monkeypatch.setattr(mock_transport, "latency_ms", 5000.0)
+    limiter = app.state.ai_service.limiter
+    prompt_text = "Explain how servers notice dropped connections"
+    
+    started = time.monotonic()
+    sent = client.portal.call(
+        _post_then_disconnect, "/api/prompts/", {"prompt": prompt_text}, user_headers, 0.5
+    )
+    elapsed = time.monotonic() - started
+    
+    assert elapsed < 3.0
+    start = next(message for message in sent if message["type"] == "http.response.start")
+    assert start["status"] == 499
+    assert (b"access-control-allow-origin", b"*") in start["headers"]
+    assert limiter.active == 0
+    
+    db = SessionLocal()
+    try:
+        assert db.query(Prompt).filter(Prompt.prompt == prompt_text).count() == 0
+    finally:
+        db.close()
@@ -0,0 +1,68 @@
+"""
+Tests for hedged requests: a slow primary raced against the alternate
+provider, each call holding its own limiter slot.
+"""
+from app.main import app
+from app.core.config import settings
+from app.services.ai_limiter import ConcurrencyLimiter
+from app.services.mock_provider import MockChatTransport, MockProvider
+
+
+def _hedge_setup(monkeypatch, max_concurrency: int = 4):
+    """Give the service a slow primary, a fast alternate and a fresh limiter; return the limiter."""
+    ai = app.state.ai_service
+    slow = MockProvider("mock-slow", MockChatTransport(latency_ms=1500.0, latency_distribution="fixed", response_tokens=20))
+    fast = MockProvider("mock-fast", MockChatTransport(latency_ms=20.0, latency_distribution="fixed", response_tokens=20))
+    limiter = ConcurrencyLimiter(max_concurrency=max_concurrency)
+    monkeypatch.setattr(ai, "providers", [slow, fast])
+    monkeypatch.setattr(ai, "router", None)
+    monkeypatch.setattr(ai, "limiter", limiter)
+    monkeypatch.setattr(settings, "ai_hedge_enabled", True)
+    monkeypatch.setattr(settings, "ai_hedge_delay_ms", 100)
+    monkeypatch.setattr(settings, "ai_hedge_min_delay_ms", 100)
+    return limiter
+
+
+def _generate(client, prompt: str) -> dict:
+    return client.portal.call(app.state.ai_service.generate_lesson_async, prompt)
+
+
+def test_hedge_takes_its_own_slot(client, monkeypatch):
+    """The hedge holds a second limiter slot and gives it back before the result is returned."""
+    limiter = _hedge_setup(monkeypatch)
+    ai = app.state.ai_service
+    started, won = ai.hedges_started, ai.hedges_won
+    
+    result = _generate(client, "Explain hedged requests")
+    
+    assert result["model_used"] == "mock-fast"
+    assert (ai.hedges_started, ai.hedges_won) == (started + 1, won + 1)
+    assert limiter.admitted == 2
+    assert limiter.active == 0
+
+
+def test_hedge_skipped_without_free_slot(client, monkeypatch):
+    """With no spare slot the primary is awaited instead of hedging past the concurrency limit."""
+    limiter = _hedge_setup(monkeypatch, max_concurrency=1)
+    ai = app.state.ai_service
+    started, skipped = ai.hedges_started, ai.hedges_skipped
+    
+    result = _generate(client, "Explain admission control")
+    
+    assert result["model_used"] == "mock-slow"
+    assert (ai.hedges_started, ai.hedges_skipped) == (started, skipped + 1)
+    assert limiter.admitted == 1
+    assert limiter.active == 0
+
+
+def test_no_hedge_when_fallback_disabled(client, monkeypatch):
+    """AI_FALLBACK_ENABLED=false keeps every request on the primary provider, hedging included."""
+    _hedge_setup(monkeypatch)
+    monkeypatch.setattr(settings, "ai_fallback_enabled", False)
+    ai = app.state.ai_service
+    started = ai.hedges_started
+    
+    result = _generate(client, "Explain single-provider mode")
+    
+    assert result["model_used"] == "mock-slow"
+    assert ai.hedges_started == started
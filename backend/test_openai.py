@@ -6,7 +6,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.core.config import settings
-from app.services.ai_service import ai_service
+from app.services.ai_service import AIService
 
 def test_openai_connection():
     """Test OpenAI API connection and configuration"""
@@ -25,6 +25,7 @@ def test_openai_connection():
     
     try:
         # Test AI service health check
+        ai_service = AIService()
         health_status = ai_service.health_check()
         print(f"AI Service Health: {'✅ Healthy' if health_status else '❌ Not healthy'}")
         
@@ -0,0 +1,77 @@
+"""
+Tests for outline-then-sections lesson generation: bounded fan-out and
+failed sections.
+"""
+from app.main import app
+from app.core.config import settings
+from app.core.exceptions import AIServiceOverloadedException
+
+
+def _stream(client, monkeypatch, **kwargs):
+    """Stream an outlined lesson on the app's event loop; return (text, stats)."""
+    # The mock writes a "## Part N" heading every 80 tokens: four sections
+    monkeypatch.setattr(settings, "lesson_outline_max_tokens", 400)
+    ai = app.state.ai_service
+    stats = {}
+    
+    async def collect():
+        return "".join([
+            chunk async for chunk in ai.stream_lesson(
+                stats=stats, lesson_length="long", parallel_sections=True, **kwargs
+            )
+        ])
+    
+    return client.portal.call(collect), stats
+
+
+def _track_calls(monkeypatch, fail_section=None):
+    """Wrap _complete_in_slot to record peak concurrency; fail every call for fail_section."""
+    ai = app.state.ai_service
+    original = ai._complete_in_slot
+    calls = {"active": 0, "peak": 0, "sections": 0}
+    
+    async def tracked(providers, messages, max_tokens):
+        is_section = "Write only section" in messages[-1]["content"]
+        if fail_section and f'"{fail_section}"' in messages[-1]["content"]:
+            raise AIServiceOverloadedException()
+        calls["active"] += 1
+        if is_section:
+            calls["sections"] += 1
+            calls["peak"] = max(calls["peak"], calls["active"])
+        try:
+            return await original(providers, messages, max_tokens)
+        finally:
+            calls["active"] -= 1
+    
+    monkeypatch.setattr(ai, "_complete_in_slot", tracked)
+    return calls
+
+
+def test_sections_run_with_bounded_concurrency(client, mock_transport, monkeypatch):
+    """No more than lesson_section_concurrency sections of one lesson run at once."""
+    monkeypatch.setattr(mock_transport, "response_tokens", 400)
+    monkeypatch.setattr(mock_transport, "latency_ms", 100.0)
+    monkeypatch.setattr(settings, "lesson_section_concurrency", 2)
+    calls = _track_calls(monkeypatch)
+    
+    text, stats = _stream(client, monkeypatch, prompt="Explain bounded fan-out")
+    
+    assert stats["sections_generated"] == 4
+    assert calls["sections"] == stats["sections_generated"]
+    assert calls["peak"] == 2
+    assert text.startswith("# ")
+
+
+def test_failed_section_is_replaced_not_fatal(client, mock_transport, monkeypatch):
+    """A section that keeps failing is replaced by a note; the rest of the lesson still streams."""
+    monkeypatch.setattr(mock_transport, "response_tokens", 400)
+    monkeypatch.setattr(settings, "ai_retry_base_delay_seconds", 0.0)
+    _track_calls(monkeypatch, fail_section="Part 3")
+    
+    text, stats = _stream(client, monkeypatch, prompt="Explain graceful degradation")
+    
+    assert stats["sections_generated"] == 4
+    assert stats["sections_failed"] == 1
+    assert text.count("could not be generated") == 1
+    assert "## Part 3\n\n_This section could not be generated" in text
+    assert text.index("## Part 3") < text.index("## Part 4")
@@ -0,0 +1,104 @@
+"""
+Tests for per-user rate limiting of lesson generation, including batches.
+"""
+import asyncio
+
+import httpx
+
+from app.main import app
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.prompt import Prompt
+from app.models.user_usage import UserUsage
+from app.services.rate_limiter import user_rate_limiter
+
+
+def _use_fresh_limiter(monkeypatch, burst: int) -> None:
+    """Enable the global limiter with a small burst and an almost empty refill rate."""
+    monkeypatch.setattr(user_rate_limiter, "enabled", True)
+    monkeypatch.setattr(user_rate_limiter, "burst", burst)
+    monkeypatch.setattr(user_rate_limiter, "requests_per_minute", 0.01)
+    monkeypatch.setattr(user_rate_limiter, "_buckets", {})
+
+
+def test_batch_succeeds_under_default_settings(client, user_headers, lesson_batch):
+    """A 10-item batch is admitted with the default burst of 5; the rest is borrowed from later."""
+    assert (user_rate_limiter.burst, user_rate_limiter.requests_per_minute) == (
+        settings.rate_limit_burst, settings.rate_limit_requests_per_minute
+    )
+    assert settings.rate_limit_burst < 10 <= settings.lesson_batch_max_items
+    
+    response = client.post("/api/prompts/batch", json=lesson_batch(10, "token buckets"), headers=user_headers)
+    assert response.status_code == 200
+    assert response.json()["successful"] == 10
+    
+    # The bucket is 5 tokens in debt: the next request waits for 6 tokens to refill
+    response = client.post("/api/prompts/", json={"prompt": "Explain token debt"}, headers=user_headers)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 5 * 60 / settings.rate_limit_requests_per_minute
+
+
+def test_batch_over_burst_needs_a_full_bucket(client, user_headers, monkeypatch, lesson_batch):
+    """A batch larger than the burst is not admitted while the bucket is partly used."""
+    _use_fresh_limiter(monkeypatch, burst=3)
+    assert client.post("/api/prompts/", json={"prompt": "Explain leaky buckets"}, headers=user_headers).status_code == 200
+    response = client.post("/api/prompts/batch", json=lesson_batch(4, "partial buckets"), headers=user_headers)
+    assert response.status_code == 429
+
+
+def test_batch_items_each_cost_one_request(client, user_headers, monkeypatch, lesson_batch):
+    """Each batch item takes a token and counts as a request, so a full batch drains the bucket."""
+    _use_fresh_limiter(monkeypatch, burst=3)
+    response = client.post("/api/prompts/batch", json=lesson_batch(3, "leaky buckets"), headers=user_headers)
+    assert response.status_code == 200
+    assert response.json()["successful"] == 3
+    
+    usage = client.get("/api/prompts/my-usage", headers=user_headers).json()
+    assert usage["requests"] == 3
+    
+    response = client.post("/api/prompts/", json={"prompt": "Explain sliding windows"}, headers=user_headers)
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+
+
+def test_sync_flushes_counters(client, user_headers, monkeypatch, lesson_batch):
+    """sync() writes pending usage to user_ai_usage and keeps the in-memory totals."""
+    _use_fresh_limiter(monkeypatch, burst=3)
+    response = client.post("/api/prompts/batch", json=lesson_batch(2, "usage counters"), headers=user_headers)
+    user_id = response.json()["results"][0]["prompt"]["user_id"]
+    
+    user_rate_limiter.sync()
+    
+    assert user_rate_limiter.get_usage(user_id)["requests"] == 2
+    db = SessionLocal()
+    try:
+        row = db.query(UserUsage).filter(UserUsage.user_id == user_id).one()
+        assert row.requests == 2
+    finally:
+        db.close()
+
+
+def test_coalesced_requests_are_charged(client, mock_transport, user_headers, monkeypatch):
+    """A request served by another's identical in-flight generation still counts against the quota."""
+    monkeypatch.setattr(mock_transport, "latency_ms", 300.0)
+    prompt = {"prompt": "Explain request coalescing"}
+    
+    async def post_twice():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver", timeout=30) as http:
+            return await asyncio.gather(*(http.post("/api/prompts/", json=prompt, headers=user_headers) for _ in range(2)))
+    
+    responses = client.portal.call(post_twice)
+    assert [response.status_code for response in responses] == [200, 200]
+    
+    db = SessionLocal()
+    try:
+        saved = db.query(Prompt).filter(Prompt.id.in_([response.json()["id"] for response in responses])).all()
+        tokens = sorted(prompt.completion_tokens for prompt in saved)
+    finally:
+        db.close()
+    # Coalesced: one generation, its tokens recorded on the leader's prompt only
+    assert tokens[0] == 0 < tokens[1]
+    
+    usage = client.get("/api/prompts/my-usage", headers=user_headers).json()
+    assert usage["tokens_used"] == 2 * tokens[1]
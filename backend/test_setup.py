@@ -9,7 +9,7 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 from app.core.config import settings
 from app.core.database import check_db_connection, create_all_tables
-from app.services.ai_service import ai_service
+from app.services.ai_service import AIService
 
 def test_configuration():
     """Test application configuration."""
@@ -37,6 +37,7 @@ def test_database():
 def test_ai_service():
     """Test AI service."""
     print("🤖 Testing AI Service...")
+    ai_service = AIService()
     model_info = ai_service.get_model_info()
     print(f"   Model: {model_info['model_name']}")
     print(f"   Provider: {model_info['provider']}")